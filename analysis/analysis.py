@@ -4,12 +4,21 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import seaborn as sns
-import sqlite3
 import os
 import sys
+import time
 sys.path.append('../')
 
 from config.SimulationConfig import SimulationConfig
+from loader import load_sqlite_runs, load_parquet_runs
+from run_cache import load_enriched_runs
+from live import LiveLog
+from metrics import compute_metrics
+from report import FIGURE_COLUMNS, describe_runs, run_summary_table
+from inequality import inequality_summary
+from histograms import (binned_density, binned_lorenz, display_bins, histogram, histogram_stats,
+                        merge_run_histograms, run_histograms, DISTRIBUTIONS)
+from resampling import bootstrap_ci, permutation_test
 
 config = SimulationConfig()
 
@@ -23,22 +32,37 @@ sns.set_theme(style="whitegrid")
 # Helper utilities
 # ---------------------------------------------------------------------------
 
-def plot_distribution(data, x_col, title, xlabel, ylabel="Count", color="skyblue", bins=30):
-    """Histogram + KDE with descriptive stats box."""
-    if data.empty or x_col not in data.columns:
-        st.write(f"No data for {title}")
-        return
-    series = data[x_col].dropna()
-    if series.empty:
+def plot_distribution(data, x_col, title, xlabel, ylabel="Count", color="skyblue", bins=30, hist=None,
+                      binning="fixed"):
+    """Histogram + KDE with descriptive stats box, drawn from a pre-binned
+    histogram (hist, or the binned data[x_col]) so the cost does not grow
+    with the number of rows."""
+    if hist is None:
+        if data.empty or x_col not in data.columns:
+            st.write(f"No data for {title}")
+            return
+        hist = histogram(data[x_col])
+    if hist["n"] == 0:
         st.write(f"No data for {title}")
         return
+    shown = display_bins(hist, bins, binning)
+    widths = np.diff(shown["edges"])
+    x_kde, density = binned_density(hist)
+    if binning == "quantile":
+        # bins of unequal width are compared by density
+        heights, ylabel = shown["counts"] / (hist["n"] * widths), "Density"
+    else:
+        heights, density = shown["counts"], density * hist["n"] * widths[0]
     fig, ax = plt.subplots(figsize=(6, 4))
-    sns.histplot(series, bins=bins, color=color, kde=True, ax=ax, edgecolor="black")
+    ax.bar(shown["edges"][:-1], heights, width=widths, align="edge", color=color, edgecolor="black")
+    if len(x_kde):
+        ax.plot(x_kde, density, color=color)
+    summary = histogram_stats(hist)
     stats = (
-        f"Mean: {series.mean():,.2f}\n"
-        f"Median: {series.median():,.2f}\n"
-        f"Std: {series.std():,.2f}\n"
-        f"N: {len(series):,}"
+        f"Mean: {summary['mean']:,.2f}\n"
+        f"Median: {summary['median']:,.2f}\n"
+        f"Std: {summary['std']:,.2f}\n"
+        f"N: {summary['n']:,}"
     )
     ax.text(0.95, 0.95, stats, transform=ax.transAxes, fontsize=9,
             va='top', ha='right',
@@ -52,62 +76,11 @@ def plot_distribution(data, x_col, title, xlabel, ylabel="Count", color="skyblue
     plt.close(fig)
 
 
-def gini_coefficient(values):
-    """
-    Compute the Gini coefficient adjusted for negative values using
-    the Raffinetti-Siletti-Vernizzi normalization (bounded in [0,1]).
-    Reference: E. Raffinetti, E. Siletti, A. Vernizzi (2015).
-    """
-
-    # Convert to numpy array and flatten
-    y = np.array(values, dtype=float).flatten()
-
-    # Remove NaNs
-    y = y[~np.isnan(y)]
-    n = len(y)
-    if n == 0:
-        return np.nan
-
-    # Sort values
-    y_sorted = np.sort(y)
-
-    # Compute mean differences (pairwise)
-    # |yi - yj| summed over all pairs
-    # Efficiently use broadcasting for moderate n
-    diff_matrix = np.abs(y_sorted.reshape(-1,1) - y_sorted.reshape(1,-1))
-    sum_abs_diffs = diff_matrix.sum()
-
-    # Basic "mean difference" numerator
-    # ≡ sum_{i,j} |yi - yj|
-    # Standard Gini denominator is 2 * n^2 * mu
-    # We'll compute RSV denom instead
-    T_pos = np.sum(y_sorted[y_sorted > 0])
-    T_neg = np.abs(np.sum(y_sorted[y_sorted < 0]))
-
-    # RSV normalization term: total absolute attribute
-    # Equivalent to (sum of positives + sum of absolute negatives)
-    mu_star = (T_pos + T_neg) / n
-
-    # Avoid division by zero
-    if mu_star == 0:
-        return np.nan
-
-    # RSV normalized Gini
-    # numerator divided by (2 * n^2 * mu_star)
-    gini = sum_abs_diffs / (2.0 * (n**2) * mu_star)
-
-    return gini
-
-
-
-def lorenz_curve(values, label="", ax=None):
-    """Plot Lorenz curve on given axes."""
-    v = np.sort(np.asarray(values, dtype=float))
-    v = v[~np.isnan(v)]
-    if len(v) == 0:
+def plot_lorenz(lorenz, label="", ax=None):
+    """Plot Lorenz curve points, e.g. from histograms.binned_lorenz, on given axes."""
+    x, cum = lorenz
+    if len(cum) == 0:
         return
-    cum = np.concatenate(([0], np.cumsum(v) / v.sum()))
-    x = np.linspace(0, 1, len(cum))
     if ax is None:
         _, ax = plt.subplots()
     ax.plot(x, cum, label=label)
@@ -116,63 +89,65 @@ def lorenz_curve(values, label="", ax=None):
     ax.set_ylabel("Cumulative share of value")
 
 
-def income_shares(values, top_pct=0.10, bottom_pct=0.40):
-    """Return top X% share and bottom Y% share of total."""
-    v = np.sort(np.asarray(values, dtype=float))
-    v = v[~np.isnan(v)]
-    n = len(v)
-    if n == 0:
-        return np.nan, np.nan
-
-    total = v.sum()
-    if total <= 0:
-        return np.nan, np.nan
-
-    top_n = max(1, int(np.ceil(n * top_pct)))
-    bottom_n = max(1, int(np.ceil(n * bottom_pct)))
-    total = v.sum()
-    top_share = v[-top_n:].sum() / total
-    bottom_share = v[:bottom_n].sum() / total
-    return top_share, bottom_share
-
-
 # ---------------------------------------------------------------------------
 # Database connection
 # ---------------------------------------------------------------------------
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "simulation_logs.db")
 DB_PATH = os.path.normpath(DB_PATH)
+PARQUET_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "simulation_logs.parquet")
+PARQUET_PATH = os.path.normpath(PARQUET_PATH)
+
+log_sources = {}
+if os.path.isfile(DB_PATH):
+    log_sources["SQLite"] = DB_PATH
+if os.path.isdir(PARQUET_PATH):
+    log_sources["Parquet"] = PARQUET_PATH
 
-if not os.path.isfile(DB_PATH):
-    st.error(f"Database not found at `{DB_PATH}`. Run the simulation first.")
+if not log_sources:
+    st.error(f"Database not found at `{DB_PATH}` or `{PARQUET_PATH}`. Run the simulation first.")
     st.stop()
 
+log_source = next(iter(log_sources))
+if len(log_sources) > 1:
+    log_source = st.sidebar.radio("Log source", list(log_sources))
+
 
 @st.cache_data(ttl=60)
-def load_data():
-    conn = sqlite3.connect(DB_PATH)
+def load_runs(source=log_source):
+    if source == "Parquet":
+        return load_parquet_runs(PARQUET_PATH)
+    return load_sqlite_runs(DB_PATH)
 
-    runs = pd.read_sql("SELECT * FROM runs", conn)
-    drivers = pd.read_sql("SELECT * FROM drivers", conn)
-    passengers = pd.read_sql("SELECT * FROM passengers", conn)
-    transactions = pd.read_sql("SELECT * FROM passenger_transactions", conn)
-    neg_steps = pd.read_sql("SELECT * FROM negotiation_steps", conn)
-    expenses = pd.read_sql("SELECT * FROM expenses", conn)
 
-    conn.close()
-    return runs, drivers, passengers, transactions, neg_steps, expenses
+# Gas price per liter for the marginal cost proxy
+GAS_PRICE = config.getGasPricePerLiter()
+
 
+@st.cache_data(ttl=60)
+def load_data(run_ids, source=log_source):
+    """Load the enriched transactions and driver profits of the selected
+    runs, computed once per run and cached next to the log."""
+    return load_enriched_runs(log_sources[source], run_ids, GAS_PRICE, source)
 
-runs_df, drivers_df, passengers_df, txn_df, neg_df, expenses_df = load_data()
 
-if txn_df.empty:
-    st.warning("No transaction data found. Run the simulation first.")
+@st.cache_data(ttl=60)
+def load_histograms(run_ids, source=log_source):
+    """Bin the distributions of the selected runs, per run (histograms.py)."""
+    txn, driver_profit = load_data(run_ids, source)
+    return run_histograms(txn, driver_profit)
+
+
+runs_df = load_runs()
+
+if runs_df.empty:
+    st.warning("No simulation runs found. Run the simulation first.")
     st.stop()
 
 # ---------------------------------------------------------------------------
 # Sidebar - run selection
 # ---------------------------------------------------------------------------
 st.sidebar.header("Configuration")
-all_run_ids = sorted(runs_df["id"].unique())
+all_run_ids = sorted(int(run_id) for run_id in runs_df["id"].unique())
 selected_runs = st.sidebar.multiselect(
     "Select simulation runs",
     options=all_run_ids,
@@ -182,46 +157,57 @@ selected_runs = st.sidebar.multiselect(
 if not selected_runs:
     selected_runs = all_run_ids
 
-# Filter data to selected runs
-drivers = drivers_df[drivers_df["run_id"].isin(selected_runs)].copy()
-passengers = passengers_df[passengers_df["run_id"].isin(selected_runs)].copy()
-txn = txn_df[txn_df["run_id"].isin(selected_runs)].copy()
-neg = neg_df[neg_df["transaction_id"].isin(txn["id"])].copy()
-expenses = expenses_df[expenses_df["run_id"].isin(selected_runs)].copy()
+# Live refresh follows a simulation that is still writing to the database:
+# each rerun reads only the rows logged since the previous one (live.py)
+live_refresh = False
+auto_refresh = False
+if log_source == "SQLite":
+    live_refresh = st.sidebar.toggle(
+        "Live refresh", value=False,
+        help="Load only rows logged since the last refresh, for watching a running simulation"
+    )
+if live_refresh:
+    auto_refresh = st.sidebar.toggle("Auto-refresh", value=True)
+    refresh_interval = st.sidebar.number_input("Refresh every (seconds)", min_value=2, max_value=600, value=10)
+    st.sidebar.button("Refresh now")
+
+
+def schedule_refresh():
+    """Rerun the page after the refresh interval when auto-refresh is on."""
+    if auto_refresh:
+        time.sleep(refresh_interval)
+        st.rerun()
+
+
+live_runs = None
+if live_refresh:
+    live_key = (DB_PATH, tuple(selected_runs))
+    if st.session_state.get("live_key") != live_key:
+        st.session_state["live_key"] = live_key
+        st.session_state["live_log"] = LiveLog(DB_PATH, selected_runs, GAS_PRICE)
+    live_log = st.session_state["live_log"]
+    updated_runs = live_log.refresh()
+    st.sidebar.caption(f"Updated runs: {', '.join(map(str, sorted(updated_runs))) or 'none'}")
+    txn, driver_profit = live_log.get_transactions(), live_log.get_driver_profit()
+    live_runs = live_log.get_run_metrics()
+    histograms = live_log.histogram_parts
+else:
+    # Only the selected runs are read, from the cache where their rows are unchanged
+    txn, driver_profit = load_data(tuple(selected_runs))
+    histograms = load_histograms(tuple(selected_runs))
+
+if txn.empty:
+    st.warning("No transaction data found. Run the simulation first.")
+    schedule_refresh()
+    st.stop()
 
 n_runs = len(selected_runs)
 
 # ---------------------------------------------------------------------------
 # Pre-compute useful columns
 # ---------------------------------------------------------------------------
-# Merge driver info onto transactions
-txn = txn.merge(
-    drivers[["id", "trike_code", "hub", "gas_consumption_rate",
-             "aspired_price", "minimum_price"]],
-    left_on="driver_id", right_on="id", how="left", suffixes=("", "_drv")
-)
-# Merge passenger info onto transactions
-txn = txn.merge(
-    passengers[["id", "willingness_to_pay", "aspired_price"]],
-    left_on="passenger_id", right_on="id", how="left", suffixes=("", "_pax")
-)
-
-# Compute passenger WTP & aspired price in absolute terms (per-km * distance/1000)
-txn["pax_wtp"] = txn["willingness_to_pay"] * txn["distance"] / 1000.0
-txn["pax_asp_abs"] = txn["aspired_price_pax"] * txn["distance"] / 1000.0
-txn["driver_min_abs"] = txn["minimum_price"] * txn["distance"] / 1000.0
-
-# Get initial negotiation step for driver asp at start of negotiation
-init_neg = neg[neg["iteration"] == 0].drop_duplicates(subset=["transaction_id"])
-txn = txn.merge(
-    init_neg[["transaction_id", "driver_asp", "passenger_asp"]],
-    left_on="id", right_on="transaction_id", how="left", suffixes=("", "_neg")
-)
-
-# Marginal cost proxy: gas_consumption_rate * distance * gas_price_per_liter
-# gas_consumption_rate is liters/meter essentially; gas price ~ 58.9 PHP/L
-GAS_PRICE = config.getGasPricePerLiter()
-txn["marginal_cost"] = txn["gas_consumption_rate"] * txn["distance"] * GAS_PRICE / 1000
+# Transactions come with driver, passenger and first negotiation step
+# attributes, prices in absolute terms and surplus (enrichment.py)
 
 # Separate accepted / failed negotiation / rejected (too far)
 accepted = txn[txn["result"] == "agree"].copy()
@@ -229,10 +215,14 @@ failed_neg = txn[txn["result"] == "failed"].copy()
 rejected = txn[txn["result"] == "reject"].copy()
 not_accepted = txn[txn["result"] != "agree"].copy()
 
-# Consumer surplus (accepted only)
-accepted["consumer_surplus"] = accepted["pax_wtp"] - accepted["final_price"]
-# Producer surplus (accepted only)
-accepted["producer_surplus"] = accepted["final_price"] - accepted["marginal_cost"]
+# Every section reads its figures from the metric set of the whole selection,
+# of each hub or of each run, computed in grouped passes (metrics.py)
+overall = compute_metrics(txn, driver_profit).to_dict("records")[0]
+by_hub = compute_metrics(txn, driver_profit, "hub")
+# in live refresh only the runs with new rows had their metrics recomputed
+by_run = live_runs if live_runs is not None else compute_metrics(txn, driver_profit, "run_id")
+# Distributions are plotted from per-run histograms merged over the selection
+distributions = {column: merge_run_histograms(histograms, selected_runs, column) for column in DISTRIBUTIONS}
 
 # ---------------------------------------------------------------------------
 # TITLE
@@ -245,10 +235,10 @@ st.markdown(
     "comparative**, not causal."
 )
 st.caption(f"Analyzing **{n_runs}** simulation run(s)  |  "
-           f"{len(txn):,} total transactions  |  "
-           f"{len(accepted):,} accepted  |  "
-           f"{len(failed_neg):,} failed negotiations  |  "
-           f"{len(rejected):,} rejected (too far)")
+           f"{overall['transactions']:,} total transactions  |  "
+           f"{overall['accepted']:,} accepted  |  "
+           f"{overall['failed']:,} failed negotiations  |  "
+           f"{overall['rejected']:,} rejected (too far)")
 st.divider()
 
 # =========================================================================
@@ -271,14 +261,14 @@ st.markdown(
     "- **Rejected (Too Far):** The passenger's destination exceeded the driver's "
     "maximum service distance (`farthest_distance`), so no negotiation was attempted."
 )
-total_txn = len(txn)
-n_accepted = len(accepted)
-n_failed = len(failed_neg)
-n_rejected = len(rejected)
+total_txn = overall["transactions"]
+n_accepted = overall["accepted"]
+n_failed = overall["failed"]
+n_rejected = overall["rejected"]
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("% Served", f"{n_accepted / total_txn * 100:.1f}%" if total_txn else "N/A")
-c2.metric("% Failed Negotiation", f"{n_failed / total_txn * 100:.1f}%" if total_txn else "N/A")
-c3.metric("% Rejected (Too Far)", f"{n_rejected / total_txn * 100:.1f}%" if total_txn else "N/A")
+c1.metric("% Served", f"{overall['served_rate'] * 100:.1f}%" if total_txn else "N/A")
+c2.metric("% Failed Negotiation", f"{overall['failed_rate'] * 100:.1f}%" if total_txn else "N/A")
+c3.metric("% Rejected (Too Far)", f"{overall['rejected_rate'] * 100:.1f}%" if total_txn else "N/A")
 c4.metric("Total Interactions", f"{total_txn:,}")
 
 # Pie chart of outcomes
@@ -314,20 +304,19 @@ st.markdown(
     "well below their reservation price."
 )
 if not accepted.empty:
-    cs_total = accepted["consumer_surplus"].sum()
-    cs_mean = accepted["consumer_surplus"].mean()
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total Consumer Surplus", f"PHP {cs_total:,.2f}")
-    c2.metric("Avg Consumer Surplus / Passenger", f"PHP {cs_mean:,.2f}")
-    c3.metric("Median Consumer Surplus", f"PHP {accepted['consumer_surplus'].median():,.2f}")
+    c1.metric("Total Consumer Surplus", f"PHP {overall['total_cs']:,.2f}")
+    c2.metric("Avg Consumer Surplus / Passenger", f"PHP {overall['avg_cs']:,.2f}")
+    c3.metric("Median Consumer Surplus", f"PHP {overall['median_cs']:,.2f}")
 
     # Hub-level consumer surplus
-    hub_cs = accepted.groupby("hub")["consumer_surplus"].agg(["sum", "mean", "count"]).reset_index()
+    hub_cs = by_hub.loc[by_hub["accepted"] > 0, ["total_cs", "avg_cs", "accepted"]].reset_index()
     hub_cs.columns = ["Hub", "Total CS", "Avg CS", "Transactions"]
     st.dataframe(hub_cs.sort_values("Total CS", ascending=False), use_container_width=True)
 
     plot_distribution(accepted, "consumer_surplus",
-                      "Consumer Surplus Distribution", "Consumer Surplus (PHP)", color="#2a9d8f")
+                      "Consumer Surplus Distribution", "Consumer Surplus (PHP)", color="#2a9d8f",
+                      hist=distributions["consumer_surplus"])
 else:
     st.info("No accepted transactions to compute consumer surplus.")
 
@@ -352,42 +341,16 @@ st.markdown(
     "**daily livelihood costs**."
 )
 
-driver_income = accepted.groupby("driver_id")["final_price"].sum().reset_index()
-driver_income.columns = ["driver_id", "income"]
-
-driver_expenses = expenses.groupby("driver_id")["amount"].sum().reset_index()
-driver_expenses.columns = ["driver_id", "total_expenses"]
-
-# Breakdown by expense type
-fuel_expenses = expenses[expenses["expense_type"].isin(["end_gas", "midday_gas"])].groupby("driver_id")["amount"].sum().reset_index()
-fuel_expenses.columns = ["driver_id", "fuel_cost"]
-
-daily_exp = expenses[expenses["expense_type"] == "daily_expense"].groupby("driver_id")["amount"].sum().reset_index()
-daily_exp.columns = ["driver_id", "daily_expense_total"]
-
-rides_count = accepted.groupby("driver_id").size().reset_index(name="num_rides")
-
-driver_profit = drivers[["id", "trike_code", "hub", "run_id"]].copy()
-driver_profit = driver_profit.merge(driver_income, left_on="id", right_on="driver_id", how="left")
-driver_profit = driver_profit.merge(driver_expenses, left_on="id", right_on="driver_id", how="left", suffixes=("", "_exp"))
-driver_profit = driver_profit.merge(fuel_expenses, left_on="id", right_on="driver_id", how="left", suffixes=("", "_fuel"))
-driver_profit = driver_profit.merge(daily_exp, left_on="id", right_on="driver_id", how="left", suffixes=("", "_daily"))
-driver_profit["income"] = driver_profit["income"].fillna(0)
-driver_profit["total_expenses"] = driver_profit["total_expenses"].fillna(0)
-driver_profit["fuel_cost"] = driver_profit["fuel_cost"].fillna(0)
-driver_profit["daily_expense_total"] = driver_profit["daily_expense_total"].fillna(0)
-driver_profit["profit_after_gas"] = driver_profit["income"] - driver_profit["fuel_cost"]
-driver_profit["profit"] = driver_profit["income"] - driver_profit["total_expenses"]
-driver_profit = driver_profit.merge(rides_count, left_on="id", right_on="driver_id", how="left")
-driver_profit["num_rides"] = driver_profit["num_rides"].fillna(0).astype(int)
+# driver_profit is computed per run from driver_days summaries, or from the
+# raw transactions and expenses of older runs (enrichment.py)
 
 
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Total Driver Income", f"PHP {driver_profit['income'].sum():,.2f}")
-c2.metric("Total Expenses", f"PHP {driver_profit['total_expenses'].sum():,.2f}")
-c3.metric("Total Profit", f"PHP {driver_profit['profit'].sum():,.2f}")
-c4.metric("Avg Profit / Driver", f"PHP {driver_profit['profit'].mean():,.2f}")
+c1.metric("Total Driver Income", f"PHP {overall['total_income']:,.2f}")
+c2.metric("Total Expenses", f"PHP {overall['total_expenses']:,.2f}")
+c3.metric("Total Profit", f"PHP {overall['total_profit']:,.2f}")
+c4.metric("Avg Profit / Driver", f"PHP {overall['avg_profit']:,.2f}")
 
 display_cols = ["trike_code", "hub", "run_id", "num_rides", "income", "fuel_cost",
                 "daily_expense_total", "total_expenses", "profit"]
@@ -397,7 +360,7 @@ st.dataframe(
 )
 
 plot_distribution(driver_profit, "profit", "Driver Profit Distribution",
-                  "Profit (PHP)", color="#264653")
+                  "Profit (PHP)", color="#264653", hist=distributions["profit"])
 
 # 2.2 Sustainability Ratios
 st.subheader("2.2 Sustainability Ratios")
@@ -410,9 +373,9 @@ st.markdown(
     "*Fuel cost = end-of-day + midday refueling. "
     "Total expenses = Fuel cost + Daily operating cost (food, maintenance, etc.).*"
 )
-n_drivers = len(driver_profit)
-covers_fuel = (driver_profit["income"] >= driver_profit["fuel_cost"]).sum()
-profitable = (driver_profit["profit"] > 0).sum()
+n_drivers = overall["drivers"]
+covers_fuel = overall["covers_fuel"]
+profitable = overall["profitable"]
 
 c1, c2 = st.columns(2)
 c1.metric("Covers Fuel", f"{covers_fuel}/{n_drivers} ({covers_fuel/n_drivers*100:.1f}%)" if n_drivers else "N/A",
@@ -458,15 +421,14 @@ st.markdown(
     "Marginal cost is estimated as `gas_consumption_rate x distance x gas_price_per_liter`. "
 )
 if not accepted.empty:
-    ps_total = accepted["producer_surplus"].sum()
-    ps_mean = accepted["producer_surplus"].mean()
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total Producer Surplus", f"PHP {ps_total:,.2f}")
-    c2.metric("Avg Producer Surplus / Trip", f"PHP {ps_mean:,.2f}")
-    c3.metric("Median Producer Surplus", f"PHP {accepted['producer_surplus'].median():,.2f}")
+    c1.metric("Total Producer Surplus", f"PHP {overall['total_ps']:,.2f}")
+    c2.metric("Avg Producer Surplus / Trip", f"PHP {overall['avg_ps']:,.2f}")
+    c3.metric("Median Producer Surplus", f"PHP {overall['median_ps']:,.2f}")
 
     plot_distribution(accepted, "producer_surplus",
-                      "Producer Surplus Distribution", "Producer Surplus (PHP)", color="#e76f51")
+                      "Producer Surplus Distribution", "Producer Surplus (PHP)", color="#e76f51",
+                      hist=distributions["producer_surplus"])
 
 st.divider()
 
@@ -488,11 +450,9 @@ st.markdown(
     "This is the standard measure of allocative efficiency."
 )
 if not accepted.empty:
-    accepted["total_surplus"] = accepted["consumer_surplus"] + accepted["producer_surplus"]
-    ts = accepted["total_surplus"].sum()
     c1, c2 = st.columns(2)
-    c1.metric("Total Surplus (Accepted)", f"PHP {ts:,.2f}")
-    c2.metric("Avg Total Surplus / Trip", f"PHP {accepted['total_surplus'].mean():,.2f}")
+    c1.metric("Total Surplus (Accepted)", f"PHP {overall['total_surplus']:,.2f}")
+    c2.metric("Avg Total Surplus / Trip", f"PHP {overall['avg_surplus']:,.2f}")
 
 # 3.2 Deadweight Loss
 st.subheader("3.2 Deadweight Loss")
@@ -504,25 +464,18 @@ st.markdown(
     "when the passenger's WTP exceeds the marginal cost, since either type represents "
     "a forgone welfare gain."
 )
-# Combine failed negotiations and rejected transactions for DWL
-all_unsuccessful = pd.concat([failed_neg, rejected], ignore_index=True)
-if not all_unsuccessful.empty:
-    feasible_unsuccessful = all_unsuccessful[all_unsuccessful["pax_wtp"] >= all_unsuccessful["marginal_cost"]].copy()
-    feasible_unsuccessful["unrealized_surplus"] = feasible_unsuccessful["pax_wtp"] - feasible_unsuccessful["marginal_cost"]
-    dwl = feasible_unsuccessful["unrealized_surplus"].sum()
-
-    # Break down by source
-    feasible_failed = failed_neg[failed_neg["pax_wtp"] >= failed_neg["marginal_cost"]]
-    feasible_rejected = rejected[rejected["pax_wtp"] >= rejected["marginal_cost"]]
-
+# Failed negotiations and rejected transactions both count towards DWL
+if n_failed + n_rejected > 0:
+    dwl = overall["dwl"]
     c1, c2, c3 = st.columns(3)
     c1.metric("Total Deadweight Loss", f"PHP {dwl:,.2f}")
-    c2.metric("Feasible-but-Unserved Transactions", f"{len(feasible_unsuccessful):,}")
-    c3.metric("Avg Unrealized Surplus", f"PHP {feasible_unsuccessful['unrealized_surplus'].mean():,.2f}" if len(feasible_unsuccessful) else "N/A")
+    c2.metric("Feasible-but-Unserved Transactions", f"{overall['feasible_unserved']:,}")
+    c3.metric("Avg Unrealized Surplus", f"PHP {overall['avg_unrealized']:,.2f}" if overall["feasible_unserved"] else "N/A")
 
+    # Break down by source
     c1, c2 = st.columns(2)
-    c1.metric("From Failed Negotiations", f"{len(feasible_failed):,}")
-    c2.metric("From Rejected (Too Far)", f"{len(feasible_rejected):,}")
+    c1.metric("From Failed Negotiations", f"{overall['feasible_failed']:,}")
+    c2.metric("From Rejected (Too Far)", f"{overall['feasible_rejected']:,}")
 else:
     st.info("No failed negotiations or rejected transactions.")
     dwl = 0
@@ -535,9 +488,9 @@ st.markdown(
     "means every feasible transaction was completed."
 )
 if not accepted.empty:
-    realized = accepted["total_surplus"].sum()
-    feasible = realized + dwl
-    realization_rate = realized / feasible if feasible > 0 else 0
+    realized = overall["total_surplus"]
+    feasible = overall["feasible_surplus"]
+    realization_rate = overall["realization_rate"]
     c1, c2, c3 = st.columns(3)
     c1.metric("Realized Surplus", f"PHP {realized:,.2f}")
     c2.metric("Feasible Surplus", f"PHP {feasible:,.2f}")
@@ -564,8 +517,9 @@ st.markdown(
     "- **Lorenz curve:** The further from the diagonal, the greater the inequality."
 )
 incomes = driver_profit["income"].values
-gini_inc = gini_coefficient(incomes)
-top10_inc, bot40_inc = income_shares(incomes, 0.10, 0.40)
+ineq_inc = inequality_summary(incomes, 0.10, 0.40)
+lorenz_inc = binned_lorenz(distributions["income"])
+gini_inc, top10_inc, bot40_inc = overall["gini_income"], ineq_inc["top_share"], ineq_inc["bottom_share"]
 
 c1, c2, c3 = st.columns(3)
 c1.metric("Gini Coefficient", f"{gini_inc:.4f}" if not np.isnan(gini_inc) else "Not defined")
@@ -574,7 +528,7 @@ c2.metric("Top 10% Income Share", f"{top10_inc:.2%}")
 c3.metric("Bottom 40% Income Share", f"{bot40_inc:.2%}")
 
 fig_lorenz_inc, ax_lorenz_inc = plt.subplots(figsize=(5, 5))
-lorenz_curve(incomes, label=f"Gross Income (Gini={gini_inc:.3f})", ax=ax_lorenz_inc)
+plot_lorenz(lorenz_inc, label=f"Gross Income (Gini={gini_inc:.3f})", ax=ax_lorenz_inc)
 ax_lorenz_inc.set_title("Lorenz Curve - Gross Income")
 ax_lorenz_inc.legend()
 c1, c2, c3 = st.columns([1, 2, 1])
@@ -589,8 +543,9 @@ st.markdown(
     "This isolates the effect of variable operating costs without livelihood expenses."
 )
 profit_gas = driver_profit["profit_after_gas"].values
-gini_pg = gini_coefficient(profit_gas)
-top10_pg, bot40_pg = income_shares(profit_gas, 0.10, 0.40)
+ineq_pg = inequality_summary(profit_gas, 0.10, 0.40)
+lorenz_pg = binned_lorenz(distributions["profit_after_gas"])
+gini_pg, top10_pg, bot40_pg = overall["gini_profit_after_gas"], ineq_pg["top_share"], ineq_pg["bottom_share"]
 
 c1, c2, c3 = st.columns(3)
 c1.metric("Gini Coefficient", f"{gini_pg:.4f}")
@@ -598,7 +553,7 @@ c2.metric("Top 10% Share", f"{top10_pg:.2%}")
 c3.metric("Bottom 40% Share", f"{bot40_pg:.2%}")
 
 fig_lorenz_pg, ax_lorenz_pg = plt.subplots(figsize=(5, 5))
-lorenz_curve(profit_gas, label=f"Profit after Gas (Gini={gini_pg:.3f})", ax=ax_lorenz_pg)
+plot_lorenz(lorenz_pg, label=f"Profit after Gas (Gini={gini_pg:.3f})", ax=ax_lorenz_pg)
 ax_lorenz_pg.set_title("Lorenz Curve - Profit after Gas")
 ax_lorenz_pg.legend()
 c1, c2, c3 = st.columns([1, 2, 1])
@@ -613,8 +568,9 @@ st.markdown(
     "This is the take-home figure and reflects the full cost burden on drivers."
 )
 profits = driver_profit["profit"].values
-gini = gini_coefficient(profits)
-top10, bot40 = income_shares(profits, 0.10, 0.40)
+ineq = inequality_summary(profits, 0.10, 0.40)
+lorenz_profit = binned_lorenz(distributions["profit"])
+gini, top10, bot40 = overall["gini_profit"], ineq["top_share"], ineq["bottom_share"]
 
 c1, c2, c3 = st.columns(3)
 c1.metric("Gini Coefficient", f"{gini:.4f}" if not np.isnan(gini) else "Not defined")
@@ -623,9 +579,9 @@ c3.metric("Bottom 40% Profit Share", f"{bot40:.2%}")
 
 # Combined Lorenz Curve
 fig_lorenz, ax_lorenz = plt.subplots(figsize=(5, 5))
-lorenz_curve(incomes, label=f"Gross Income (Gini={gini_inc:.3f})", ax=ax_lorenz)
-lorenz_curve(profit_gas, label=f"Profit after Gas (Gini={gini_pg:.3f})", ax=ax_lorenz)
-lorenz_curve(profits, label=f"Net Profit (Gini={gini:.3f})", ax=ax_lorenz)
+plot_lorenz(lorenz_inc, label=f"Gross Income (Gini={gini_inc:.3f})", ax=ax_lorenz)
+plot_lorenz(lorenz_pg, label=f"Profit after Gas (Gini={gini_pg:.3f})", ax=ax_lorenz)
+plot_lorenz(lorenz_profit, label=f"Net Profit (Gini={gini:.3f})", ax=ax_lorenz)
 ax_lorenz.set_title("Lorenz Curves - Income vs Profit Levels")
 ax_lorenz.legend()
 c1, c2, c3 = st.columns([1, 2, 1])
@@ -645,7 +601,7 @@ if not accepted.empty:
     with col_a:
         st.markdown("**Consumer Surplus across Passengers**")
         pax_cs = accepted.groupby("passenger_id")["consumer_surplus"].sum()
-        gini_cs = gini_coefficient(pax_cs.values)
+        gini_cs = overall["gini_cs"]
         st.metric("Gini (Consumer Surplus)", f"{gini_cs:.4f}")
         plot_distribution(pax_cs.reset_index(), "consumer_surplus",
                           "Consumer Surplus per Passenger", "PHP", color="#2a9d8f")
@@ -653,7 +609,7 @@ if not accepted.empty:
     with col_b:
         st.markdown("**Producer Surplus across Drivers**")
         drv_ps = accepted.groupby("driver_id")["producer_surplus"].sum()
-        gini_ps = gini_coefficient(drv_ps.values)
+        gini_ps = overall["gini_ps"]
         st.metric("Gini (Producer Surplus)", f"{gini_ps:.4f}")
         plot_distribution(drv_ps.reset_index(), "producer_surplus",
                           "Producer Surplus per Driver", "PHP", color="#e76f51")
@@ -684,9 +640,9 @@ barg = barg[barg["pax_wtp"] >= barg["driver_min_abs"]].copy()
 if not barg.empty:
     barg["bargaining_surplus"] = barg["pax_wtp"] - barg["driver_min_abs"]
     c1, c2, c3 = st.columns(3)
-    c1.metric("Avg Bargaining Surplus", f"PHP {barg['bargaining_surplus'].mean():,.2f}")
-    c2.metric("Total Bargaining Surplus", f"PHP {barg['bargaining_surplus'].sum():,.2f}")
-    c3.metric("N (feasible bargains)", f"{len(barg):,}")
+    c1.metric("Avg Bargaining Surplus", f"PHP {overall['avg_bargaining_surplus']:,.2f}")
+    c2.metric("Total Bargaining Surplus", f"PHP {overall['total_bargaining_surplus']:,.2f}")
+    c3.metric("N (feasible bargains)", f"{overall['bargains']:,}")
 
     # 5.2 Surplus Capture Ratio
     st.subheader("5.2 Surplus Capture Ratio")
@@ -701,11 +657,10 @@ if not barg.empty:
     barg["driver_capture"] = (barg["final_price"] - barg["driver_min_abs"]) / barg["bargaining_surplus"]
     barg["driver_capture"] = barg["driver_capture"].clip(0, 1)
 
-    cap_mean = barg["driver_capture"].mean()
     c1, c2, c3 = st.columns(3)
-    c1.metric("Avg Driver Capture Ratio", f"{cap_mean:.3f}")
-    c2.metric("Median Driver Capture", f"{barg['driver_capture'].median():.3f}")
-    c3.metric("Std Dev", f"{barg['driver_capture'].std():.3f}")
+    c1.metric("Avg Driver Capture Ratio", f"{overall['capture_ratio']:.3f}")
+    c2.metric("Median Driver Capture", f"{overall['median_capture']:.3f}")
+    c3.metric("Std Dev", f"{overall['std_capture']:.3f}")
 
     plot_distribution(barg, "driver_capture",
                       "Driver Surplus Capture Ratio Distribution",
@@ -744,49 +699,20 @@ st.markdown(
     "outcomes for drivers and passengers."
 )
 
-hubs = drivers["hub"].dropna().unique()
-hub_rows = []
-
-for hub in sorted(hubs):
-    hub_driver_ids = drivers[drivers["hub"] == hub]["id"].values
-    hub_dp = driver_profit[driver_profit["id"].isin(hub_driver_ids)]
-    hub_acc = accepted[accepted["driver_id"].isin(hub_driver_ids)]
-    hub_txn = txn[txn["driver_id"].isin(hub_driver_ids)]
-
-    n_hub_drivers = len(hub_dp)
-    avg_profit = hub_dp["profit"].mean() if n_hub_drivers else 0
-    hub_gini = gini_coefficient(hub_dp["profit"].values) if n_hub_drivers > 1 else 0
-    survival = (hub_dp["profit"] > 0).sum() / n_hub_drivers if n_hub_drivers else 0
-
-    n_hub_txn = len(hub_txn)
-    n_hub_acc = len(hub_acc)
-    served_rate = n_hub_acc / n_hub_txn if n_hub_txn else 0
-
-    avg_cs = hub_acc["consumer_surplus"].mean() if not hub_acc.empty else 0
-    avg_ps = hub_acc["producer_surplus"].mean() if not hub_acc.empty else 0
-
-    # Capture ratio for this hub
-    hub_barg = hub_acc.dropna(subset=["driver_min_abs", "pax_wtp"])
-    hub_barg = hub_barg[hub_barg["pax_wtp"] >= hub_barg["driver_min_abs"]]
-    if not hub_barg.empty:
-        hub_barg_surplus = hub_barg["pax_wtp"] - hub_barg["driver_min_abs"]
-        hub_capture = ((hub_barg["final_price"] - hub_barg["driver_min_abs"]) / hub_barg_surplus).clip(0, 1).mean()
-    else:
-        hub_capture = np.nan
-
-    hub_rows.append({
-        "Hub": hub,
-        "Drivers": n_hub_drivers,
-        "Avg Profit": round(avg_profit, 2),
-        "Gini": round(hub_gini, 4),
-        "Survival Rate": f"{survival:.1%}",
-        "Pax Served Rate": f"{served_rate:.1%}",
-        "Avg CS": round(avg_cs, 2),
-        "Avg PS": round(avg_ps, 2),
-        "Capture Ratio": round(hub_capture, 3) if not np.isnan(hub_capture) else "N/A"
-    })
-
-hub_table = pd.DataFrame(hub_rows)
+hub_metrics = by_hub[by_hub["drivers"] > 0]
+hub_table = pd.DataFrame({
+    "Hub": list(hub_metrics.index),
+    "Drivers": hub_metrics["drivers"].values,
+    "Avg Profit": hub_metrics["avg_profit"].round(2).values,
+    # a single driver has no inequality to measure
+    "Gini": hub_metrics["gini_profit"].where(hub_metrics["drivers"] > 1, 0).round(4).values,
+    "Survival Rate": hub_metrics["survival_rate"].map("{:.1%}".format).values,
+    "Pax Served Rate": hub_metrics["served_rate"].map("{:.1%}".format).values,
+    "Avg CS": hub_metrics["avg_cs"].fillna(0).round(2).values,
+    "Avg PS": hub_metrics["avg_ps"].fillna(0).round(2).values,
+    "Capture Ratio": [round(capture, 3) if not np.isnan(capture) else "N/A"
+                      for capture in hub_metrics["capture_ratio"]],
+})
 st.dataframe(hub_table, use_container_width=True)
 
 # Bar chart of avg profit by hub
@@ -817,64 +743,14 @@ st.markdown(
 if n_runs < 2:
     st.info("Select multiple runs to see Monte Carlo aggregation statistics.")
 else:
-    mc_rows = []
-    for rid in selected_runs:
-        r_txn = txn[txn["run_id"] == rid]
-        r_acc = accepted[accepted["run_id"] == rid]
-        r_fail_neg = failed_neg[failed_neg["run_id"] == rid]
-        r_rej = rejected[rejected["run_id"] == rid]
-        r_drv = driver_profit[driver_profit["run_id"] == rid]
-
-        n_txn = len(r_txn)
-        served = len(r_acc) / n_txn if n_txn else 0
-        failed_pct = len(r_fail_neg) / n_txn if n_txn else 0
-        rejected_pct = len(r_rej) / n_txn if n_txn else 0
-
-        cs = r_acc["consumer_surplus"].sum() if not r_acc.empty else 0
-        ps = r_acc["producer_surplus"].sum() if not r_acc.empty else 0
-        ts_val = cs + ps
-
-        # DWL for this run (failed negotiations only, not rejections)
-        ff = r_fail_neg[r_fail_neg["pax_wtp"] >= r_fail_neg["marginal_cost"]]
-        run_dwl = (ff["pax_wtp"] - ff["marginal_cost"]).sum() if not ff.empty else 0
-
-        realization = ts_val / (ts_val + run_dwl) if (ts_val + run_dwl) > 0 else 0
-
-        run_gini = gini_coefficient(r_drv["profit"].values)
-        avg_profit = r_drv["profit"].mean() if not r_drv.empty else 0
-
-        mc_rows.append({
-            "Run": rid,
-            "Served %": served,
-            "Failed Neg %": failed_pct,
-            "Rejected %": rejected_pct,
-            "Total CS": cs,
-            "Total PS": ps,
-            "Total Surplus": ts_val,
-            "DWL": run_dwl,
-            "Realization Rate": realization,
-            "Gini (Profit)": run_gini,
-            "Avg Driver Profit": avg_profit,
-        })
-
-    mc_df = pd.DataFrame(mc_rows)
+    mc_df = run_summary_table(by_run, selected_runs)
 
     # Summary stats
     st.subheader("7.1 Per-Metric Summary Across Runs")
-    metric_cols = ["Served %", "Failed Neg %", "Rejected %",
-                   "Total CS", "Total PS", "Total Surplus",
-                   "DWL", "Realization Rate", "Gini (Profit)", "Avg Driver Profit"]
-    summary_rows = []
-    for col in metric_cols:
-        vals = mc_df[col]
-        summary_rows.append({
-            "Metric": col,
-            "Mean": f"{vals.mean():.4f}",
-            "Std Dev": f"{vals.std():.4f}",
-            "Min": f"{vals.min():.4f}",
-            "Max": f"{vals.max():.4f}",
-        })
-    st.dataframe(pd.DataFrame(summary_rows), use_container_width=True)
+    summary_stats = describe_runs(mc_df)
+    for col in ["Mean", "Std Dev", "Min", "Max"]:
+        summary_stats[col] = summary_stats[col].map("{:.4f}".format)
+    st.dataframe(summary_stats, use_container_width=True)
 
     # Full run-level table
     st.subheader("7.2 Run-Level Detail")
@@ -893,13 +769,50 @@ else:
 
     # Distribution of key metrics across runs
     st.subheader("7.3 Distribution of Metrics Across Runs")
-    plot_distribution(mc_df, "Total Surplus",
-                      "Total Surplus Across Runs", "PHP", color="#2a9d8f")
-    plot_distribution(mc_df, "Gini (Profit)",
-                      "Gini Coefficient Across Runs", "Gini", color="#e76f51")
-    plot_distribution(mc_df, "Avg Driver Profit",
-                      "Average Driver Profit Across Runs", "PHP", color="#264653")
+    for col, (title, xlabel, color) in FIGURE_COLUMNS.items():
+        plot_distribution(mc_df, col, title, xlabel, color=color)
+
+# Bootstrap confidence intervals and permutation tests between run groups
+st.subheader("7.4 Resampling Inference")
+st.markdown(
+    "Confidence intervals resample transactions (and drivers for the Gini "
+    "coefficient) with replacement; the permutation test shuffles run-group "
+    "labels. Stratifying by hub resamples within each hub."
+)
+RESAMPLED_METRICS = {
+    "served_rate": "Served %",
+    "total_cs": "Total CS",
+    "total_ps": "Total PS",
+    "total_surplus": "Total Surplus",
+    "dwl": "DWL",
+    "dwl_failed": "DWL (Failed Only)",
+    "realization_rate": "Realization Rate",
+    "realization_rate_failed": "Realization Rate (Failed Only)",
+    "gini_profit": "Gini (Profit)",
+}
+col_r1, col_r2, col_r3 = st.columns(3)
+n_resamples = col_r1.number_input("Resamples", min_value=100, max_value=20000, value=1000, step=100)
+stratify = "hub" if col_r2.checkbox("Stratify by hub", value=False) else None
+run_resampling = col_r3.checkbox("Compute", value=False, key="resampling")
+
+if run_resampling:
+    ci = bootstrap_ci(txn, driver_profit, int(n_resamples), stratify_by=stratify)
+    st.dataframe(ci.rename(index=RESAMPLED_METRICS).style.format("{:.4f}"), use_container_width=True)
+
+    if n_runs >= 2:
+        col_g1, col_g2 = st.columns(2)
+        group_a = col_g1.multiselect("Group A runs", selected_runs, default=selected_runs[:n_runs // 2])
+        group_b = col_g2.multiselect("Group B runs", [r for r in selected_runs if r not in group_a],
+                                     default=[r for r in selected_runs[n_runs // 2:] if r not in group_a])
+        if group_a and group_b:
+            test = permutation_test(txn, driver_profit, group_a, group_b, int(n_resamples), stratify_by=stratify)
+            st.dataframe(test.rename(index=RESAMPLED_METRICS).style.format("{:.4f}"), use_container_width=True)
+            st.caption("Totals are per run. p-values are two-sided; totals are tested as means per transaction.")
+        else:
+            st.info("Select at least one run in each group to compare them.")
 
 st.divider()
 # st.caption("Measurement framework: descriptive and comparative, not causal. "
         #    "See design document for interpretive boundaries.")
+
+schedule_refresh()
@@ -0,0 +1,123 @@
+"""Derived frames the dashboard analyses: transactions enriched with driver,
+passenger and negotiation attributes, and the income, expenses and profit
+of every driver.
+
+Both depend only on the rows of the runs they are computed from, so they
+can be computed run by run and concatenated, which is what the per-run
+cache in run_cache.py relies on.
+"""
+import pandas as pd
+
+FUEL_EXPENSE_TYPES = ["end_gas", "midday_gas"]
+
+
+def enrich_transactions(txn, drivers, passengers, neg, gas_price):
+    """Join driver, passenger and first negotiation step attributes onto
+    the transactions and compute the price and surplus columns.
+
+    Args:
+        txn: passenger_transactions rows.
+        drivers: drivers rows of the same runs.
+        passengers: passengers rows of the same runs.
+        neg: negotiation_steps rows of the same runs.
+        gas_price: gas price per liter used for the marginal cost.
+
+    Returns:
+        The transactions in their original order. consumer_surplus and
+        producer_surplus are set on accepted transactions only.
+    """
+    # Merge driver info onto transactions
+    txn = txn.merge(
+        drivers[["id", "trike_code", "hub", "gas_consumption_rate",
+                 "aspired_price", "minimum_price"]],
+        left_on="driver_id", right_on="id", how="left", suffixes=("", "_drv")
+    )
+    # Merge passenger info onto transactions
+    txn = txn.merge(
+        passengers[["id", "willingness_to_pay", "aspired_price"]],
+        left_on="passenger_id", right_on="id", how="left", suffixes=("", "_pax")
+    )
+
+    # Compute passenger WTP & aspired price in absolute terms (per-km * distance/1000)
+    txn["pax_wtp"] = txn["willingness_to_pay"] * txn["distance"] / 1000.0
+    txn["pax_asp_abs"] = txn["aspired_price_pax"] * txn["distance"] / 1000.0
+    txn["driver_min_abs"] = txn["minimum_price"] * txn["distance"] / 1000.0
+
+    # Get initial negotiation step for driver asp at start of negotiation
+    init_neg = neg[neg["iteration"] == 0].drop_duplicates(subset=["transaction_id"])
+    txn = txn.merge(
+        init_neg[["transaction_id", "driver_asp", "passenger_asp"]],
+        left_on="id", right_on="transaction_id", how="left", suffixes=("", "_neg")
+    )
+
+    # Marginal cost proxy: gas_consumption_rate * distance * gas_price_per_liter
+    # gas_consumption_rate is liters/meter essentially; gas price ~ 58.9 PHP/L
+    txn["marginal_cost"] = txn["gas_consumption_rate"] * txn["distance"] * gas_price / 1000
+
+    # Consumer and producer surplus (accepted only)
+    agreed = txn["result"] == "agree"
+    txn["consumer_surplus"] = (txn["pax_wtp"] - txn["final_price"]).where(agreed)
+    txn["producer_surplus"] = (txn["final_price"] - txn["marginal_cost"]).where(agreed)
+    return txn
+
+
+def driver_profits(drivers, accepted, expenses, driver_days):
+    """Compute the income, expenses and profit of every driver.
+
+    Runs logged with driver_days summaries are read one row per driver per
+    day; older runs are rebuilt from their raw transactions and expenses.
+
+    Args:
+        drivers: drivers rows.
+        accepted: accepted transactions of the same runs.
+        expenses: expenses rows of the same runs.
+        driver_days: driver_days rows of the same runs, possibly empty.
+
+    Returns:
+        One row per driver, in the order of drivers.
+    """
+    if driver_days.empty:
+        driver_days = pd.DataFrame(columns=["run_id", "driver_id", "day", "agreements", "income",
+                                            "expenses", "fuel_expenses"])
+    summarized_runs = set(driver_days.loc[driver_days["fuel_expenses"].notna(), "run_id"])
+    day_totals = driver_days[driver_days["run_id"].isin(summarized_runs)].groupby("driver_id").agg(
+        income=("income", "sum"),
+        num_rides=("agreements", "sum"),
+        total_expenses=("expenses", "sum"),
+        fuel_cost=("fuel_expenses", "sum"),
+    ).reset_index()
+    day_totals["daily_expense_total"] = day_totals["total_expenses"] - day_totals["fuel_cost"]
+
+    raw_accepted = accepted[~accepted["run_id"].isin(summarized_runs)]
+    raw_expenses = expenses[~expenses["run_id"].isin(summarized_runs)]
+    raw_totals = pd.DataFrame({
+        "income": raw_accepted.groupby("driver_id")["final_price"].sum(),
+        "num_rides": raw_accepted.groupby("driver_id").size(),
+        "total_expenses": raw_expenses.groupby("driver_id")["amount"].sum(),
+        # Breakdown by expense type
+        "fuel_cost": raw_expenses[raw_expenses["expense_type"].isin(FUEL_EXPENSE_TYPES)].groupby("driver_id")["amount"].sum(),
+        "daily_expense_total": raw_expenses[raw_expenses["expense_type"] == "daily_expense"].groupby("driver_id")["amount"].sum(),
+    }).rename_axis("driver_id").reset_index()
+
+    driver_profit = drivers[["id", "trike_code", "hub", "run_id"]].copy()
+    driver_profit = driver_profit.merge(pd.concat([day_totals, raw_totals], ignore_index=True),
+                                        left_on="id", right_on="driver_id", how="left")
+    for column in ["income", "total_expenses", "fuel_cost", "daily_expense_total", "num_rides"]:
+        driver_profit[column] = driver_profit[column].fillna(0)
+    driver_profit["profit_after_gas"] = driver_profit["income"] - driver_profit["fuel_cost"]
+    driver_profit["profit"] = driver_profit["income"] - driver_profit["total_expenses"]
+    driver_profit["num_rides"] = driver_profit["num_rides"].astype(int)
+    return driver_profit
+
+
+def enrich_runs(tables, gas_price):
+    """Compute both derived frames from the frames returned by
+    load_sqlite_tables or load_parquet_tables.
+
+    Returns:
+        The enriched transactions and the driver profits.
+    """
+    _, drivers, passengers, txn, neg, expenses, driver_days = tables
+    txn = enrich_transactions(txn, drivers, passengers, neg, gas_price)
+    driver_profit = driver_profits(drivers, txn[txn["result"] == "agree"], expenses, driver_days)
+    return txn, driver_profit
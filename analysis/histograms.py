@@ -0,0 +1,243 @@
+"""Pre-binned histograms for the dashboard's distribution plots.
+
+A histogram is a dict of NumPy aggregates: bin edges, the count and the
+total of the values in each bin, and the count, sum of squares, minimum and
+maximum of all values. It is computed in one pass over the values, has a
+size fixed by the number of bins, and two histograms merge by adding their
+aggregates, so per-run histograms can be cached and combined for any
+selection of runs without going back to the rows.
+
+Each run is binned on a fine grid (FINE_BINS) over its own range. Merging
+histograms with different edges rebins them onto a common grid, assuming
+values are spread uniformly within each bin, and the displayed bins, fixed
+width or quantile based, are rebinned the same way. Means and standard
+deviations are exact; medians, quantile edges and the KDE are accurate to
+one fine bin. Since the bins are contiguous ranges of the sorted values,
+the Lorenz curve is exact at every bin boundary.
+"""
+import numpy as np
+import pandas as pd
+
+# Bins of the per-run histograms, the resolution of everything derived from them
+FINE_BINS = 512
+
+
+def fixed_edges(low, high, bins):
+    """Equal-width edges over [low, high], widened to a unit bin range
+    around the value when low == high."""
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def _empty_histogram():
+    return {"edges": np.array([0.0, 1.0]), "counts": np.zeros(1), "totals": np.zeros(1),
+            "n": 0, "sum_squares": 0.0, "min": np.nan, "max": np.nan}
+
+
+def grouped_histograms(values, groups, bins=FINE_BINS):
+    """Bin the values of every group in one pass, each group on equal-width
+    bins over its own range.
+
+    Args:
+        values: the values, NaNs are ignored.
+        groups: the group of each value, e.g. the run ID.
+        bins: number of bins per group.
+
+    Returns:
+        A dict mapping each group with values to its histogram.
+    """
+    y = np.asarray(values, dtype=float).ravel()
+    codes, uniques = pd.factorize(np.asarray(groups).ravel(), sort=True)
+    keep = ~np.isnan(y) & (codes >= 0)
+    y, codes = y[keep], codes[keep]
+    k = len(uniques)
+    if len(y) == 0:
+        return dict()
+
+    ranges = pd.Series(y).groupby(codes).agg(["min", "max"]).reindex(range(k))
+    low, high = ranges["min"].to_numpy(), ranges["max"].to_numpy()
+    point = low == high
+    low, high = np.where(point, low - 0.5, low), np.where(point, high + 0.5, high)
+    width = (high - low) / bins
+
+    # bin of each value within its group, the maximum falling in the last bin
+    index = np.clip(((y - low[codes]) / width[codes]).astype(np.int64), 0, bins - 1)
+    flat = codes * bins + index
+    counts = np.bincount(flat, minlength=k * bins).reshape(k, bins)
+    totals = np.bincount(flat, weights=y, minlength=k * bins).reshape(k, bins)
+    sum_squares = np.bincount(codes, weights=y * y, minlength=k)
+
+    histograms = dict()
+    for code, group in enumerate(uniques):
+        if counts[code].sum() == 0:
+            continue
+        histograms[group] = {
+            "edges": np.linspace(low[code], high[code], bins + 1),
+            "counts": counts[code].astype(float),
+            "totals": totals[code],
+            "n": int(counts[code].sum()),
+            "sum_squares": float(sum_squares[code]),
+            "min": float(ranges["min"].iloc[code]),
+            "max": float(ranges["max"].iloc[code]),
+        }
+    return histograms
+
+
+def histogram(values, bins=FINE_BINS):
+    """Bin the values on equal-width bins over their range."""
+    values = np.asarray(values, dtype=float).ravel()
+    return grouped_histograms(values, np.zeros(len(values), dtype=np.int64), bins).get(0, _empty_histogram())
+
+
+def rebin(hist, edges):
+    """Redistribute a histogram onto new edges, assuming the values are
+    spread uniformly within each bin.
+
+    The cumulative counts and totals are interpolated at the new edges, so
+    edges covering [min, max] keep every value.
+    """
+    edges = np.asarray(edges, dtype=float)
+    cum_counts = np.concatenate(([0.0], np.cumsum(hist["counts"])))
+    cum_totals = np.concatenate(([0.0], np.cumsum(hist["totals"])))
+    return dict(hist, edges=edges,
+                counts=np.diff(np.interp(edges, hist["edges"], cum_counts)),
+                totals=np.diff(np.interp(edges, hist["edges"], cum_totals)))
+
+
+def merge_histograms(histograms, bins=FINE_BINS):
+    """Merge histograms, e.g. the per-run histograms of a selection.
+
+    Histograms sharing the same edges are added bin by bin; otherwise every
+    histogram is first rebinned onto equal-width bins over the overall
+    range.
+
+    Returns:
+        The merged histogram, empty when no histogram has values.
+    """
+    histograms = [hist for hist in histograms if hist["n"] > 0]
+    if not histograms:
+        return _empty_histogram()
+    edges = histograms[0]["edges"]
+    if any(len(hist["edges"]) != len(edges) or not np.array_equal(hist["edges"], edges) for hist in histograms):
+        edges = fixed_edges(min(hist["min"] for hist in histograms), max(hist["max"] for hist in histograms), bins)
+        histograms = [rebin(hist, edges) for hist in histograms]
+    return {
+        "edges": edges,
+        "counts": np.sum([hist["counts"] for hist in histograms], axis=0),
+        "totals": np.sum([hist["totals"] for hist in histograms], axis=0),
+        "n": sum(hist["n"] for hist in histograms),
+        "sum_squares": sum(hist["sum_squares"] for hist in histograms),
+        "min": min(hist["min"] for hist in histograms),
+        "max": max(hist["max"] for hist in histograms),
+    }
+
+
+def histogram_quantile(hist, q):
+    """Approximate quantile(s) q of the binned values."""
+    cum_counts = np.concatenate(([0.0], np.cumsum(hist["counts"])))
+    return np.interp(q, cum_counts / hist["n"], hist["edges"])
+
+
+def quantile_edges(hist, bins):
+    """Edges holding about the same number of values per bin; bins that
+    would be empty are dropped."""
+    edges = np.unique(histogram_quantile(hist, np.linspace(0, 1, bins + 1)))
+    if len(edges) < 2:
+        return fixed_edges(hist["min"], hist["max"], 1)
+    return edges
+
+
+def display_bins(hist, bins=30, binning="fixed"):
+    """Rebin a histogram onto the bins to plot, "fixed" width over the
+    value range or "quantile" based."""
+    if binning == "quantile":
+        edges = quantile_edges(hist, bins)
+    else:
+        edges = fixed_edges(hist["min"], hist["max"], bins)
+    return rebin(hist, edges)
+
+
+def histogram_stats(hist):
+    """Mean, median, standard deviation and count of the binned values.
+    The mean and standard deviation are exact, the median interpolated."""
+    n = hist["n"]
+    total = float(np.sum(hist["totals"]))
+    mean = total / n if n else np.nan
+    variance = (hist["sum_squares"] - n * mean ** 2) / (n - 1) if n > 1 else np.nan
+    return {
+        "mean": mean,
+        "median": float(histogram_quantile(hist, 0.5)) if n else np.nan,
+        "std": float(np.sqrt(max(variance, 0.0))) if n > 1 else np.nan,
+        "n": n,
+    }
+
+
+def binned_density(hist, points=200):
+    """Gaussian kernel density estimate from the bin counts, with Scott's
+    bandwidth as in scipy and seaborn.
+
+    Returns:
+        The (x, density) points over the value range, or two empty arrays
+        when the values have no spread.
+    """
+    stats = histogram_stats(hist)
+    if not stats["n"] > 1 or not stats["std"] > 0:
+        return np.empty(0), np.empty(0)
+    bandwidth = stats["std"] * stats["n"] ** -0.2
+    centers = (hist["edges"][:-1] + hist["edges"][1:]) / 2
+    x = np.linspace(hist["min"], hist["max"], points)
+    kernel = np.exp(-0.5 * ((x[:, None] - centers[None, :]) / bandwidth) ** 2)
+    density = kernel @ hist["counts"] / (stats["n"] * bandwidth * np.sqrt(2 * np.pi))
+    return x, density
+
+
+def binned_lorenz(hist):
+    """Return the points (x, cumulative share) of the Lorenz curve at the
+    bin boundaries, or two empty arrays when there are no values."""
+    if hist["n"] == 0:
+        return np.empty(0), np.empty(0)
+    filled = hist["counts"] > 0
+    counts, totals = hist["counts"][filled], hist["totals"][filled]
+    x = np.concatenate(([0.0], np.cumsum(counts) / counts.sum()))
+    cum = np.concatenate(([0.0], np.cumsum(totals) / totals.sum()))
+    return x, cum
+
+
+# Distributions binned per run, and the frame and rows each is taken from
+DISTRIBUTIONS = {
+    "consumer_surplus": "accepted",
+    "producer_surplus": "accepted",
+    "income": "driver_profit",
+    "profit_after_gas": "driver_profit",
+    "profit": "driver_profit",
+}
+
+
+def run_histograms(txn, driver_profit, bins=FINE_BINS):
+    """Bin every distribution of DISTRIBUTIONS per run.
+
+    Args:
+        txn: enriched transactions.
+        driver_profit: driver profits.
+        bins: number of bins per run.
+
+    Returns:
+        A dict mapping each run ID to a dict of its histograms by column.
+    """
+    frames = {"accepted": txn[txn["result"] == "agree"] if not txn.empty else txn,
+              "driver_profit": driver_profit}
+    histograms = dict()
+    for column, frame_name in DISTRIBUTIONS.items():
+        frame = frames[frame_name]
+        if frame.empty or column not in frame.columns:
+            continue
+        for run_id, hist in grouped_histograms(frame[column], frame["run_id"], bins).items():
+            histograms.setdefault(int(run_id), dict())[column] = hist
+    return histograms
+
+
+def merge_run_histograms(histograms, run_ids, column):
+    """Merge the histograms of a column over the given runs."""
+    return merge_histograms([histograms[run_id][column] for run_id in run_ids
+                             if column in histograms.get(run_id, dict())])
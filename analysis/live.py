@@ -0,0 +1,230 @@
+"""Incremental loading of a SQLite log that is still being written.
+
+LiveLog keeps the rows it has loaded and the highest ID it has seen per
+table, and each refresh() reads only the rows above those high-water marks.
+New transactions are enriched on their own and appended, and driver
+profits, metrics and histograms are recomputed only for the runs that
+received new rows. Reading and enriching during a long run therefore cost in proportion
+to the rows written since the previous refresh, not to the whole history.
+
+Rows are never updated after they are written, but the high-water marks
+alone can still miss or keep stale rows. Loggers allocate IDs in blocks,
+so when several write to one database a lower ID can commit after a higher
+one has been read. And a run resumed from a checkpoint deletes its rows
+past the checkpoint and writes the same IDs again. So every refresh also
+counts each followed run's rows up to the marks, with their highest ID,
+and reloads every run whose counts differ from the rows kept. That check
+is an index scan over the followed runs. A run that was cut back and then
+rewritten to exactly the same number of rows between two refreshes still
+goes unnoticed.
+
+Only the first negotiation step of each new transaction is read, in the
+same batch as its transaction.
+"""
+import pandas as pd
+
+from enrichment import driver_profits, enrich_transactions
+from histograms import run_histograms
+from loader import (CATEGORICAL_COLUMNS, COLUMNS, _get_sqlite_columns, _run_filter, get_readonly_connection,
+                    load_sqlite_table)
+from metrics import compute_metrics
+
+# Tables read incrementally, keyed by ID
+TABLES = ["drivers", "passengers", "passenger_transactions", "expenses", "driver_days"]
+
+
+def _get_columns(table):
+    """The dashboard's columns of a table, with the ID the high-water mark
+    tracks."""
+    return ["id"] + [column for column in COLUMNS[table] if column != "id"]
+
+
+def _append(frame, new):
+    """Append new rows to a frame, keeping the categorical columns
+    categorical."""
+    if frame is None or frame.empty:
+        return new
+    if new.empty:
+        return frame
+    combined = pd.concat([frame, new], ignore_index=True)
+    for column in CATEGORICAL_COLUMNS & set(combined.columns):
+        if combined[column].dtype != "category":
+            combined[column] = combined[column].astype("category")
+    return combined
+
+
+def _count_rows(db_path, table, run_ids, max_id):
+    """Count the rows of each run up to an ID.
+
+    Returns:
+        A dict mapping each run with rows to (row count, highest ID).
+    """
+    conn = get_readonly_connection(db_path)
+    if not _get_sqlite_columns(conn, table):
+        return dict()
+    condition, params = _run_filter(run_ids)
+    rows = conn.execute(
+        f"SELECT run_id, COUNT(*), MAX(id) FROM {table} WHERE id <= ? AND {condition} GROUP BY run_id",
+        [int(max_id)] + params).fetchall()
+    return {int(run_id): (int(count), int(last_id)) for run_id, count, last_id in rows}
+
+
+def _by_run(frame):
+    """Split a frame into one frame per run."""
+    if frame.empty:
+        return dict()
+    return {run_id: rows for run_id, rows in frame.groupby("run_id", sort=False)}
+
+
+class LiveLog:
+    """Rows of some runs of a SQLite log, kept up to date incrementally.
+
+    Attributes:
+        db_path: path to the database.
+        run_ids: runs followed.
+        gas_price: gas price per liter used for the marginal cost.
+        high_water: highest ID loaded per table.
+        tables: raw rows per table, then per run.
+        txn_parts: enriched transactions per run.
+        driver_profit_parts: driver profits per run.
+        run_metrics_parts: compute_metrics output per run.
+        histogram_parts: run_histograms output per run.
+    """
+
+    def __init__(self, db_path, run_ids, gas_price):
+        self.db_path = db_path
+        self.run_ids = [int(run_id) for run_id in run_ids]
+        self.gas_price = gas_price
+        self.high_water = {table: 0 for table in TABLES}
+        self.tables = {table: dict() for table in TABLES}
+        self.txn_parts = dict()
+        self.driver_profit_parts = dict()
+        self.run_metrics_parts = dict()
+        self.histogram_parts = dict()
+
+    def _load_new_rows(self):
+        """Read the rows above the high-water marks and advance them."""
+        new_rows = dict()
+        for table in TABLES:
+            rows = load_sqlite_table(self.db_path, table, self.run_ids, _get_columns(table),
+                                     after_id=self.high_water[table])
+            if not rows.empty:
+                self.high_water[table] = int(rows["id"].max())
+            new_rows[table] = rows
+        return new_rows
+
+    def _find_stale_runs(self):
+        """Get the runs whose rows up to the high-water marks differ in
+        number or highest ID from the rows kept."""
+        stale = set()
+        for table in TABLES:
+            counts = _count_rows(self.db_path, table, self.run_ids, self.high_water[table])
+            for run_id in set(counts) | set(self.tables[table]):
+                rows = self.tables[table].get(run_id)
+                kept = (len(rows), int(rows["id"].max())) if rows is not None and not rows.empty else None
+                if counts.get(run_id) != kept:
+                    stale.add(run_id)
+        return stale
+
+    def _reload_runs(self, run_ids):
+        """Replace the rows kept for some runs with their rows up to the
+        high-water marks, and re-enrich their transactions."""
+        for run_id in run_ids:
+            for parts in (self.txn_parts, self.driver_profit_parts, self.run_metrics_parts, self.histogram_parts):
+                parts.pop(run_id, None)
+            for table in TABLES:
+                self.tables[table].pop(run_id, None)
+        for table in TABLES:
+            rows = load_sqlite_table(self.db_path, table, run_ids, _get_columns(table))
+            rows = rows[rows["id"] <= self.high_water[table]] if not rows.empty else rows
+            for run_id, run_rows in _by_run(rows).items():
+                self.tables[table][run_id] = run_rows.reset_index(drop=True)
+        negotiation_steps = load_sqlite_table(self.db_path, "negotiation_steps", run_ids)
+        for run_id in run_ids:
+            run_txn = self._get_table("passenger_transactions", run_id)
+            if run_txn.empty:
+                continue
+            self.txn_parts[run_id] = enrich_transactions(run_txn, self._get_table("drivers", run_id),
+                                                         self._get_table("passengers", run_id), negotiation_steps,
+                                                         self.gas_price)
+
+    def _get_table(self, table, run_id):
+        if run_id in self.tables[table]:
+            return self.tables[table][run_id]
+        return pd.DataFrame(columns=_get_columns(table))
+
+    def refresh(self):
+        """Load the rows written since the last refresh and update the runs
+        they belong to.
+
+        Returns:
+            The IDs of the runs that received new rows.
+        """
+        previous_transaction = self.high_water["passenger_transactions"]
+        new_rows = self._load_new_rows()
+        affected = set()
+        for table, rows in new_rows.items():
+            for run_id, run_rows in _by_run(rows).items():
+                self.tables[table][run_id] = _append(self.tables[table].get(run_id), run_rows)
+                affected.add(run_id)
+
+        # rows committed out of ID order, or deleted and rewritten by a resumed run
+        stale = self._find_stale_runs()
+        if stale:
+            self._reload_runs(sorted(stale))
+            affected |= stale
+        if not affected:
+            return affected
+
+        # new transactions are enriched on their own: every join is a lookup by ID
+        new_txn = new_rows["passenger_transactions"]
+        if not new_txn.empty:
+            new_txn = new_txn[~new_txn["run_id"].isin(stale)]
+        if not new_txn.empty:
+            new_neg = load_sqlite_table(self.db_path, "negotiation_steps", self.run_ids,
+                                        after_id=previous_transaction)
+            for run_id, run_txn in _by_run(new_txn).items():
+                enriched = enrich_transactions(run_txn, self._get_table("drivers", run_id),
+                                               self._get_table("passengers", run_id), new_neg, self.gas_price)
+                self.txn_parts[run_id] = _append(self.txn_parts.get(run_id), enriched)
+
+        for run_id in affected:
+            run_txn = self.txn_parts.get(run_id)
+            if run_txn is None:
+                continue
+            drivers = self._get_table("drivers", run_id)
+            if drivers.empty:
+                continue
+            self.driver_profit_parts[run_id] = driver_profits(
+                drivers, run_txn[run_txn["result"] == "agree"], self._get_table("expenses", run_id),
+                self._get_table("driver_days", run_id))
+            self.run_metrics_parts[run_id] = compute_metrics(run_txn, self.driver_profit_parts[run_id], "run_id")
+            self.histogram_parts[run_id] = run_histograms(run_txn, self.driver_profit_parts[run_id]).get(
+                run_id, dict())
+        return affected
+
+    def _concat(self, parts):
+        frames = [parts[run_id] for run_id in self.run_ids if run_id in parts]
+        if not frames:
+            return pd.DataFrame()
+        frame = pd.concat(frames, ignore_index=True)
+        for column in CATEGORICAL_COLUMNS & set(frame.columns):
+            frame[column] = frame[column].astype("category")
+        if "id" in frame.columns:
+            frame = frame.sort_values("id", kind="stable").reset_index(drop=True)
+        return frame
+
+    def get_transactions(self):
+        """Get the enriched transactions of every followed run."""
+        return self._concat(self.txn_parts)
+
+    def get_driver_profit(self):
+        """Get the driver profits of every followed run."""
+        return self._concat(self.driver_profit_parts)
+
+    def get_run_metrics(self):
+        """Get the per-run metrics, indexed by run_id."""
+        frames = [self.run_metrics_parts[run_id] for run_id in self.run_ids if run_id in self.run_metrics_parts]
+        if not frames:
+            return pd.DataFrame(index=pd.Index([], name="run_id"))
+        return pd.concat(frames)
@@ -0,0 +1,249 @@
+"""Loaders for the simulation logs read by the dashboard.
+
+Run selection and column lists are pushed down to the storage: SQL WHERE
+clauses for SQLite, dataset filters and projections for Parquet. Only the
+first negotiation step of each transaction is read, low-cardinality text
+columns load as categoricals and integer columns are downcast, so memory
+and load time follow the selected runs rather than the whole database.
+"""
+import os
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+TABLES = ["runs", "drivers", "passengers", "passenger_transactions", "negotiation_steps", "expenses", "driver_days"]
+
+# Columns the dashboard reads per table; tables not listed load every column
+COLUMNS = {
+    "runs": ["id", "timestamp"],
+    "drivers": ["id", "run_id", "trike_code", "hub", "gas_consumption_rate", "aspired_price", "minimum_price"],
+    "passengers": ["id", "run_id", "willingness_to_pay", "aspired_price"],
+    "passenger_transactions": ["id", "run_id", "driver_id", "passenger_id", "day", "distance", "tick",
+                               "result", "final_price"],
+    "negotiation_steps": ["transaction_id", "driver_asp", "passenger_asp", "iteration"],
+    "expenses": ["run_id", "driver_id", "expense_type", "amount"],
+    "driver_days": ["run_id", "driver_id", "day", "agreements", "income", "expenses", "fuel_expenses"],
+}
+
+# Text columns with few distinct values, loaded as categoricals
+CATEGORICAL_COLUMNS = {"hub", "result", "expense_type", "current_turn"}
+
+# Turn codes of compact negotiation storage
+TURNS = {0: "driver", 1: "passenger"}
+
+
+def compact_dtypes(frame):
+    """Convert low-cardinality text columns to categoricals and downcast
+    integer columns in place. Floats stay float64 so money totals keep
+    their precision."""
+    for column in frame.columns:
+        if column in CATEGORICAL_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        elif pd.api.types.is_integer_dtype(frame[column]):
+            frame[column] = pd.to_numeric(frame[column], downcast="integer")
+    return frame
+
+
+# Connections opened by get_readonly_connection, to close them all at once
+_readonly_connections = []
+
+
+@lru_cache(maxsize=8)
+def get_readonly_connection(db_path):
+    """Get a read-only connection to the database, shared across reruns."""
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    _readonly_connections.append(conn)
+    return conn
+
+
+def close_readonly_connections():
+    """Close the connections of get_readonly_connection and empty its
+    cache. Call it before forking worker processes: a SQLite connection
+    must not be used across fork(), so each worker opens its own."""
+    get_readonly_connection.cache_clear()
+    while _readonly_connections:
+        _readonly_connections.pop().close()
+
+
+def _get_sqlite_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _run_filter(run_ids, column="run_id"):
+    """Return a parameterized condition selecting the runs, and its
+    parameters."""
+    if run_ids is None:
+        return "1 = 1", []
+    run_ids = [int(run_id) for run_id in run_ids]
+    if not run_ids:
+        return "0 = 1", []
+    return f"{column} IN ({', '.join('?' * len(run_ids))})", run_ids
+
+
+def load_sqlite_runs(db_path):
+    """Load the runs table from the SQLite database."""
+    return load_sqlite_table(db_path, "runs")
+
+
+def load_sqlite_table(db_path, table, run_ids=None, columns=None, after_id=None):
+    """Load one table of the SQLite database.
+
+    Args:
+        db_path: path to the database file.
+        table: name of the table.
+        run_ids: runs to load, or None for every run.
+        columns: columns to load, or None for the columns in COLUMNS.
+            Columns missing from older databases are left out.
+        after_id: load only rows with a higher ID (transaction ID for
+            negotiation_steps), or None for every row.
+
+    Returns:
+        The rows as a frame, empty if the table does not exist.
+    """
+    conn = get_readonly_connection(db_path)
+    existing = _get_sqlite_columns(conn, table)
+    if not existing:
+        return pd.DataFrame()
+    wanted = columns if columns is not None else COLUMNS.get(table, existing)
+    selected = ", ".join(column for column in wanted if column in existing)
+
+    # rows come back in ID order whichever index serves the run filter
+    if table == "runs":
+        condition, params = _run_filter(run_ids, "id")
+    else:
+        condition, params = _run_filter(run_ids)
+    if after_id is not None:
+        # for negotiation_steps the condition selects the transactions
+        condition, params = f"id > ? AND {condition}", [int(after_id)] + params
+
+    if table == "runs":
+        query = f"SELECT {selected} FROM runs WHERE {condition} ORDER BY id"
+    elif table == "negotiation_steps":
+        # the first step of each transaction of the selected runs
+        query = (f"SELECT {selected} FROM negotiation_steps WHERE iteration = 0 AND transaction_id IN "
+                 f"(SELECT id FROM passenger_transactions WHERE {condition}) ORDER BY transaction_id")
+    else:
+        query = f"SELECT {selected} FROM {table} WHERE {condition} ORDER BY id"
+    return compact_dtypes(pd.read_sql(query, conn, params=params))
+
+
+def load_sqlite_tables(db_path, run_ids=None):
+    """Load every log table from the SQLite database.
+
+    Returns the frames in the order of TABLES. Tables missing from older
+    databases load as empty frames.
+    """
+    return tuple(load_sqlite_table(db_path, table, run_ids) for table in TABLES)
+
+
+def load_parquet_table(dataset_path, table, run_ids=None, columns=None, filter=None):
+    """Load one table of the Parquet log dataset written by ParquetLogSink.
+
+    The run_id and day partition columns are restored from the directory
+    names. Missing tables load as empty frames.
+
+    Args:
+        dataset_path: root directory of the dataset.
+        table: name of the table.
+        run_ids: runs to load, or None for every run.
+        columns: columns to load, or None for every column.
+        filter: additional pyarrow dataset filter expression.
+    """
+    import pyarrow.dataset as ds
+
+    table_path = os.path.join(dataset_path, table)
+    if not os.path.isdir(table_path) or not any(files for _, _, files in os.walk(table_path)):
+        return pd.DataFrame()
+    dataset = ds.dataset(table_path, format="parquet", partitioning="hive")
+    names = set(dataset.schema.names)
+    run_column = "id" if table == "runs" else "run_id"
+    expression = filter
+    if run_ids is not None and run_column in names:
+        run_expression = ds.field(run_column).isin([int(run_id) for run_id in run_ids])
+        expression = run_expression if expression is None else expression & run_expression
+    if columns is not None:
+        columns = [column for column in columns if column in names]
+    frame = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    for column in ("run_id", "day"):
+        if column in frame.columns:
+            frame[column] = frame[column].astype("int64")
+    for key in ("id", "transaction_id"):
+        if key in frame.columns:
+            frame = frame.sort_values(key, kind="stable")
+            break
+    return frame.reset_index(drop=True)
+
+
+def expand_negotiation_rounds(rounds, first_only=False):
+    """Reshape compact negotiation_rounds rows (one per transaction) into
+    negotiation_steps rows (one per round), the way the SQLite
+    negotiation_steps view does."""
+    columns = ["id", "transaction_id", "current_offer", "driver_asp", "passenger_asp", "current_turn", "iteration"]
+    steps = []
+    index = 0
+    while f"offer_{index}" in rounds.columns:
+        present = rounds[rounds["round_count"] > index]
+        steps.append(pd.DataFrame({
+            "id": -(present["transaction_id"] * 3 + index),
+            "transaction_id": present["transaction_id"],
+            "current_offer": present[f"offer_{index}"],
+            "driver_asp": present[f"driver_asp_{index}"],
+            "passenger_asp": present[f"passenger_asp_{index}"],
+            "current_turn": present[f"turn_{index}"].map(TURNS),
+            "iteration": index,
+        }, columns=columns))
+        index += 1
+        if first_only:
+            break
+    if not steps:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(steps, ignore_index=True)
+
+
+def load_parquet_negotiation_steps(dataset_path, run_ids=None, first_only=False):
+    """Load negotiation steps stored in either form, in the row-per-step
+    shape.
+
+    Args:
+        dataset_path: root directory of the dataset.
+        run_ids: runs to load, or None for every run.
+        first_only: load only the first step of each transaction.
+    """
+    import pyarrow.dataset as ds
+
+    steps = load_parquet_table(dataset_path, "negotiation_steps", run_ids,
+                               filter=ds.field("iteration") == 0 if first_only else None)
+    rounds_columns = ["transaction_id", "round_count", "offer_0", "driver_asp_0", "passenger_asp_0", "turn_0"]
+    rounds = load_parquet_table(dataset_path, "negotiation_rounds", run_ids,
+                                columns=rounds_columns if first_only else None)
+    if rounds.empty:
+        return steps
+    expanded = expand_negotiation_rounds(rounds, first_only)
+    if steps.empty:
+        return expanded
+    return pd.concat([steps[expanded.columns], expanded], ignore_index=True)
+
+
+def load_parquet_runs(dataset_path):
+    """Load the runs of the Parquet dataset."""
+    return compact_dtypes(load_parquet_table(dataset_path, "runs"))
+
+
+def load_parquet_tables(dataset_path, run_ids=None):
+    """Load every log table from the Parquet dataset.
+
+    Returns the frames in the order of TABLES, with the columns in COLUMNS
+    (plus the day partition column where the SQLite table has none).
+    """
+    frames = []
+    for table in TABLES:
+        if table == "negotiation_steps":
+            frame = load_parquet_negotiation_steps(dataset_path, run_ids, first_only=True)
+            frame = frame[[column for column in COLUMNS[table] if column in frame.columns]]
+        else:
+            frame = load_parquet_table(dataset_path, table, run_ids, COLUMNS.get(table))
+        frames.append(compact_dtypes(frame))
+    return tuple(frames)
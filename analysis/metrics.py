@@ -0,0 +1,218 @@
+"""Grouped market metrics for the dashboard.
+
+compute_metrics computes the whole metric set (access rates, consumer and
+producer surplus, deadweight loss, realization rate, bargaining capture and
+driver profit and inequality) for every group of any grouping key in one
+grouped pass over the transactions and one over the driver profits, instead
+of re-filtering the frames once per group. The dashboard sections all read
+their figures from its output: the whole selection with no key, hubs with
+"hub", runs with "run_id", and "day" or "hour" for time profiles.
+"""
+import numpy as np
+import pandas as pd
+
+from inequality import grouped_gini
+
+# Simulated days start at 06:00 (SimulationEngine resets the tick every day)
+START_HOUR = 6
+
+# Grouping keys derived from the transaction columns
+DERIVED_KEYS = {
+    "hour": lambda txn: txn["tick"] // 3600 + START_HOUR,
+}
+
+TRANSACTION_METRICS = [
+    "transactions", "accepted", "failed", "rejected", "served_rate", "failed_rate", "rejected_rate",
+    "total_cs", "avg_cs", "median_cs", "total_ps", "avg_ps", "median_ps", "total_surplus", "avg_surplus",
+    "dwl", "feasible_unserved", "avg_unrealized", "feasible_failed", "feasible_rejected", "dwl_failed",
+    "feasible_surplus", "realization_rate", "realization_rate_failed",
+    "bargains", "total_bargaining_surplus", "avg_bargaining_surplus",
+    "capture_ratio", "median_capture", "std_capture", "gini_cs", "gini_ps",
+]
+
+DRIVER_METRICS = [
+    "drivers", "total_income", "total_expenses", "total_profit", "avg_profit",
+    "covers_fuel", "profitable", "survival_rate", "gini_income", "gini_profit_after_gas", "gini_profit",
+]
+
+
+def _ratio(numerator, denominator):
+    """Element-wise ratio that is 0 where the denominator is not positive,
+    as the dashboard reports empty groups."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.Series(np.where(denominator > 0, numerator / denominator, 0.0), index=numerator.index)
+
+
+def _grouped_gini(frame, keys, column, index):
+    """Gini coefficient of column within each group of frame, aligned to
+    index."""
+    grouped = frame.groupby(keys, observed=True, sort=True)
+    # ngroup numbers the groups in the order of the groupby index, NaN for rows with a missing key
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    gini = grouped_gini(frame[column].to_numpy(dtype=float), codes)
+    gini = gini[gini.index >= 0]
+    labels = grouped.size().index.take(gini.index.to_numpy())
+    return pd.Series(gini.to_numpy(), index=labels).reindex(index)
+
+
+def metric_columns(txn):
+    """Per-transaction columns the transaction metrics are aggregated from.
+
+    Returns:
+        A frame aligned with txn: accepted, failed and rejected flags,
+        consumer, producer and total surplus of accepted transactions,
+        unrealized surplus of feasible unserved transactions (unrealized)
+        and of feasible failed negotiations (unrealized_failed), feasible
+        rejections, and bargaining surplus and driver capture of feasible
+        bargains. Columns that do not apply to a transaction are NaN.
+    """
+    result = txn["result"]
+    is_accepted = result == "agree"
+    is_failed = result == "failed"
+    is_rejected = result == "reject"
+
+    # Feasible but unserved: the passenger's WTP covers the marginal cost
+    feasible = txn["pax_wtp"] >= txn["marginal_cost"]
+    unrealized = txn["pax_wtp"] - txn["marginal_cost"]
+
+    # Zone of possible agreement: WTP covers the driver's minimum price
+    bargain = is_accepted & txn["driver_min_abs"].notna() & txn["pax_wtp"].notna() \
+        & (txn["pax_wtp"] >= txn["driver_min_abs"])
+    bargaining_surplus = (txn["pax_wtp"] - txn["driver_min_abs"]).where(bargain)
+    capture = ((txn["final_price"] - txn["driver_min_abs"]) / bargaining_surplus).clip(0, 1)
+
+    columns = pd.DataFrame({
+        "accepted": is_accepted,
+        "failed": is_failed,
+        "rejected": is_rejected,
+        "consumer_surplus": txn["consumer_surplus"],
+        "producer_surplus": txn["producer_surplus"],
+        "total_surplus": (txn["consumer_surplus"] + txn["producer_surplus"]).where(is_accepted),
+        "unrealized": unrealized.where((is_failed | is_rejected) & feasible),
+        "unrealized_failed": unrealized.where(is_failed & feasible),
+        "feasible_rejected": is_rejected & feasible,
+        "bargaining_surplus": bargaining_surplus,
+        "capture": capture.where(bargain),
+    })
+    return columns
+
+
+def _transaction_metrics(txn, keys):
+    columns = metric_columns(txn)
+    is_accepted = columns["accepted"]
+    grouped = columns.groupby([txn[key] for key in keys], observed=True, sort=True).agg(
+        transactions=("accepted", "size"),
+        accepted=("accepted", "sum"),
+        failed=("failed", "sum"),
+        rejected=("rejected", "sum"),
+        total_cs=("consumer_surplus", "sum"),
+        avg_cs=("consumer_surplus", "mean"),
+        median_cs=("consumer_surplus", "median"),
+        total_ps=("producer_surplus", "sum"),
+        avg_ps=("producer_surplus", "mean"),
+        median_ps=("producer_surplus", "median"),
+        total_surplus=("total_surplus", "sum"),
+        avg_surplus=("total_surplus", "mean"),
+        dwl=("unrealized", "sum"),
+        feasible_unserved=("unrealized", "count"),
+        avg_unrealized=("unrealized", "mean"),
+        dwl_failed=("unrealized_failed", "sum"),
+        feasible_failed=("unrealized_failed", "count"),
+        feasible_rejected=("feasible_rejected", "sum"),
+        bargains=("bargaining_surplus", "count"),
+        total_bargaining_surplus=("bargaining_surplus", "sum"),
+        avg_bargaining_surplus=("bargaining_surplus", "mean"),
+        capture_ratio=("capture", "mean"),
+        median_capture=("capture", "median"),
+        std_capture=("capture", "std"),
+    )
+    grouped["served_rate"] = _ratio(grouped["accepted"], grouped["transactions"])
+    grouped["failed_rate"] = _ratio(grouped["failed"], grouped["transactions"])
+    grouped["rejected_rate"] = _ratio(grouped["rejected"], grouped["transactions"])
+    # Realization rate counts both failed negotiations and rejections as deadweight
+    # loss; the _failed variant only failed negotiations
+    grouped["feasible_surplus"] = grouped["total_surplus"] + grouped["dwl"]
+    grouped["realization_rate"] = _ratio(grouped["total_surplus"], grouped["feasible_surplus"])
+    grouped["realization_rate_failed"] = _ratio(grouped["total_surplus"],
+                                                grouped["total_surplus"] + grouped["dwl_failed"])
+
+    # Surplus inequality across the passengers and drivers of each group
+    accepted = txn[is_accepted]
+    for column, agent, name in (("consumer_surplus", "passenger_id", "gini_cs"),
+                                ("producer_surplus", "driver_id", "gini_ps")):
+        per_agent = accepted.groupby(keys + [agent], observed=True)[column].sum().reset_index()
+        grouped[name] = _grouped_gini(per_agent, keys, column, grouped.index)
+    return grouped
+
+
+def _driver_metrics(driver_profit, keys):
+    columns = pd.DataFrame({
+        "income": driver_profit["income"],
+        "total_expenses": driver_profit["total_expenses"],
+        "profit": driver_profit["profit"],
+        "covers_fuel": driver_profit["income"] >= driver_profit["fuel_cost"],
+        "profitable": driver_profit["profit"] > 0,
+    })
+    grouped = columns.groupby([driver_profit[key] for key in keys], observed=True, sort=True).agg(
+        drivers=("profit", "size"),
+        total_income=("income", "sum"),
+        total_expenses=("total_expenses", "sum"),
+        total_profit=("profit", "sum"),
+        avg_profit=("profit", "mean"),
+        covers_fuel=("covers_fuel", "sum"),
+        profitable=("profitable", "sum"),
+    )
+    grouped["survival_rate"] = _ratio(grouped["profitable"], grouped["drivers"])
+    for column, name in (("income", "gini_income"), ("profit_after_gas", "gini_profit_after_gas"),
+                         ("profit", "gini_profit")):
+        grouped[name] = _grouped_gini(driver_profit, keys, column, grouped.index)
+    return grouped
+
+
+def compute_metrics(txn, driver_profit, by=None):
+    """Compute the metric set for every group of the grouping key.
+
+    Args:
+        txn: enriched transactions, from enrichment.enrich_transactions.
+        driver_profit: driver profits, from enrichment.driver_profits.
+        by: column name or list of column names to group by, e.g. "hub",
+            "run_id", ["run_id", "hub"], "day" or "hour", or None for the
+            whole selection.
+
+    Returns:
+        One row per group, indexed by the grouping key (a single "all" row
+        when by is None), with the columns in TRANSACTION_METRICS and, when
+        every key is a column of driver_profit, DRIVER_METRICS. Groups
+        without transactions or drivers get zero counts and NaN means.
+    """
+    if by is None:
+        # a single group holding the whole selection
+        keys = ["group"]
+        txn = txn.assign(group="all")
+        driver_profit = driver_profit.assign(group="all")
+    else:
+        keys = [by] if isinstance(by, str) else list(by)
+    for key in keys:
+        if key not in txn.columns and key in DERIVED_KEYS:
+            txn = txn.assign(**{key: DERIVED_KEYS[key](txn)})
+
+    metrics = _transaction_metrics(txn, keys)[TRANSACTION_METRICS]
+    if all(key in driver_profit.columns for key in keys):
+        drivers = _driver_metrics(driver_profit, keys)[DRIVER_METRICS]
+        metrics = metrics.join(drivers, how="outer")
+    if by is None:
+        metrics = metrics.reindex(pd.Index(["all"], name="group"))
+
+    counts = ["transactions", "accepted", "failed", "rejected", "feasible_unserved", "feasible_failed",
+              "feasible_rejected", "bargains", "drivers", "covers_fuel", "profitable"]
+    totals = ["total_cs", "total_ps", "total_surplus", "dwl", "dwl_failed", "feasible_surplus",
+              "total_bargaining_surplus", "total_income", "total_expenses", "total_profit"]
+    rates = ["served_rate", "failed_rate", "rejected_rate", "realization_rate", "realization_rate_failed",
+             "survival_rate"]
+    for column in counts:
+        if column in metrics.columns:
+            metrics[column] = metrics[column].fillna(0).astype(int)
+    for column in totals + rates:
+        if column in metrics.columns:
+            metrics[column] = metrics[column].fillna(0.0)
+    return metrics
@@ -0,0 +1,192 @@
+"""Headless report of the simulation runs, for run sets too large to browse
+in the dashboard.
+
+Computes the dashboard's per-run metrics (metrics.py) in a process pool, one
+run per task, reading each run through the per-run cache (run_cache.py), and
+writes one summary table with a row per run. With --figures it also writes
+the distributions of the key metrics across runs as PNG files, drawn with
+the non-interactive Agg backend. Streamlit is never imported.
+
+The run summary columns and the across-run statistics are shared with
+section 7 of the dashboard.
+
+Usage:
+    python analysis/report.py [--db db/simulation_logs.db | --parquet db/simulation_logs.parquet]
+                              [--runs 1 2 3] [--workers N] [--output reports] [--figures]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+from config.SimulationConfig import SimulationConfig
+from loader import close_readonly_connections, load_parquet_runs, load_sqlite_runs
+from metrics import compute_metrics
+from run_cache import load_enriched_runs
+
+# Run summary columns, as shown in the dashboard, and the metric each comes from.
+# DWL and realization rate per run count failed negotiations only, not rejections.
+RUN_SUMMARY_COLUMNS = {
+    "Served %": "served_rate",
+    "Failed Neg %": "failed_rate",
+    "Rejected %": "rejected_rate",
+    "Total CS": "total_cs",
+    "Total PS": "total_ps",
+    "Total Surplus": "total_surplus",
+    "DWL": "dwl_failed",
+    "Realization Rate": "realization_rate_failed",
+    "Gini (Profit)": "gini_profit",
+    "Avg Driver Profit": "avg_profit",
+}
+
+# Metrics whose distribution across runs is plotted
+FIGURE_COLUMNS = {
+    "Total Surplus": ("Total Surplus Across Runs", "PHP", "#2a9d8f"),
+    "Gini (Profit)": ("Gini Coefficient Across Runs", "Gini", "#e76f51"),
+    "Avg Driver Profit": ("Average Driver Profit Across Runs", "PHP", "#264653"),
+}
+
+
+def run_summary_table(run_metrics, run_ids):
+    """Build the run summary table from per-run metrics.
+
+    Args:
+        run_metrics: compute_metrics output grouped by run_id.
+        run_ids: runs to include, in order. Runs without rows get zeros,
+            and NaN for the Gini coefficient.
+
+    Returns:
+        One row per run with a Run column and the columns of
+        RUN_SUMMARY_COLUMNS.
+    """
+    run_metrics = run_metrics.reindex(list(run_ids))
+    table = pd.DataFrame({"Run": list(run_ids)})
+    for column, metric in RUN_SUMMARY_COLUMNS.items():
+        values = run_metrics[metric]
+        table[column] = (values if metric == "gini_profit" else values.fillna(0)).values
+    return table
+
+
+def describe_runs(summary):
+    """Mean, standard deviation, minimum and maximum of each metric of the
+    run summary table across runs."""
+    rows = []
+    for column in RUN_SUMMARY_COLUMNS:
+        values = summary[column]
+        rows.append({
+            "Metric": column,
+            "Mean": values.mean(),
+            "Std Dev": values.std(),
+            "Min": values.min(),
+            "Max": values.max(),
+        })
+    return pd.DataFrame(rows)
+
+
+def compute_run_metrics(log_path, source, run_id, gas_price):
+    """Compute the metrics of one run; the task run by each worker."""
+    txn, driver_profit = load_enriched_runs(log_path, [run_id], gas_price, source)
+    return compute_metrics(txn, driver_profit, "run_id")
+
+
+def compute_runs_metrics(log_path, source, run_ids, gas_price, workers=None):
+    """Compute the metrics of every run in a process pool, one run per
+    task.
+
+    Returns:
+        The per-run metrics indexed by run_id, in the order of run_ids.
+    """
+    pieces = []
+    # the workers are forked, and must not inherit this process's connections
+    close_readonly_connections()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(compute_run_metrics, log_path, source, run_id, gas_price): run_id
+                   for run_id in run_ids}
+        for done, future in enumerate(as_completed(futures), 1):
+            pieces.append(future.result())
+            print(f"\r{done}/{len(futures)} runs", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return pd.concat(pieces).reindex(pd.Index(list(run_ids), name="run_id"))
+
+
+def write_figures(summary, output_directory, bins=30):
+    """Write the distribution of each metric of FIGURE_COLUMNS across runs
+    as a PNG file, and return the paths written."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    paths = []
+    for column, (title, xlabel, color) in FIGURE_COLUMNS.items():
+        series = summary[column].dropna()
+        if series.empty:
+            continue
+        fig, ax = plt.subplots(figsize=(6, 4))
+        ax.hist(series, bins=bins, color=color, edgecolor="black")
+        stats = (
+            f"Mean: {series.mean():,.2f}\n"
+            f"Median: {series.median():,.2f}\n"
+            f"Std: {series.std():,.2f}\n"
+            f"N: {len(series):,}"
+        )
+        ax.text(0.95, 0.95, stats, transform=ax.transAxes, fontsize=9,
+                va='top', ha='right',
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel("Count")
+        name = "".join(character if character.isalnum() else "_" for character in column.lower())
+        path = os.path.join(output_directory, f"{name}.png")
+        fig.savefig(path, dpi=120, bbox_inches="tight")
+        plt.close(fig)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default=os.path.join(ROOT, "db/simulation_logs.db"),
+                        help="SQLite log database")
+    source.add_argument("--parquet", help="Parquet log dataset, instead of the SQLite database")
+    parser.add_argument("--runs", nargs="*", type=int, help="runs to report (default: every run)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output", default=os.path.join(ROOT, "reports"), help="output directory")
+    parser.add_argument("--figures", action="store_true", help="also write static figures")
+    args = parser.parse_args()
+
+    if args.parquet:
+        log_path, source = os.path.normpath(args.parquet), "Parquet"
+        runs = load_parquet_runs(log_path)
+    else:
+        log_path, source = os.path.normpath(args.db), "SQLite"
+        runs = load_sqlite_runs(log_path)
+    run_ids = args.runs or sorted(int(run_id) for run_id in runs["id"])
+    if not run_ids:
+        print(f"No simulation runs found in {log_path}")
+        return
+
+    start = time.perf_counter()
+    run_metrics = compute_runs_metrics(log_path, source, run_ids, SimulationConfig().getGasPricePerLiter(),
+                                       args.workers)
+    summary = run_summary_table(run_metrics, run_ids)
+
+    os.makedirs(args.output, exist_ok=True)
+    summary_path = os.path.join(args.output, "run_summary.csv")
+    summary.merge(run_metrics.reset_index(), left_on="Run", right_on="run_id", how="left") \
+        .drop(columns="run_id").to_csv(summary_path, index=False)
+    print(describe_runs(summary).to_string(index=False, float_format="{:.4f}".format))
+    print(f"{len(run_ids)} run(s) in {time.perf_counter() - start:.1f} s, summary written to {summary_path}")
+    if args.figures:
+        for path in write_figures(summary, args.output):
+            print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Bootstrap confidence intervals and permutation tests for the dashboard
+metrics, evaluated with NumPy over resample index matrices.
+
+Each resample is a row of an index matrix (bootstrap) or of a label matrix
+(permutation). The matrices are generated once per block of resamples, and
+every metric is evaluated for all rows at once: transaction metrics from
+sums of the per-transaction columns of metrics.metric_columns, and the Gini
+coefficient of driver profit with one inequality.grouped_gini call over
+all resampled drivers, grouped by resample. Blocks hold at most max_cells
+matrix cells, so memory stays bounded whatever the resample budget.
+
+The resampled units are transactions and, for the Gini coefficient,
+drivers. Stratifying by a column such as hub resamples or permutes within
+each stratum, keeping the stratum sizes fixed.
+"""
+import numpy as np
+import pandas as pd
+
+from inequality import grouped_gini
+from metrics import metric_columns
+
+METRICS = ["served_rate", "total_cs", "total_ps", "total_surplus", "dwl", "dwl_failed",
+           "realization_rate", "realization_rate_failed", "gini_profit"]
+
+# Per-transaction columns summed for the transaction metrics
+COMPONENTS = ["transactions", "accepted", "consumer_surplus", "producer_surplus", "total_surplus",
+              "unrealized", "unrealized_failed"]
+
+# Largest number of cells of an index or label matrix evaluated at once
+MAX_CELLS = 20_000_000
+
+
+def _components(txn):
+    """Matrix of the per-transaction columns in COMPONENTS, one row per
+    transaction, with zeros where a column does not apply."""
+    columns = metric_columns(txn)
+    columns["transactions"] = 1
+    return columns[COMPONENTS].astype(float).fillna(0.0).to_numpy()
+
+
+def _strata(frame, stratify_by):
+    """Positions of the rows of each stratum, or one stratum holding every
+    row."""
+    if stratify_by is None:
+        return [np.arange(len(frame))]
+    codes, _ = pd.factorize(frame[stratify_by], use_na_sentinel=False)
+    return [np.flatnonzero(codes == code) for code in np.unique(codes)]
+
+
+def _blocks(n_resamples, size, max_cells):
+    """Split a resample budget into blocks of at most max_cells cells."""
+    block = max(1, max_cells // max(size, 1))
+    return [min(block, n_resamples - start) for start in range(0, n_resamples, block)]
+
+
+def bootstrap_indices(strata, n_resamples, rng):
+    """Draw bootstrap samples with replacement within each stratum.
+
+    Args:
+        strata: positions of the rows of each stratum.
+        n_resamples: number of resamples.
+        rng: numpy Generator.
+
+    Returns:
+        An (n_resamples, rows) matrix of row positions, the columns of each
+        stratum drawn from that stratum only.
+    """
+    return np.hstack([positions[rng.integers(0, len(positions), size=(n_resamples, len(positions)))]
+                      for positions in strata if len(positions)])
+
+
+def permutation_labels(labels, strata, n_resamples, rng):
+    """Permute group labels within each stratum.
+
+    Args:
+        labels: boolean group label of each row.
+        strata: positions of the rows of each stratum.
+        n_resamples: number of permutations.
+        rng: numpy Generator.
+
+    Returns:
+        An (n_resamples, rows) boolean matrix, each row a permutation of
+        labels that keeps the number of labelled rows of every stratum.
+    """
+    matrix = np.empty((n_resamples, len(labels)), dtype=bool)
+    for positions in strata:
+        matrix[:, positions] = rng.permuted(np.tile(labels[positions], (n_resamples, 1)), axis=1)
+    return matrix
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+
+
+def _metrics_from_sums(sums, scale=1.0):
+    """Transaction metrics from component sums, one row per resample.
+
+    Args:
+        sums: (resamples, len(COMPONENTS)) matrix of component sums.
+        scale: divisor of the totals, e.g. the number of runs summed.
+    """
+    transactions, accepted, cs, ps, ts, dwl, dwl_failed = sums.T
+    return {
+        "served_rate": _ratio(accepted, transactions),
+        "total_cs": cs / scale,
+        "total_ps": ps / scale,
+        "total_surplus": ts / scale,
+        "dwl": dwl / scale,
+        "dwl_failed": dwl_failed / scale,
+        "realization_rate": _ratio(ts, ts + dwl),
+        "realization_rate_failed": _ratio(ts, ts + dwl_failed),
+    }
+
+
+def _resampled_gini(values, groups, n_groups):
+    """Gini coefficient of every group of a flattened resample matrix."""
+    gini = grouped_gini(values, groups)
+    return gini.reindex(np.arange(n_groups)).to_numpy()
+
+
+def bootstrap_metrics(txn, driver_profit, n_resamples=1000, stratify_by=None, seed=0, max_cells=MAX_CELLS):
+    """Evaluate the metrics over bootstrap resamples of the transactions and
+    of the drivers.
+
+    Args:
+        txn: enriched transactions.
+        driver_profit: driver profits.
+        n_resamples: resample budget.
+        stratify_by: column of both frames to resample within, e.g. "hub",
+            or None.
+        seed: seed of the random generator.
+        max_cells: largest index matrix evaluated at once.
+
+    Returns:
+        One row per resample with a column per metric of METRICS.
+    """
+    rng = np.random.default_rng(seed)
+    components = _components(txn)
+    txn_strata = _strata(txn, stratify_by)
+    profit = driver_profit["profit"].to_numpy(dtype=float)
+    driver_strata = _strata(driver_profit, stratify_by)
+
+    results = []
+    for block in _blocks(n_resamples, max(len(txn), len(driver_profit)), max_cells):
+        indices = bootstrap_indices(txn_strata, block, rng)
+        sums = np.stack([components[indices, column].sum(axis=1) for column in range(len(COMPONENTS))], axis=1)
+        metrics = _metrics_from_sums(sums)
+
+        if len(profit):
+            driver_indices = bootstrap_indices(driver_strata, block, rng)
+            groups = np.repeat(np.arange(block), driver_indices.shape[1])
+            metrics["gini_profit"] = _resampled_gini(profit[driver_indices].ravel(), groups, block)
+        else:
+            metrics["gini_profit"] = np.full(block, np.nan)
+        results.append(pd.DataFrame(metrics, columns=METRICS))
+    return pd.concat(results, ignore_index=True)
+
+
+def point_estimates(txn, driver_profit, scale=1.0):
+    """The metrics of the selection itself, computed as the resamples are."""
+    estimates = _metrics_from_sums(_components(txn).sum(axis=0, keepdims=True), scale)
+    estimates = {metric: values[0] for metric, values in estimates.items()}
+    profit = driver_profit["profit"].to_numpy(dtype=float)
+    estimates["gini_profit"] = _resampled_gini(profit, np.zeros(len(profit), dtype=np.int64), 1)[0]
+    return pd.Series(estimates)[METRICS]
+
+
+def bootstrap_ci(txn, driver_profit, n_resamples=1000, confidence=0.95, stratify_by=None, seed=0):
+    """Percentile bootstrap confidence intervals of every metric.
+
+    Returns:
+        One row per metric of METRICS with the estimate, the bootstrap
+        standard error and the interval bounds.
+    """
+    resamples = bootstrap_metrics(txn, driver_profit, n_resamples, stratify_by, seed)
+    alpha = (1 - confidence) / 2
+    return pd.DataFrame({
+        "estimate": point_estimates(txn, driver_profit),
+        "std_error": resamples.std(),
+        "ci_low": resamples.quantile(alpha),
+        "ci_high": resamples.quantile(1 - alpha),
+    }).rename_axis("metric")
+
+
+def permutation_test(txn, driver_profit, runs_a, runs_b, n_resamples=1000, stratify_by=None, seed=0,
+                     max_cells=MAX_CELLS):
+    """Permutation test of the difference of every metric between two groups
+    of runs.
+
+    Transactions and drivers of both groups are pooled and their group
+    labels permuted (within each stratum when stratify_by is set). Totals
+    are reported per run, so groups with different numbers of runs are
+    comparable, and tested as means per transaction: permutations keep the
+    number of transactions of each group, so only the mean difference is
+    centred on zero under the null hypothesis.
+
+    Args:
+        txn: enriched transactions.
+        driver_profit: driver profits.
+        runs_a: run IDs of the first group.
+        runs_b: run IDs of the second group.
+        n_resamples: permutation budget.
+        stratify_by: column of both frames to permute within, or None.
+        seed: seed of the random generator.
+        max_cells: largest label matrix evaluated at once.
+
+    Returns:
+        One row per metric of METRICS with the value of each group, their
+        difference (a - b) and the two-sided permutation p-value.
+    """
+    runs_a, runs_b = [int(run_id) for run_id in runs_a], [int(run_id) for run_id in runs_b]
+    txn = txn[txn["run_id"].isin(runs_a + runs_b)]
+    driver_profit = driver_profit[driver_profit["run_id"].isin(runs_a + runs_b)]
+    txn_labels = txn["run_id"].isin(runs_a).to_numpy()
+    driver_labels = driver_profit["run_id"].isin(runs_a).to_numpy()
+    group_a = point_estimates(txn[txn_labels], driver_profit[driver_labels], max(len(runs_a), 1))
+    group_b = point_estimates(txn[~txn_labels], driver_profit[~driver_labels], max(len(runs_b), 1))
+
+    components = _components(txn)
+    total = components.sum(axis=0)
+    scale_a, scale_b = max(txn_labels.sum(), 1), max((~txn_labels).sum(), 1)
+    txn_strata = _strata(txn, stratify_by)
+    profit = driver_profit["profit"].to_numpy(dtype=float)
+    driver_strata = _strata(driver_profit, stratify_by)
+
+    def statistics(txn_matrix, driver_matrix):
+        """Test statistics a - b for each row of the label matrices."""
+        sums_a = txn_matrix.astype(float) @ components
+        a = _metrics_from_sums(sums_a, scale_a)
+        b = _metrics_from_sums(total - sums_a, scale_b)
+        result = {metric: a[metric] - b[metric] for metric in a}
+        # one group per resample and label: 2 * resample + (label is a)
+        rows = len(driver_matrix)
+        groups = (2 * np.arange(rows)[:, None] + driver_matrix).ravel()
+        gini = _resampled_gini(np.tile(profit, rows), groups, 2 * rows).reshape(rows, 2)
+        result["gini_profit"] = gini[:, 1] - gini[:, 0]
+        return pd.DataFrame(result, columns=METRICS).to_numpy()
+
+    observed = np.abs(statistics(txn_labels[None, :], driver_labels[None, :])[0])
+    rng = np.random.default_rng(seed)
+    exceed = np.zeros(len(METRICS))
+    for block in _blocks(n_resamples, max(len(txn), len(driver_profit)), max_cells):
+        permuted = statistics(permutation_labels(txn_labels, txn_strata, block, rng),
+                              permutation_labels(driver_labels, driver_strata, block, rng))
+        # small tolerance so ties with the observed statistic count as at least as extreme
+        exceed += (np.abs(permuted) >= observed * (1 - 1e-12)).sum(axis=0)
+
+    return pd.DataFrame({
+        "group_a": group_a,
+        "group_b": group_b,
+        "difference": group_a - group_b,
+        "p_value": (1 + exceed) / (1 + n_resamples),
+    }).rename_axis("metric")
@@ -0,0 +1,180 @@
+"""Per-run cache of the derived frames computed by enrichment.py.
+
+The enriched transactions and driver profits of each run are stored as
+Parquet files in a directory next to the log (<log path>.cache), named by
+run ID and a fingerprint of the run's rows. The fingerprint is cheap to
+compute: row counts, highest IDs and column totals per table for SQLite,
+file names, sizes and modification times of the run's partitions for
+Parquet. Any insert, delete or update of a run's rows changes it, so the
+stale files are recomputed and replaced, while finished runs are read back
+instead of being reloaded and merged on every dashboard rerun.
+
+Negotiation steps are not fingerprinted: they are written in the same
+batch as their transaction.
+"""
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+from enrichment import enrich_runs
+from loader import (CATEGORICAL_COLUMNS, TABLES, _get_sqlite_columns, _run_filter, get_readonly_connection,
+                    load_parquet_tables, load_sqlite_tables)
+
+# Bump when the derived frames change so older cache files are recomputed
+CACHE_VERSION = 1
+
+FRAMES = ("txn", "driver_profit")
+
+# Columns totalled into the fingerprint of each table, besides the row count and highest ID
+FINGERPRINT_COLUMNS = {
+    "drivers": ["gas_consumption_rate", "minimum_price"],
+    "passengers": ["willingness_to_pay", "aspired_price"],
+    "passenger_transactions": ["distance", "final_price"],
+    "expenses": ["amount"],
+    "driver_days": ["income", "expenses", "fuel_expenses"],
+}
+
+
+def get_cache_directory(log_path):
+    """Get the cache directory of a SQLite database or Parquet dataset."""
+    return os.path.normpath(log_path) + ".cache"
+
+
+def get_sqlite_fingerprints(db_path, run_ids):
+    """Get the content of each run's rows that the fingerprint covers.
+
+    Returns:
+        A dict mapping each run ID to a list of (table, count, max id,
+        totals...) tuples.
+    """
+    conn = get_readonly_connection(db_path)
+    condition, params = _run_filter(run_ids)
+    contents = {int(run_id): [] for run_id in run_ids}
+    for table, columns in FINGERPRINT_COLUMNS.items():
+        existing = _get_sqlite_columns(conn, table)
+        if not existing:
+            continue
+        totals = "".join(f", TOTAL({column})" for column in columns if column in existing)
+        query = f"SELECT run_id, COUNT(*), MAX(id){totals} FROM {table} WHERE {condition} GROUP BY run_id"
+        for run_id, *values in conn.execute(query, params):
+            contents[run_id].append((table, *values))
+    return contents
+
+
+def get_parquet_fingerprints(dataset_path, run_ids):
+    """Get the files of each run's partitions, with their sizes and
+    modification times."""
+    contents = dict()
+    for run_id in run_ids:
+        files = []
+        for table in TABLES:
+            run_path = os.path.join(dataset_path, table, f"run_id={int(run_id)}")
+            for root, _, names in os.walk(run_path):
+                for name in names:
+                    stat = os.stat(os.path.join(root, name))
+                    files.append((os.path.relpath(os.path.join(root, name), dataset_path),
+                                  stat.st_size, stat.st_mtime_ns))
+        contents[int(run_id)] = sorted(files)
+    return contents
+
+
+def _hash(content, gas_price):
+    return hashlib.sha1(repr((CACHE_VERSION, gas_price, content)).encode()).hexdigest()[:16]
+
+
+def _get_cache_path(directory, run_id, fingerprint, frame):
+    return os.path.join(directory, f"run-{run_id}-{fingerprint}.{frame}.parquet")
+
+
+def _read_run(directory, run_id, fingerprint):
+    """Read a run's cached frames, or return None if they are missing."""
+    paths = [_get_cache_path(directory, run_id, fingerprint, frame) for frame in FRAMES]
+    if not all(os.path.isfile(path) for path in paths):
+        return None
+    try:
+        return tuple(pd.read_parquet(path) for path in paths)
+    except Exception:
+        # a corrupt or unreadable file is recomputed
+        return None
+
+
+def _write_run(directory, run_id, fingerprint, frames):
+    """Write a run's frames and remove the files of its older
+    fingerprints."""
+    os.makedirs(directory, exist_ok=True)
+    current = set()
+    for frame, data in zip(FRAMES, frames):
+        path = _get_cache_path(directory, run_id, fingerprint, frame)
+        # written under a temporary name so readers never see a partial file
+        data.reset_index(drop=True).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        current.add(path)
+    for path in glob.glob(os.path.join(directory, f"run-{run_id}-*.parquet")):
+        if path not in current:
+            os.remove(path)
+
+
+def _concat(pieces, key):
+    """Concatenate per-run frames back into one frame in ID order, with
+    the categoricals the loaders produce."""
+    non_empty = [piece for piece in pieces if not piece.empty]
+    frame = pd.concat(non_empty or pieces[:1], ignore_index=True)
+    frame = frame.sort_values(key, kind="stable").reset_index(drop=True)
+    for column in CATEGORICAL_COLUMNS & set(frame.columns):
+        frame[column] = frame[column].astype("category")
+    return frame
+
+
+def load_enriched_runs(log_path, run_ids, gas_price, source="SQLite"):
+    """Load the enriched transactions and driver profits of the runs,
+    computing and caching those of runs that are not cached yet or whose
+    rows changed.
+
+    Args:
+        log_path: path to the SQLite database or Parquet dataset.
+        run_ids: runs to load.
+        gas_price: gas price per liter used for the marginal cost.
+        source: "SQLite" or "Parquet".
+
+    Returns:
+        The enriched transactions and the driver profits of the runs, in ID
+        order.
+    """
+    run_ids = [int(run_id) for run_id in run_ids]
+    directory = get_cache_directory(log_path)
+    if source == "Parquet":
+        contents = get_parquet_fingerprints(log_path, run_ids)
+    else:
+        contents = get_sqlite_fingerprints(log_path, run_ids)
+    fingerprints = {run_id: _hash(contents[run_id], gas_price) for run_id in run_ids}
+
+    pieces = dict()
+    missing = []
+    for run_id in run_ids:
+        frames = _read_run(directory, run_id, fingerprints[run_id])
+        if frames is None:
+            missing.append(run_id)
+        else:
+            pieces[run_id] = frames
+
+    if missing:
+        if source == "Parquet":
+            tables = load_parquet_tables(log_path, missing)
+        else:
+            tables = load_sqlite_tables(log_path, missing)
+        derived = enrich_runs(tables, gas_price)
+        by_run = [dict(tuple(frame.groupby("run_id", sort=False))) for frame in derived]
+        for run_id in missing:
+            frames = tuple(runs.get(run_id, frame.iloc[:0]) for runs, frame in zip(by_run, derived))
+            try:
+                _write_run(directory, run_id, fingerprints[run_id], frames)
+            except OSError:
+                # a read-only location only loses the caching
+                pass
+            pieces[run_id] = frames
+
+    txn = _concat([pieces[run_id][0] for run_id in run_ids], "id")
+    driver_profit = _concat([pieces[run_id][1] for run_id in run_ids], "id")
+    return txn, driver_profit
@@ -0,0 +1,83 @@
+"""Follow the KPI telemetry of a running simulation.
+
+Reads the newline-delimited JSON written by TelemetryPublisher, either by
+following the telemetry file as it grows or by connecting to the telemetry
+socket, and prints one line per simulated minute. Nothing is read from the
+log database.
+
+Usage:
+    python analysis/telemetry_tail.py (--file telemetry.ndjson | --socket /tmp/telemetry.sock)
+                                      [--from-start] [--raw]
+"""
+import argparse
+import json
+import socket
+import sys
+import time
+
+
+def follow_file(path, from_start=False, poll_interval=0.5):
+    """Yield the lines appended to a file, waiting for new ones."""
+    with open(path) as file:
+        if not from_start:
+            file.seek(0, 2)
+        partial = ""
+        while True:
+            line = file.readline()
+            if not line:
+                time.sleep(poll_interval)
+                continue
+            partial += line
+            # a line still being written has no newline yet
+            if partial.endswith("\n"):
+                yield partial
+                partial = ""
+
+
+def follow_socket(path):
+    """Yield the lines received from the telemetry socket until the
+    simulation closes it."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        with client.makefile("r") as stream:
+            yield from stream
+
+
+def format_kpis(kpis):
+    """One-line summary of a KPI record."""
+    dispatch = kpis["dispatch"]
+    states = " ".join(f"{state.lower()}={count}" for state, count in sorted(kpis["tricycles"].items()))
+    queued = sum(kpis["queues"].values())
+    speed = kpis["ticks_per_second"]
+    rejection_probability = kpis.get("rejection_probability")
+    return (f"run {kpis['run_id']} day {kpis['day'] + 1} {kpis['clock']} | {states} | "
+            f"queued {queued} | attempts {dispatch['attempts']} accepts {dispatch['accepts']} "
+            f"failures {dispatch['failures']} rejects {dispatch['rejects']}"
+            f"{f' (p {rejection_probability:.3f})' if rejection_probability is not None else ''} | "
+            f"fuel {kpis['fleet_fuel']:,.1f} L money PHP {kpis['fleet_money']:,.2f} | "
+            f"{f'{speed:,.0f}' if speed is not None else '-'} ticks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="telemetry file to follow")
+    source.add_argument("--socket", help="telemetry socket to connect to")
+    parser.add_argument("--from-start", action="store_true", help="print the records already in the file")
+    parser.add_argument("--raw", action="store_true", help="print the JSON records unchanged")
+    args = parser.parse_args()
+
+    lines = follow_file(args.file, args.from_start) if args.file else follow_socket(args.socket)
+    try:
+        for line in lines:
+            if args.raw:
+                sys.stdout.write(line)
+            else:
+                print(format_kpis(json.loads(line)))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
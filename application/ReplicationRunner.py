@@ -0,0 +1,304 @@
+import contextlib
+import copy
+import os
+import random
+import secrets
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import traci
+
+from application.SimulationEngine import SimulationEngine
+from application.WorkerPool import WorkerPool
+from config.SimulationConfig import SimulationConfig
+from infrastructure.CheckpointStore import CheckpointStore
+from infrastructure.LogSink import LogSink
+from infrastructure.ParquetLogSink import ParquetLogSink
+from infrastructure.PassengerFactory import PassengerFactory
+from infrastructure.ShardMerger import ShardMerger
+from infrastructure.SimulationLogger import SimulationLogger
+from infrastructure.SqliteLogSink import SqliteLogSink, getShardPath
+from infrastructure.SumoRepository import SumoRepository
+from infrastructure.TelemetryPublisher import TelemetryPublisher
+from infrastructure.TricycleDispatcher import TricycleDispatcher
+from infrastructure.TricycleFactory import TricycleFactory
+from infrastructure.TricycleRepository import TricycleRepository
+from infrastructure.TricycleStateManager import TricycleStateManager
+from utils.ParkingAreaParser import parseParkingAreaFile
+
+def seedReplication(seed: int | None) -> None:
+    """Seed the random generators the simulation draws from: random, and
+    NumPy's global generator behind np.random and scipy's rvs()."""
+    if seed is None:
+        return
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+
+def createLogSink(simulation_config: SimulationConfig) -> LogSink:
+    """Create the log sink chosen by the configuration: the SQLite database
+    or shard, or the Parquet dataset."""
+    if simulation_config.getLogSink() == "parquet":
+        return ParquetLogSink(simulation_config.getLogDatasetPath())
+    if simulation_config.getLogSink() != "sqlite":
+        raise Exception(f"Invalid log sink. Was: {simulation_config.getLogSink()}")
+    shard_name = simulation_config.getLogShardName()
+    return SqliteLogSink(getShardPath(shard_name) if shard_name else None,
+                         in_memory=simulation_config.getLogInMemory(),
+                         snapshot_interval=simulation_config.getLogSnapshotInterval())
+
+def runReplication(simulation_config: SimulationConfig, number_of_days: int, duration: int,
+                   seed: int | None = None, traci_port: int | None = None, traci_label: str = "default",
+                   telemetry_publisher: TelemetryPublisher | None = None,
+                   checkpoint_store: CheckpointStore | None = None, resume_day: int | None = None) -> dict:
+    """Run one replication: a fleet simulated for number_of_days days with
+    its own SUMO instance and logger.
+
+    With a checkpoint store, the replication is checkpointed after every
+    day. Resumed from the checkpoint of a day, it continues the same run:
+    rows logged after the checkpoint are deleted, and the remaining days
+    produce the same output as an uninterrupted run. Logged to SQLite, the
+    rows in ID blocks reserved after the checkpoint may get other IDs, as
+    other loggers of the database may have reserved IDs since.
+
+    Args:
+        simulation_config: configuration; its log settings choose where the
+            replication is logged.
+        number_of_days: days simulated.
+        duration: ticks per day.
+        seed: seed of the Python, NumPy and SUMO random generators, or None
+            to leave them unseeded.
+        traci_port: TraCI port of the SUMO instance, or None for any free
+            port.
+        traci_label: name of the TraCI connection.
+        telemetry_publisher: publisher of the per-minute KPIs, or None.
+        checkpoint_store: store the day-boundary checkpoints are saved to
+            and resumed from, or None.
+        resume_day: day of the checkpoint to resume from, or None to start
+            a new run.
+
+    Returns:
+        A dict with the run ID, the ticks simulated, the wall time and the
+        dispatcher's rejection statistics.
+    """
+    start = time.perf_counter()
+    seedReplication(seed)
+    checkpoint, sumo_state_path = None, None
+    if resume_day is not None:
+        checkpoint, sumo_state_path = checkpoint_store.load(resume_day)
+    sumo_repository = SumoRepository(simulation_config.getNetworkFilePath())
+    toda_hub_descriptor = parseParkingAreaFile(simulation_config.getParkingFilePath())
+    tricycle_factory = TricycleFactory(simulation_config)
+    log_sink = createLogSink(simulation_config)
+    logger = SimulationLogger(log_sink,
+                              compact_negotiations=simulation_config.getCompactNegotiationLog(),
+                              log_level=simulation_config.getLogLevel(),
+                              sample_fraction=simulation_config.getLogSampleFraction(),
+                              run_id=checkpoint["logger"]["run_id"] if checkpoint is not None else None)
+    tricycle_repository = TricycleRepository(sumo_repository, tricycle_factory, simulation_config, logger)
+    passenger_factory = PassengerFactory(sumo_repository, simulation_config, logger)
+    tricycle_dispatcher = TricycleDispatcher(tricycle_repository, passenger_factory, simulation_config)
+    tricycle_state_manager = TricycleStateManager(tricycle_repository, logger)
+
+    first_day = 0
+    if checkpoint is not None:
+        tricycle_repository.restoreCheckpoint(checkpoint["tricycles"])
+        passenger_factory.restoreCheckpoint(checkpoint["passengers"])
+        tricycle_dispatcher.restoreCheckpoint(checkpoint["dispatcher"])
+        logger.restoreCheckpoint(checkpoint["logger"], tricycle_repository.getTricycles())
+        random.setstate(checkpoint["random"])
+        np.random.set_state(checkpoint["numpy_random"])
+        first_day = logger.day
+
+    try:
+        for day in range(first_day, number_of_days):
+            print(f"\n\nrunning run# {logger.runId}, day# {day + 1}...")
+            simulation_loop = SimulationEngine(toda_hub_descriptor, simulation_config, tricycle_dispatcher,
+                                               tricycle_repository, tricycle_state_manager, logger, duration,
+                                               first_run=(day == 0), telemetry_publisher=telemetry_publisher,
+                                               traci_port=traci_port, traci_label=traci_label, sumo_seed=seed,
+                                               sumo_state_path=sumo_state_path if day == first_day else None)
+            simulation_loop.doMainLoop(duration)
+            simulation_loop.close()
+            tricycle_repository.startRefuelAllTricycles()
+            tricycle_repository.startExpenseAllTricycles()
+            logger.nextDay()
+            if checkpoint_store is not None:
+                checkpoint_store.save(logger.day, {
+                    "logger": logger.getCheckpoint(),
+                    "tricycles": tricycle_repository.getCheckpoint(),
+                    "passengers": passenger_factory.getCheckpoint(),
+                    "dispatcher": tricycle_dispatcher.getCheckpoint(),
+                    "random": random.getstate(),
+                    "numpy_random": np.random.get_state(),
+                }, traci.simulation.saveState)
+    finally:
+        # Flush remaining log rows and close TraCI, also when a day failed
+        logger.close()
+        with contextlib.suppress(Exception):
+            traci.close()
+    rejection_statistics = tricycle_dispatcher.getRejectionStatistics()
+    if rejection_statistics["rejection_probability"] is not None:
+        print(f"\nrun# {logger.runId}: {rejection_statistics['rejections']} of "
+              f"{rejection_statistics['attempts']} dispatch attempts rejected, mean rejection probability "
+              f"{rejection_statistics['rejection_probability']:.3f}")
+    return {
+        "run_id": logger.runId,
+        "ticks": (number_of_days - first_day) * duration,
+        "wall_time": time.perf_counter() - start,
+        "rejection_statistics": rejection_statistics,
+    }
+
+def _removeShard(shard_path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(shard_path + suffix)
+
+def _runWorker(simulation_config: SimulationConfig, number_of_days: int, duration: int, seed: int,
+               traci_label: str, quiet: bool) -> dict:
+    """Process pool task: run one replication on a free TraCI port, with its
+    console output discarded when quiet."""
+    # the port is chosen in the worker, where SUMO binds it
+    if not quiet:
+        return runReplication(simulation_config, number_of_days, duration, seed, None, traci_label)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return runReplication(simulation_config, number_of_days, duration, seed, None, traci_label)
+
+class ReplicationRunner:
+    """Runs independent replications of the simulation in a process pool.
+
+    Each replication runs in its own worker process with its own SUMO
+    instance on a free TraCI port and its own label, its own seed (base seed
+    plus replication number, for Python, NumPy and SUMO) and its own shard
+    database, so workers share nothing. A failed replication is retried
+    with a fresh shard, up to maxRetries times; this includes a replication
+    whose worker died, which WorkerPool recovers from. The shards of the
+    completed replications can then be merged into one log database with
+    ShardMerger.
+
+    Attributes:
+        simulationConfig: configuration copied to every worker.
+        numberOfDays: days simulated per replication.
+        duration: ticks per day.
+        workers: number of worker processes.
+        baseSeed: seed of replication 0.
+        maxRetries: retries of a failed replication.
+        shardPrefix: prefix of this batch's shard names.
+        quiet: whether the workers' console output is discarded.
+    """
+
+    def __init__(self, simulation_config: SimulationConfig, number_of_days: int, duration: int,
+                 workers: int | None = None, base_seed: int | None = None, max_retries: int = 2,
+                 shard_prefix: str | None = None, quiet: bool = True) -> None:
+        """Initializes the runner.
+
+        Args:
+            simulation_config: configuration copied to every worker.
+            number_of_days: days simulated per replication.
+            duration: ticks per day.
+            workers: number of worker processes. Defaults to the CPU count.
+            base_seed: seed of replication 0; replication i uses
+                base_seed + i. Defaults to a random seed, reported by run()
+                so the batch can be reproduced.
+            max_retries: retries of a failed replication.
+            shard_prefix: prefix of the shard names. Defaults to a
+                timestamp, so batches never append to each other's shards.
+            quiet: discard the workers' console output.
+        """
+        self.simulationConfig = simulation_config
+        self.numberOfDays = number_of_days
+        self.duration = duration
+        self.workers = workers or os.cpu_count() or 1
+        self.baseSeed = base_seed if base_seed is not None else secrets.randbits(32)
+        self.maxRetries = max(0, int(max_retries))
+        self.shardPrefix = shard_prefix or f"replications-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        self.quiet = quiet
+
+    def getShardName(self, replication: int) -> str:
+        return f"{self.shardPrefix}-{replication:04d}"
+
+    def _submit(self, pool: WorkerPool, replication: int) -> None:
+        config = copy.copy(self.simulationConfig)
+        config.logShardName = self.getShardName(replication)
+        pool.submit(replication, _runWorker, config, self.numberOfDays, self.duration, self.baseSeed + replication,
+                    f"replication-{replication}", self.quiet)
+
+    def run(self, replications: int) -> dict:
+        """Run the replications and report their aggregate throughput.
+
+        Args:
+            replications: number of replications.
+
+        Returns:
+            A dict with the base seed, the results of the completed
+            replications by number (run ID, shard path, seed, attempts,
+            ticks and wall time), the errors of the failed ones, the total
+            wall time, and throughput in replications per hour and
+            simulated ticks per second.
+        """
+        start = time.perf_counter()
+        results = dict()
+        errors = dict()
+        attempts = {replication: 0 for replication in range(replications)}
+        queue = deque(range(replications))
+        pool = WorkerPool(min(self.workers, max(replications, 1)))
+        try:
+            while queue or pool.hasTasks():
+                # a suspect of a broken pool waits until it can run alone
+                while queue and pool.canSubmit(queue[0]):
+                    self._submit(pool, queue.popleft())
+                for replication, result, error in pool.wait():
+                    attempts[replication] += 1
+                    shard_path = getShardPath(self.getShardName(replication))
+                    if error is not None:
+                        # a failed attempt's shard holds a partial run; retry on a fresh one
+                        _removeShard(shard_path)
+                        errors[replication] = "".join(traceback.format_exception_only(type(error), error)).strip()
+                        print(f"replication {replication} failed (attempt {attempts[replication]}): "
+                              f"{errors[replication]}")
+                        if attempts[replication] <= self.maxRetries:
+                            queue.append(replication)
+                        continue
+                    errors.pop(replication, None)
+                    results[replication] = dict(result, shard_path=shard_path, seed=self.baseSeed + replication,
+                                                attempts=attempts[replication])
+                    print(f"replication {replication} done in {result['wall_time']:.1f} s "
+                          f"({len(results)}/{replications})")
+        finally:
+            pool.shutdown()
+
+        wall_time = time.perf_counter() - start
+        ticks = sum(result["ticks"] for result in results.values())
+        return {
+            "base_seed": self.baseSeed,
+            "results": results,
+            "errors": errors,
+            "wall_time": wall_time,
+            "replications_per_hour": len(results) * 3600 / wall_time if wall_time > 0 else None,
+            "ticks_per_second": ticks / wall_time if wall_time > 0 else None,
+        }
+
+    def mergeShards(self, summary: dict, target_path: str) -> list[str]:
+        """Merge the shards of the completed replications into a log
+        database.
+
+        Args:
+            summary: the output of run().
+            target_path: database merged into.
+
+        Returns:
+            The paths of the shards merged.
+        """
+        # Parquet runs are written to the dataset directly, without shards
+        shard_paths = [summary["results"][replication]["shard_path"] for replication in sorted(summary["results"])]
+        shard_paths = [path for path in shard_paths if os.path.exists(path)]
+        if not shard_paths:
+            return []
+        merger = ShardMerger(target_path)
+        merger.open()
+        try:
+            return merger.mergeShards(shard_paths)
+        finally:
+            merger.close()
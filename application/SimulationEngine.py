@@ -1,6 +1,7 @@
 import traci
 import random
 import math
+from collections import Counter
 from infrastructure.TricycleRepository import TricycleRepository
 from domain.TodaHubDescriptor import TodaHubDescriptor
 from config.SimulationConfig import SimulationConfig
@@ -8,10 +9,11 @@ from infrastructure.TricycleDispatcher import TricycleDispatcher
 from infrastructure.TricycleStateManager import TricycleStateManager
 from infrastructure.SimulationLogger import SimulationLogger
 from infrastructure.TodaRepository import TodaRepository
+from infrastructure.TelemetryPublisher import TelemetryPublisher
 from utils.TraciUtils import getVehiclesInSimulation
 
 class SimulationEngine:
-    def __init__(self, toda_hub_descriptor: TodaHubDescriptor, simulation_config: SimulationConfig, tricycle_dispatcher: TricycleDispatcher, tricycle_repository: TricycleRepository, tricycle_state_manager: TricycleStateManager, logger: SimulationLogger, duration: int, first_run: bool = True) -> None:
+    def __init__(self, toda_hub_descriptor: TodaHubDescriptor, simulation_config: SimulationConfig, tricycle_dispatcher: TricycleDispatcher, tricycle_repository: TricycleRepository, tricycle_state_manager: TricycleStateManager, logger: SimulationLogger, duration: int, first_run: bool = True, telemetry_publisher: TelemetryPublisher | None = None, traci_port: int | None = None, traci_label: str = "default", sumo_seed: int | None = None, sumo_state_path: str | None = None) -> None:
         self.tick = 0
         self.tricycleRepository = tricycle_repository
         self.tricycleDispatcher = tricycle_dispatcher
@@ -21,15 +23,33 @@ class SimulationEngine:
         self.simulationLogger = logger
         self.duration = duration
         self.first_run = first_run
+        self.telemetryPublisher = telemetry_publisher
+        # SUMO connection options, used on the first day when TraCI starts
+        self.traciPort = traci_port
+        self.traciLabel = traci_label
+        self.sumoSeed = sumo_seed
+        # SUMO state of a checkpoint, loaded when TraCI starts on a resumed day
+        self.sumoStatePath = sumo_state_path
         if first_run:
             self.tricycleRepository.createTricycles(toda_hub_descriptor.getNumberOfTricycles(), toda_hub_descriptor.getHubDistribution())
             for tricycle in self.tricycleRepository.getTricycles():
                 self.simulationLogger.addDriver(tricycle)
         self.todaRepository = None
 
-    def startTraci(self) -> None:
+    def startTraci(self, port: int | None = None, label: str = "default", seed: int | None = None) -> None:
+        """Start SUMO and connect TraCI to it.
+
+        Args:
+            port: TraCI port, or None for any free port. Processes starting
+                SUMO at the same time should use distinct ports.
+            label: name of the TraCI connection, made the current one.
+            seed: SUMO random seed, or None for SUMO's default.
+        """
         additionalFiles = f"{self.simulationConfig.getParkingFilePath()},{self.simulationConfig.getDecalFilePath()}"
         additionalFiles = f"{self.simulationConfig.getParkingFilePath()}"
+        seed_options = ["--seed", str(seed)] if seed is not None else []
+        # concurrent SUMO instances each get their own error log
+        error_log = "tmp.txt" if label == "default" else f"tmp-{label}.txt"
         traci.start([
             "sumo",
             "-n", self.simulationConfig.getNetworkFilePath(),
@@ -42,12 +62,17 @@ class SimulationEngine:
             "--duration-log.disable", "true",
             "--no-warnings", "true",
             "--verbose", "false",
-            "--error-log", "tmp.txt"
-        ])
+            "--error-log", error_log,
+            # saved states carry SUMO's random generators, for checkpoints
+            "--save-state.rng", "true",
+            *seed_options
+        ], port=port, label=label)
 
     def doMainLoop(self, simulation_duration: int) -> None:
-        if self.first_run:
-            self.startTraci()
+        if self.first_run or self.sumoStatePath is not None:
+            self.startTraci(self.traciPort, self.traciLabel, self.sumoSeed)
+        if self.sumoStatePath is not None:
+            traci.simulation.loadState(self.sumoStatePath)
         self.todaRepository = TodaRepository()
         
         while self.tick < simulation_duration:
@@ -57,7 +82,33 @@ class SimulationEngine:
             self.tick += 1
             if self.tick % 60 == 0:
                 print(f"\rCurrent time: {math.floor(self.tick / 3600) + 6:02d}:{math.floor((self.tick % 3600) / 60):02d}:{self.tick % 60:02d}                 ", end="")
+                # KPIs are only collected when someone receives them
+                if self.telemetryPublisher is not None and self.telemetryPublisher.isListening():
+                    self.telemetryPublisher.publish(self.getKpis())
             traci.simulationStep()
 
+    def getKpis(self) -> dict:
+        """Get the simulation KPIs at the current tick, from the state held
+        in memory: tricycles by state, TODA queue lengths, cumulative
+        dispatch counts, the mean rejection probability of the dispatch
+        attempts, fleet fuel and money, and ticks per second since the
+        previous KPIs."""
+        tricycles = self.tricycleRepository.getTricycles()
+        ticks_per_second = self.telemetryPublisher.getTicksPerSecond(self.tick) \
+            if self.telemetryPublisher is not None else None
+        return {
+            "run_id": self.simulationLogger.runId,
+            "day": self.simulationLogger.day,
+            "tick": self.tick,
+            "clock": f"{math.floor(self.tick / 3600) + 6:02d}:{math.floor((self.tick % 3600) / 60):02d}",
+            "tricycles": dict(Counter(tricycle.state.name for tricycle in tricycles)),
+            "queues": {toda: len(queue) for toda, queue in self.todaRepository.getAllToda().items()},
+            "dispatch": self.tricycleDispatcher.getDispatchCounts(),
+            "rejection_probability": self.tricycleDispatcher.getRejectionStatistics()["rejection_probability"],
+            "fleet_fuel": round(float(sum(tricycle.currentGas for tricycle in tricycles)), 3),
+            "fleet_money": round(float(sum(tricycle.money for tricycle in tricycles)), 2),
+            "ticks_per_second": round(ticks_per_second, 1) if ticks_per_second is not None else None,
+        }
+
     def close(self) -> None:
         self.tick = 0
\ No newline at end of file
@@ -0,0 +1,352 @@
+import copy
+import json
+import os
+import sqlite3
+import time
+import traceback
+from datetime import datetime
+from itertools import product
+
+import numpy as np
+
+from application.ReplicationRunner import _removeShard, _runWorker
+from application.WorkerPool import WorkerPool
+from config.SimulationConfig import SimulationConfig
+from infrastructure.ShardMerger import ShardMerger
+from infrastructure.SqliteLogSink import getShardPath
+
+LEDGER_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS sweeps (
+        name TEXT PRIMARY KEY,
+        spec TEXT,
+        created_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sweep_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sweep TEXT REFERENCES sweeps(name),
+        config_index INTEGER,
+        replication INTEGER,
+        parameters TEXT,
+        seed INTEGER,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        run_id INTEGER,
+        shard_path TEXT,
+        merged_path TEXT,
+        merged_run_id INTEGER,
+        error TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        wall_time REAL,
+        UNIQUE (sweep, config_index, replication)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_sweep_jobs_status ON sweep_jobs(sweep, status)",
+]
+
+# Columns added to sweep_jobs since it was created, added to older ledgers on open
+LEDGER_COLUMNS = {
+    "merged_path": "TEXT",
+    "merged_run_id": "INTEGER",
+}
+
+def _getParameterType(name: str) -> type:
+    """Get the type of a SimulationConfig class attribute, rejecting names
+    that are not configuration parameters."""
+    if name.startswith("_") or not hasattr(SimulationConfig, name) or callable(getattr(SimulationConfig, name)):
+        raise ValueError(f"Unknown SimulationConfig parameter: {name}")
+    value = getattr(SimulationConfig, name)
+    return type(value) if value is not None else object
+
+def gridDesign(parameters: dict[str, list]) -> list[dict]:
+    """Expand a full factorial design: every combination of the values of
+    the parameters.
+
+    Args:
+        parameters: SimulationConfig attribute names mapped to the values
+            to try.
+
+    Returns:
+        One dict of parameter values per configuration.
+    """
+    for name in parameters:
+        _getParameterType(name)
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in product(*(parameters[name] for name in names))]
+
+def latinHypercubeDesign(ranges: dict[str, tuple[float, float]], samples: int, seed: int = 0) -> list[dict]:
+    """Draw a Latin hypercube design: each parameter's range is cut into
+    samples equal strata and every stratum is sampled exactly once, in an
+    independent random order per parameter.
+
+    Args:
+        ranges: SimulationConfig attribute names mapped to (low, high).
+            Integer parameters are rounded.
+        samples: number of configurations.
+        seed: seed of the design, so the same arguments give the same
+            configurations.
+
+    Returns:
+        One dict of parameter values per configuration.
+    """
+    rng = np.random.default_rng(seed)
+    columns = dict()
+    for name, (low, high) in ranges.items():
+        strata = rng.permutation(samples)
+        unit = (strata + rng.random(samples)) / samples
+        values = low + unit * (high - low)
+        if _getParameterType(name) is int:
+            columns[name] = [int(round(value)) for value in values]
+        else:
+            columns[name] = [float(value) for value in values]
+    return [{name: columns[name][i] for name in ranges} for i in range(samples)]
+
+class SweepScheduler:
+    """Runs parameter sweeps, one job per configuration and replication
+    seed, from a SQLite job ledger.
+
+    addSweep() expands a design into jobs in the ledger; run() dispatches
+    the unfinished ones to a process pool, each a replication run by
+    runReplication() with the configuration's parameters set on a copy of
+    the base SimulationConfig and its own shard. The ledger is written by
+    this process only, and records every job's status (pending, running,
+    done or failed), attempts, run ID, shard and error, and once merged,
+    the database and run ID its run was merged into. Jobs left running
+    by a crash are reset to pending and their partial shards removed, so
+    re-running the same sweep resumes where it stopped.
+
+    Attributes:
+        ledgerPath: path to the ledger database.
+        simulationConfig: base configuration of every job.
+        numberOfDays: days simulated per job.
+        duration: ticks per day.
+        workers: number of worker processes.
+        maxRetries: retries of a failed job.
+        quiet: whether the workers' console output is discarded.
+        conn: connection to the ledger, or None before open().
+    """
+
+    def __init__(self, ledger_path: str, simulation_config: SimulationConfig, number_of_days: int, duration: int,
+                 workers: int | None = None, max_retries: int = 2, quiet: bool = True) -> None:
+        """Initializes the scheduler.
+
+        Args:
+            ledger_path: path to the ledger database; created if missing.
+            simulation_config: base configuration of every job.
+            number_of_days: days simulated per job.
+            duration: ticks per day.
+            workers: number of worker processes. Defaults to the CPU count.
+            max_retries: retries of a failed job.
+            quiet: discard the workers' console output.
+        """
+        self.ledgerPath = ledger_path
+        self.simulationConfig = simulation_config
+        self.numberOfDays = number_of_days
+        self.duration = duration
+        self.workers = workers or os.cpu_count() or 1
+        self.maxRetries = max(0, int(max_retries))
+        self.quiet = quiet
+        self.conn = None
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.ledgerPath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.ledgerPath)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        with self.conn:
+            for statement in LEDGER_SCHEMA:
+                self.conn.execute(statement)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sweep_jobs)")]
+            for column, column_type in LEDGER_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE sweep_jobs ADD COLUMN {column} {column_type}")
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def addSweep(self, name: str, design: list[dict], replications: int, base_seed: int = 0) -> int:
+        """Add the jobs of a sweep to the ledger: every configuration of the
+        design crossed with replications seeds. Configurations share the
+        seeds base_seed + replication, so they are compared on common
+        random numbers.
+
+        Adding a sweep again with the same design adds nothing, so a
+        scheduling script can be re-run as is to resume.
+
+        Args:
+            name: name of the sweep.
+            design: one dict of SimulationConfig parameter values per
+                configuration, e.g. from gridDesign() or
+                latinHypercubeDesign().
+            replications: replications per configuration.
+            base_seed: seed of replication 0.
+
+        Returns:
+            The number of jobs added.
+
+        Raises:
+            ValueError: if the sweep exists with another design, or a
+                parameter is not a SimulationConfig attribute.
+        """
+        for parameters in design:
+            for parameter in parameters:
+                _getParameterType(parameter)
+        spec = json.dumps({"design": design, "replications": replications, "base_seed": base_seed},
+                          sort_keys=True)
+        row = self.conn.execute("SELECT spec FROM sweeps WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[0] != spec:
+            raise ValueError(f"Sweep {name} already exists with another design")
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO sweeps (name, spec, created_at) VALUES (?, ?, ?)",
+                              (name, spec, datetime.now().strftime("%Y%m%d-%H%M%S")))
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO sweep_jobs (sweep, config_index, replication, parameters, seed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(name, config_index, replication, json.dumps(parameters, sort_keys=True), base_seed + replication)
+                 for config_index, parameters in enumerate(design) for replication in range(replications)]
+            )
+        return cursor.rowcount
+
+    def getShardName(self, name: str, job_id: int) -> str:
+        return f"sweep-{name}-{job_id:06d}"
+
+    def getStatus(self, name: str) -> dict[str, int]:
+        """Get the number of jobs of a sweep per status."""
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM sweep_jobs WHERE sweep = ? GROUP BY status", (name,))
+        return dict(rows.fetchall())
+
+    def resetInterrupted(self, name: str) -> int:
+        """Return the jobs left running by a crashed scheduler to pending,
+        removing their partial shards.
+
+        Returns:
+            The number of jobs reset.
+        """
+        rows = self.conn.execute("SELECT id FROM sweep_jobs WHERE sweep = ? AND status = 'running'",
+                                 (name,)).fetchall()
+        for (job_id,) in rows:
+            _removeShard(getShardPath(self.getShardName(name, job_id)))
+        with self.conn:
+            self.conn.execute("UPDATE sweep_jobs SET status = 'pending' WHERE sweep = ? AND status = 'running'",
+                              (name,))
+        return len(rows)
+
+    def _getUnfinishedJobs(self, name: str, limit: int) -> list[tuple]:
+        # jobs in flight are 'running', so they are never handed out twice
+        return self.conn.execute(
+            "SELECT id, parameters, seed FROM sweep_jobs WHERE sweep = ? "
+            "AND (status = 'pending' OR (status = 'failed' AND attempts <= ?)) ORDER BY id LIMIT ?",
+            (name, self.maxRetries, limit)
+        ).fetchall()
+
+    def _submit(self, pool: WorkerPool, name: str, job: tuple) -> None:
+        job_id, parameters, seed = job
+        config = copy.copy(self.simulationConfig)
+        for parameter, value in json.loads(parameters).items():
+            setattr(config, parameter, value)
+        config.logShardName = self.getShardName(name, job_id)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE sweep_jobs SET status = 'running', started_at = ?, shard_path = ? WHERE id = ?",
+                (datetime.now().strftime("%Y%m%d-%H%M%S"), getShardPath(config.logShardName), job_id)
+            )
+        pool.submit(job_id, _runWorker, config, self.numberOfDays, self.duration, seed, f"job-{job_id}", self.quiet)
+
+    def _finish(self, job_id: int, result: dict | None, error: Exception | None) -> bool:
+        """Record the outcome of a job; returns whether it succeeded."""
+        finished_at = datetime.now().strftime("%Y%m%d-%H%M%S")
+        if error is not None:
+            shard_path = self.conn.execute("SELECT shard_path FROM sweep_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            _removeShard(shard_path)
+            error = "".join(traceback.format_exception_only(type(error), error)).strip()
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE sweep_jobs SET status = 'failed', attempts = attempts + 1, error = ?, finished_at = ? "
+                    "WHERE id = ?", (error, finished_at, job_id)
+                )
+            print(f"job {job_id} failed: {error}")
+            return False
+        with self.conn:
+            self.conn.execute(
+                "UPDATE sweep_jobs SET status = 'done', attempts = attempts + 1, run_id = ?, error = NULL, "
+                "finished_at = ?, wall_time = ? WHERE id = ?",
+                (int(result["run_id"]), finished_at, result["wall_time"], job_id)
+            )
+        return True
+
+    def run(self, name: str) -> dict:
+        """Run the unfinished jobs of a sweep, failed ones included until
+        they run out of retries, keeping at most one job per worker in
+        flight. Jobs failed by a worker dying are retried on a new pool by
+        WorkerPool.
+
+        Returns:
+            A dict with the numbers of jobs completed and failed by this
+            call, the wall time, the jobs completed per hour and the
+            sweep's job counts per status.
+        """
+        self.resetInterrupted(name)
+        start = time.perf_counter()
+        completed = failed = 0
+        pool = WorkerPool(self.workers)
+        try:
+            while True:
+                # jobs are read back from the ledger, which also retries failed ones;
+                # a suspect of a broken pool waits until it can run alone
+                for job in self._getUnfinishedJobs(name, self.workers + len(pool.suspects)):
+                    if pool.canSubmit(job[0]):
+                        self._submit(pool, name, job)
+                if not pool.hasTasks():
+                    break
+                for job_id, result, error in pool.wait():
+                    if self._finish(job_id, result, error):
+                        completed += 1
+                    else:
+                        failed += 1
+                status = self.getStatus(name)
+                print(f"\r{status.get('done', 0)}/{sum(status.values())} jobs done", end="")
+        finally:
+            pool.shutdown()
+        print()
+        wall_time = time.perf_counter() - start
+        return {
+            "completed": completed,
+            "failed": failed,
+            "wall_time": wall_time,
+            "jobs_per_hour": completed * 3600 / wall_time if wall_time > 0 else None,
+            "status": self.getStatus(name),
+        }
+
+    def mergeShards(self, name: str, target_path: str) -> list[str]:
+        """Merge the shards of the sweep's completed jobs into a log
+        database, and record in the ledger the run ID each job's run got
+        there. Shards merged before are skipped.
+
+        Returns:
+            The paths of the shards merged by this call.
+        """
+        jobs = [row for row in self.conn.execute(
+            "SELECT id, run_id, shard_path FROM sweep_jobs WHERE sweep = ? AND status = 'done' ORDER BY id", (name,))
+            if os.path.exists(row[2])]
+        merger = ShardMerger(target_path)
+        merger.open()
+        try:
+            merged = merger.mergeShards([shard_path for _, _, shard_path in jobs])
+            # a shard keeps its UUID, so jobs merged by an earlier call are found too
+            merged_run_ids = []
+            for job_id, run_id, shard_path in jobs:
+                run_offset = merger.getRunOffset(shard_path)
+                if run_offset is not None:
+                    merged_run_ids.append((os.path.abspath(target_path), run_id + run_offset, job_id))
+        finally:
+            merger.close()
+        with self.conn:
+            self.conn.executemany("UPDATE sweep_jobs SET merged_path = ?, merged_run_id = ? WHERE id = ?",
+                                  merged_run_ids)
+        return merged
@@ -0,0 +1,106 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+class WorkerPool:
+    """A process pool that outlives the death of its workers.
+
+    A worker killed outright, e.g. by a crash in SUMO or by the OS, breaks
+    a ProcessPoolExecutor: every task in flight fails with
+    BrokenProcessPool and nothing more can be submitted. WorkerPool then
+    reports those tasks as failed and starts a new pool. It cannot tell
+    which task broke the pool, so the tasks that were in flight become
+    suspects, each run alone when resubmitted; a suspect that completes
+    without breaking the pool is cleared. A task that kills its worker
+    therefore only fails itself, not its neighbours.
+
+    Tasks are identified by a key chosen by the caller, e.g. a replication
+    number or a job ID.
+
+    Attributes:
+        workers: number of worker processes.
+        executor: the current process pool.
+        inFlight: dictionary of future to key of the tasks submitted and
+            not reported yet.
+        suspects: keys of the tasks in flight when a pool broke.
+        outcomes: outcomes of the tasks failed by a pool broken on submit,
+            returned by the next wait().
+    """
+
+    def __init__(self, workers: int) -> None:
+        """Initializes the pool.
+
+        Args:
+            workers: number of worker processes.
+        """
+        self.workers = max(1, int(workers))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.inFlight = dict()
+        self.suspects = set()
+        self.outcomes = []
+
+    def hasTasks(self) -> bool:
+        """Whether tasks are in flight or outcomes are still to be
+        reported."""
+        return bool(self.inFlight or self.outcomes)
+
+    def canSubmit(self, key) -> bool:
+        """Whether a task can be submitted now: a worker is free, and
+        neither the task nor a task in flight is a suspect, which runs
+        alone."""
+        if not self.inFlight:
+            return True
+        if len(self.inFlight) >= self.workers or key in self.suspects:
+            return False
+        return not self.suspects.intersection(self.inFlight.values())
+
+    def submit(self, key, task: callable, *args) -> None:
+        """Run task(*args) in a worker process."""
+        try:
+            future = self.executor.submit(task, *args)
+        except BrokenProcessPool:
+            # the pool broke after the last wait() returned
+            self.outcomes += self._recover()
+            future = self.executor.submit(task, *args)
+        self.inFlight[future] = key
+
+    def wait(self) -> list[tuple]:
+        """Wait for at least one task to complete.
+
+        Returns:
+            A list of (key, result, error) tuples of the completed tasks,
+            error being the exception raised, or None with the task's
+            result.
+        """
+        if self.outcomes:
+            outcomes, self.outcomes = self.outcomes, []
+            return outcomes
+        if not self.inFlight:
+            return []
+        done, _ = wait(self.inFlight, return_when=FIRST_COMPLETED)
+        # a dead worker fails every task in flight; those not done yet are
+        # reported by the next wait()
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            return self._recover()
+        return [self._getOutcome(future) for future in done]
+
+    def _getOutcome(self, future) -> tuple:
+        key = self.inFlight.pop(future)
+        error = future.exception()
+        if not isinstance(error, BrokenProcessPool):
+            self.suspects.discard(key)
+        return key, future.result() if error is None else None, error
+
+    def _recover(self) -> list[tuple]:
+        """Collect the outcomes of every task of the broken pool and start
+        a new one."""
+        # a broken pool fails the tasks it has not completed
+        done, _ = wait(self.inFlight)
+        self.suspects.update(self.inFlight[future] for future in done
+                             if isinstance(future.exception(), BrokenProcessPool))
+        outcomes = [self._getOutcome(future) for future in done]
+        self.executor.shutdown()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return outcomes
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
@@ -1,3 +1,7 @@
 from .SimulationEngine import SimulationEngine
+from .WorkerPool import WorkerPool
+from .ReplicationRunner import ReplicationRunner, createLogSink, runReplication
+from .SweepScheduler import SweepScheduler, gridDesign, latinHypercubeDesign
 
-__all__ = ["SimulationEngine"]
\ No newline at end of file
+__all__ = ["SimulationEngine", "WorkerPool", "ReplicationRunner", "createLogSink", "runReplication", "SweepScheduler",
+           "gridDesign", "latinHypercubeDesign"]
@@ -0,0 +1,101 @@
+"""Measures the inequality metrics of analysis/inequality.py.
+
+Times the sort-based Gini coefficient against the previous dense pairwise
+version (run only while its n x n matrix stays small), grouped Gini, Lorenz
+points, income shares and the single-sort summary, on values that include
+negatives and NaNs like driver profits do. Every result is checked against
+the pairwise version or a per-group loop before it is timed.
+
+Usage:
+    python benchmarks/inequality_benchmark.py [largest_n]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "analysis"))
+
+from inequality import (gini_coefficient, grouped_gini, income_shares, inequality_summary,
+                        lorenz_points, sorted_values)
+
+# Largest n for the pairwise version: its matrix takes 8 * n^2 bytes
+MAX_PAIRWISE_N = 5000
+
+
+def pairwiseGini(values):
+    """The previous O(n^2) implementation, kept as the reference."""
+    y = np.array(values, dtype=float).flatten()
+    y = y[~np.isnan(y)]
+    n = len(y)
+    if n == 0:
+        return np.nan
+    y_sorted = np.sort(y)
+    sum_abs_diffs = np.abs(y_sorted.reshape(-1, 1) - y_sorted.reshape(1, -1)).sum()
+    mu_star = (np.sum(y_sorted[y_sorted > 0]) + np.abs(np.sum(y_sorted[y_sorted < 0]))) / n
+    if mu_star == 0:
+        return np.nan
+    return sum_abs_diffs / (2.0 * (n**2) * mu_star)
+
+
+def makeValues(n, rng):
+    """Profit-like values: skewed, about a tenth negative, a few NaNs."""
+    values = rng.lognormal(6.0, 1.0, n) - rng.exponential(60.0, n)
+    values[rng.random(n) < 0.001] = np.nan
+    return values
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(label, n, elapsed):
+    print(f"{label:<28} n={n:>9,}  {elapsed * 1000:10.2f} ms")
+
+
+def check(n, rng, number_of_groups=50):
+    values = makeValues(min(n, MAX_PAIRWISE_N), rng)
+    assert np.isclose(gini_coefficient(values), pairwiseGini(values), rtol=1e-12)
+
+    groups = rng.integers(0, number_of_groups, len(values))
+    grouped = grouped_gini(values, groups)
+    expected = pd.Series({group: pairwiseGini(values[groups == group]) for group in np.unique(groups)})
+    assert np.allclose(grouped.values, expected.values, rtol=1e-12, equal_nan=True)
+
+    summary = inequality_summary(values)
+    assert summary["gini"] == gini_coefficient(values)
+    assert np.array_equal(summary["lorenz"][1], lorenz_points(values)[1])
+    assert np.allclose((summary["top_share"], summary["bottom_share"]), income_shares(values), equal_nan=True)
+
+
+def measure(n, rng, number_of_groups=1000):
+    values = makeValues(n, rng)
+    groups = rng.integers(0, number_of_groups, n)
+    if n <= MAX_PAIRWISE_N:
+        report("pairwise gini (before)", n, timed(pairwiseGini, values)[1])
+    report("gini_coefficient", n, timed(gini_coefficient, values)[1])
+    report(f"grouped_gini ({number_of_groups} groups)", n, timed(grouped_gini, values, groups)[1])
+    report("per-group loop of gini", n,
+           timed(lambda: [gini_coefficient(values[groups == group]) for group in range(number_of_groups)])[1])
+    report("lorenz_points", n, timed(lorenz_points, values)[1])
+    report("income_shares", n, timed(income_shares, values)[1])
+    report("gini + shares + lorenz", n,
+           timed(lambda: (gini_coefficient(values), income_shares(values), lorenz_points(values)))[1])
+    report("inequality_summary", n, timed(inequality_summary, values)[1])
+    report("  of which sorted_values", n, timed(sorted_values, values)[1])
+    print()
+
+
+if __name__ == "__main__":
+    largest_n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    check(largest_n, rng)
+    n = 1000
+    while n <= largest_n:
+        measure(n, rng)
+        n *= 10
@@ -0,0 +1,83 @@
+"""Measures SimulationLogger throughput (rows per second).
+
+Compares per-row commits (flush_rows=1, the previous behaviour) against
+buffered executemany flushes, the background writer, the Parquet sink,
+compact negotiation storage and an in-memory database snapshotted to the
+file, and reports the size of what was written.
+Runs against a throwaway database in a temporary directory.
+
+Usage:
+    python benchmarks/logger_benchmark.py [number_of_transactions]
+"""
+import os
+import sys
+import time
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from domain.Tricycle import Tricycle
+from infrastructure.SimulationLogger import SimulationLogger
+from infrastructure.ParquetLogSink import ParquetLogSink
+from infrastructure.SqliteLogSink import SqliteLogSink
+
+
+def makeTricycle(index):
+    return Tricycle(f"trike{index}", f"hub{index % 9}", 0, 57600, 10.0, 40.0, 0.2, 150.0,
+                    False, 4000.0, 375.0, 0.5, 50.0, 50.0)
+
+
+def makePassenger(index):
+    destination = SimpleNamespace(edge="E0", position=12.5, lane=0)
+    return SimpleNamespace(name=f"ped{index}", willingness_to_pay=80.0,
+                           patience=0.3, aspiredPrice=40.0, destination=destination)
+
+
+def runWorkload(logger, number_of_transactions, number_of_drivers=50):
+    """Logs a dispatch-like workload and returns the number of rows written."""
+    rows = 0
+    for i in range(number_of_drivers):
+        logger.addDriver(makeTricycle(i))
+        rows += 1
+    for i in range(number_of_transactions):
+        trike_code = f"trike{i % number_of_drivers}"
+        logger.addPassenger(makePassenger(i))
+        rounds = [[60.0, 70.0, 40.0, "driver", 0], [55.0, 55.0, 45.0, "passenger", 1]]
+        logger.recordTransaction([trike_code, f"ped{i}", 1500.0, i, "agree", 55.0], rounds)
+        rows += 1 + 1 + len(rounds)
+        if i % 10 == 0:
+            logger.addExpense(trike_code, "midday_gas", 100.0)
+            rows += 1
+    logger.close()
+    return rows
+
+
+def measure(label, number_of_transactions, make_sink=None, **logger_options):
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            sink = make_sink() if make_sink is not None else None
+            logger = SimulationLogger(sink, **logger_options)
+            start = time.perf_counter()
+            rows = runWorkload(logger, number_of_transactions)
+            elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(directory) for name in names)
+        finally:
+            os.chdir(cwd)
+    print(f"{label:<28} {rows:>8,} rows  {elapsed:8.3f} s  {rows / elapsed:>12,.0f} rows/s  {size / 1024:>8,.0f} KiB")
+    return rows / elapsed
+
+
+if __name__ == "__main__":
+    number_of_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    before = measure("per-row commit (before)", number_of_transactions, flush_rows=1)
+    after = measure("buffered executemany (after)", number_of_transactions)
+    background = measure("background writer thread", number_of_transactions, background=True)
+    parquet = measure("parquet sink", number_of_transactions, make_sink=ParquetLogSink)
+    measure("compact negotiations", number_of_transactions, compact_negotiations=True)
+    measure("in-memory + snapshots", number_of_transactions,
+            make_sink=lambda: SqliteLogSink(in_memory=True, snapshot_interval=60.0))
+    print(f"speedup: {after / before:.1f}x (background: {background / before:.1f}x, parquet: {parquet / before:.1f}x)")
@@ -15,6 +15,50 @@ class SimulationConfig:
     avgPricePerLiter = 56.76
     lowGasPricePerLiter = 54.8
     highGasPricePerLiter = 61.0
+    # Distributions of the agents' attributes, fitted to the survey data:
+    # shape and scale of lognormals, values and probabilities of discrete
+    # distributions, and cumulative probabilities of the strata of the
+    # piecewise uniform patience distributions, whose bounds are
+    # ...PatienceBounds. Class attributes, so sweeps can vary them
+    wtpShape = 0.7134231299166108
+    wtpScale = 38.38513260285555
+    startTimeShape = 0.21442788235989804
+    startTimeScale = 6.471010297664735
+    endTimeShape = 0.4675881648065253
+    endTimeScale = 4.4056405084474735
+    dailyExpenseShape = 0.5551170551235295
+    dailyExpenseScale = 375.96181139256873
+    farthestDistanceShape = 0.4562970511172417
+    farthestDistanceScale = 4.119316604349962
+    passengerAspiredPriceShape = 0.7234913879629307
+    passengerAspiredPriceScale = 36.844797800005615
+    maxGasValues = [8., 8.6, 9.5, 9.64, 9.70294118, 10., 10.2, 10.5, 10.75, 12.]
+    maxGasProbabilities = [0.05405405, 0.21621622, 0.05405405, 0.27027027, 0.08108108, 0.08108108, 0.02702703,
+                           0.02702703, 0.10810811, 0.08108108]
+    gasConsumptionValues = [33., 40., 40.25, 46.21764706, 48., 61.4, 62.5]
+    gasConsumptionProbabilities = [0.02702703, 0.48648649, 0.10810811, 0.08108108, 0.05405405, 0.02702703,
+                                   0.21621622]
+    gasPaymentValues = [50., 100., 110., 120., 125., 150., 200., 300.]
+    gasPaymentProbabilities = [0.02702703, 0.21621622, 0.02702703, 0.05405405, 0.02702703, 0.32432432, 0.2972973,
+                               0.02702703]
+    # Probabilities of not getting and getting a full tank
+    getsFullTankProbabilities = [27/37, 1 - 27/37]
+    profitZeroProbability = 24/37
+    profitValues = [30, 10, 50, -20, -50, 20]
+    profitProbabilities = [2/13, 2/13, 3/13, 2/13, 1/13, 3/13]
+    tricyclePatienceBounds = [0, 1/3, 2/3, 1]
+    tricyclePatienceCumulativeProbabilities = [17/28, 26/28]
+    passengerPatienceBounds = [0, 1/4, 1/2, 3/4, 1]
+    passengerPatienceCumulativeProbabilities = [16/28, 22/28, 27/28]
+    tricycleAspiredPriceValues = [50, 70, 100, 60]
+    tricycleAspiredPriceProbabilities = [24/37, 6/37, 6/37, 1/37]
+    minimumPriceValues = [50, 40, 70, 100, 150, 80]
+    minimumPriceProbabilities = [27/37, 3/37, 4/37, 1/37, 1/37, 1/37]
+    # Share of the day's demand starting in each hour, before demandMultiplier
+    peakHourProbabilities = [0.08284023669, 0.1301775148, 0.1538461538, 0.1301775148, 0.08284023669, 0.07100591716,
+                             0.04733727811, 0.0650887574, 0.03550295858, 0.02366863905, 0.02366863905,
+                             0.04142011834, 0.02366863905, 0.01183431953, 0.005917159763, 0.005917159763,
+                             0.005917159763, 0.005917159763]
     
     def getAssetDirectory(self) -> str:
         script_dir = Path(__file__).resolve().parent.parent
@@ -37,8 +81,8 @@ class SimulationConfig:
         return float(self.gasPricePerLiter)
     
     def getWTPDistribution(self) -> callable:
-        shape = 0.7134231299166108
-        scale = 38.38513260285555
+        shape = self.wtpShape
+        scale = self.wtpScale
         return lambda size=1: round(lognorm.rvs(shape, loc=0, scale=scale, size=size).item(), 2)
     
     def getTodaPositions(self) -> dict[str, float]:
@@ -55,14 +99,86 @@ class SimulationConfig:
         }
     
     demandMultiplier = 2.0
+    destinationEdgeWeights = None
+    destinationBatchSize = 1024
+    # "uniform": sample any destination and check reachability through TraCI
+    # "reachable": sample only destinations within the tricycle's farthest distance
+    # "analytic": sample any destination but reject it from the reachability index
+    destinationSamplingMode = "uniform"
+    # "sqlite" logs to a SQLite database, "parquet" to a Parquet dataset
+    # under logDatasetPath (None for db/simulation_logs.parquet)
+    logSink = "sqlite"
+    logDatasetPath = None
+    # Name of this worker's shard database under db/shards, or None to log
+    # straight to db/simulation_logs.db. Parquet runs need no shards, as
+    # concurrent workers never share a run's files
+    logShardName = None
+    # Store each transaction's negotiation rounds as one negotiation_rounds row
+    compactNegotiationLog = True
+    # "full", "transactions", "sampled" or "aggregate"; see SimulationLogger
+    logLevel = "full"
+    # Fraction of passengers logged at the "sampled" log level
+    logSampleFraction = 0.1
+    # Log to an in-memory database copied to the file every
+    # logSnapshotInterval seconds and at the end of each day
+    logInMemory = False
+    logSnapshotInterval = 300.0
+    # Per-minute KPIs as newline-delimited JSON, appended to telemetryPath
+    # and/or served on the UNIX socket telemetrySocketPath; None disables
+    telemetryPath = None
+    telemetrySocketPath = None
+    # Directory of the day-boundary checkpoints, one subdirectory per
+    # replication; main.py resumes from the latest one. None disables
+    checkpointDirectory = None
+
+    def getDestinationEdgeWeights(self) -> dict[str, float] | None:
+        return self.destinationEdgeWeights
+
+    def getDestinationBatchSize(self) -> int:
+        return int(self.destinationBatchSize)
+
+    def getDestinationSamplingMode(self) -> str:
+        return self.destinationSamplingMode
+
+    def getLogSink(self) -> str:
+        return self.logSink
+
+    def getLogDatasetPath(self) -> str | None:
+        return self.logDatasetPath
+
+    def getLogShardName(self) -> str | None:
+        return self.logShardName
+
+    def getCompactNegotiationLog(self) -> bool:
+        return bool(self.compactNegotiationLog)
+
+    def getLogLevel(self) -> str:
+        return self.logLevel
+
+    def getLogSampleFraction(self) -> float:
+        return float(self.logSampleFraction)
+
+    def getLogInMemory(self) -> bool:
+        return bool(self.logInMemory)
+
+    def getLogSnapshotInterval(self) -> float | None:
+        return self.logSnapshotInterval
+
+    def getTelemetryPath(self) -> str | None:
+        return self.telemetryPath
+
+    def getTelemetrySocketPath(self) -> str | None:
+        return self.telemetrySocketPath
+
+    def getCheckpointDirectory(self) -> str | None:
+        return self.checkpointDirectory
 
     def getPeakHourProbabilities(self) -> list[float]:
-        base = [0.08284023669, 0.1301775148, 0.1538461538, 0.1301775148, 0.08284023669, 0.07100591716, 0.04733727811, 0.0650887574, 0.03550295858, 0.02366863905, 0.02366863905, 0.04142011834, 0.02366863905, 0.01183431953, 0.005917159763, 0.005917159763, 0.005917159763, 0.005917159763]
-        return [p * self.demandMultiplier for p in base]
+        return [p * self.demandMultiplier for p in self.peakHourProbabilities]
 
     def getStartTimeDistribution(self) -> callable:
-        shape = 0.21442788235989804
-        scale = 6.471010297664735
+        shape = self.startTimeShape
+        scale = self.startTimeScale
         MINUTES_OVER_HOURS = 60
         SECONDS_OVER_MINUTES = 60
         MULTIPLICATIVE_CONSTANT = MINUTES_OVER_HOURS * SECONDS_OVER_MINUTES
@@ -74,8 +190,8 @@ class SimulationConfig:
             NORMALIZING_CONSTANT))
     
     def getEndTimeDistribution(self) -> callable:
-        shape = 0.4675881648065253
-        scale = 4.4056405084474735
+        shape = self.endTimeShape
+        scale = self.endTimeScale
         MINUTES_OVER_HOURS = 60
         SECONDS_OVER_MINUTES = 60
         MULTIPLICATIVE_CONSTANT = MINUTES_OVER_HOURS * SECONDS_OVER_MINUTES
@@ -88,74 +204,73 @@ class SimulationConfig:
     def getMaxGasDistribution(self) -> callable:
         import numpy as np
         import scipy.stats as stats
-        unique_max_gas = [ 8.        ,  8.6       ,  9.5       ,  9.64      ,  9.70294118,10.        , 10.2       , 10.5       , 10.75      , 12.        ]
-        prob_max_gas = [0.05405405, 0.21621622, 0.05405405, 0.27027027, 0.08108108, 0.08108108, 0.02702703, 0.02702703, 0.10810811, 0.08108108]
+        unique_max_gas = self.maxGasValues
+        prob_max_gas = self.maxGasProbabilities
         return lambda size=1: (np.random.choice(unique_max_gas, size=size, p=prob_max_gas) + np.random.normal(0, 0.1, size=1)).item()
     
     def getGasConsumptionDistribution(self) -> callable:
         import numpy as np
         import scipy.stats as stats
-        unique_gas_consumption = [33.        , 40.        , 40.25      , 46.21764706, 48.        , 61.4       , 62.5       ]
-        prob_gas_consumption = [0.02702703, 0.48648649, 0.10810811, 0.08108108, 0.05405405, 0.02702703, 0.21621622]
+        unique_gas_consumption = self.gasConsumptionValues
+        prob_gas_consumption = self.gasConsumptionProbabilities
         return lambda size=1: (np.random.choice(unique_gas_consumption, size=size, p=prob_gas_consumption) + np.random.normal(0, 0.1, size=1)).item()
     
     def getGasPaymentDistribution(self) -> callable:
         import numpy as np
         import scipy.stats as stats
-        unique_gas_payment = [ 50., 100., 110., 120., 125., 150., 200., 300.]
-        prob_gas_payment = [0.02702703, 0.21621622, 0.02702703, 0.05405405, 0.02702703, 0.32432432, 0.2972973 , 0.02702703]
+        unique_gas_payment = self.gasPaymentValues
+        prob_gas_payment = self.gasPaymentProbabilities
         return lambda size=1: (np.random.choice(unique_gas_payment, size=size, p=prob_gas_payment)).item()
     
     def getGetsFullTankDistribution(self) -> callable:
         import numpy as np
-        w_af = [27/37, 1 - 27/37]
+        w_af = self.getsFullTankProbabilities
         return lambda size=1: np.random.choice([False, True], size=size, p=w_af).item()
     
     def getDailyExpenseDistribution(self) -> callable:
-        shape = 0.5551170551235295
-        scale = 375.96181139256873
+        shape = self.dailyExpenseShape
+        scale = self.dailyExpenseScale
         return lambda size=1: round(lognorm.rvs(shape, loc=0, scale=scale, size=size).item(), 2)
 
     def getFarthestDistanceDistribution(self) -> callable:
-        shape = 0.4562970511172417
-        scale = 4.119316604349962
+        shape = self.farthestDistanceShape
+        scale = self.farthestDistanceScale
         MULTIPLICATIVE_CONSTANT = 1000
         return lambda size=1: lognorm.rvs(shape, loc=0, scale=scale, size=size).item() * MULTIPLICATIVE_CONSTANT
     
     def getProfitDistribution(self) -> callable:
-        prob_zero = 24/37
-        return lambda size=1: 0 if random.random() < 24/37 else np.random.choice([30,10,50,-20,-50,20], size=size, p=[2/13,2/13,3/13,2/13,1/13,3/13])[0]
+        prob_zero = self.profitZeroProbability
+        values = self.profitValues
+        probabilities = self.profitProbabilities
+        return lambda size=1: 0 if random.random() < prob_zero else np.random.choice(values, size=size, p=probabilities)[0]
 
-    def getTricyclePatienceDistribution(self) -> callable:
+    def _getPatienceDistribution(self, bounds: list[float], cumulative_probabilities: list[float]) -> callable:
         def patience_distribution(size=1):
             draw = random.random()
-            if draw < 17/28:
-                return random.uniform(0, 1/3)
-            elif draw < 26/28:  # 17/28 + 9/28
-                return random.uniform(1/3, 2/3)
-            else:
-                return random.uniform(2/3, 1)
+            for threshold, low, high in zip(cumulative_probabilities, bounds, bounds[1:]):
+                if draw < threshold:
+                    return random.uniform(low, high)
+            return random.uniform(bounds[-2], bounds[-1])
         return patience_distribution
+
+    def getTricyclePatienceDistribution(self) -> callable:
+        return self._getPatienceDistribution(self.tricyclePatienceBounds, self.tricyclePatienceCumulativeProbabilities)
     
     def getPassengerPatienceDistribution(self) -> callable:
-        def patience_distribution(size=1):
-            draw = random.random()
-            if draw < 16/28:
-                return random.uniform(0, 1/4)
-            elif draw < 22/28:  # 16/28 + 6/28
-                return random.uniform(1/4, 1/2)
-            elif draw < 27/28:  # 16/28 + 6/28 + 5/28
-                return random.uniform(1/2, 3/4)
-            else:
-                return random.uniform(3/4, 1)
-        return patience_distribution
+        return self._getPatienceDistribution(self.passengerPatienceBounds,
+                                             self.passengerPatienceCumulativeProbabilities)
 
     def getTricycleAspiredPriceDistribution(self) -> callable:
-        return lambda size=1: round(np.random.choice([50, 70, 100, 60], size=size, p=[24/37, 6/37, 6/37, 1/37])[0], 2)
+        values = self.tricycleAspiredPriceValues
+        probabilities = self.tricycleAspiredPriceProbabilities
+        return lambda size=1: round(np.random.choice(values, size=size, p=probabilities)[0], 2)
 
     def getPassengerAspiredPriceDistribution(self) -> callable:
-        
-        return lambda size=1: round(lognorm.rvs(0.7234913879629307, loc=0, scale=36.844797800005615, size=size)[0], 2)
+        shape = self.passengerAspiredPriceShape
+        scale = self.passengerAspiredPriceScale
+        return lambda size=1: round(lognorm.rvs(shape, loc=0, scale=scale, size=size)[0], 2)
     
     def getMinimumPriceDistribution(self) -> callable:
-        return lambda size=1: round(np.random.choice([50,40,70,100,150,80], size=size, p=[27/37,3/37, 4/37, 1/37, 1/37, 1/37])[0], 2)
\ No newline at end of file
+        values = self.minimumPriceValues
+        probabilities = self.minimumPriceProbabilities
+        return lambda size=1: round(np.random.choice(values, size=size, p=probabilities)[0], 2)
\ No newline at end of file
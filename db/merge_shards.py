@@ -0,0 +1,49 @@
+"""Merge per-worker shard databases into one simulation log database.
+
+Safe to re-run: shards already recorded in the target's merged_shards
+ledger are skipped, and a merge interrupted midway leaves the target as it
+was before the shard being merged.
+
+Usage:
+    python db/merge_shards.py [--target db/simulation_logs.db] [shard.db | shards_directory ...]
+
+With no shards given, merges every *.db file in db/shards.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+from infrastructure.ShardMerger import ShardMerger
+from infrastructure.SqliteLogSink import SHARDS_DIRECTORY
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("shards", nargs="*", default=[os.path.join(ROOT, SHARDS_DIRECTORY)],
+                        help="shard databases or directories of shards")
+    parser.add_argument("--target", default=os.path.join(ROOT, "db/simulation_logs.db"),
+                        help="consolidated database to merge into")
+    args = parser.parse_args()
+
+    merger = ShardMerger(args.target)
+    merger.open()
+    try:
+        merged = []
+        for path in args.shards:
+            if os.path.isdir(path):
+                merged += merger.mergeDirectory(path)
+            else:
+                merged += merger.mergeShards([path])
+    finally:
+        merger.close()
+
+    for path in merged:
+        print(f"merged {path}")
+    print(f"{len(merged)} shard(s) merged into {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from domain.Location import Location
+from domain.Passenger import Passenger
+
+class DispatchRequest:
+    """A single passenger request made at a TODA hub.
+
+    Carries the one authoritative hub-to-destination distance for the request
+    so that feasibility checks, negotiation and transaction logging all read
+    the same value instead of querying the road network again.
+
+    Attributes:
+        passenger: the passenger who made the request.
+        origin: location of the TODA hub the request was made at.
+        distance: road distance from the origin to the passenger's
+            destination (in meters).
+        route: list of edge IDs from the origin to the destination and back,
+            or None if no route has been computed yet.
+    """
+
+    def __init__(self, passenger: Passenger, origin: Location,
+                 distance: float) -> None:
+        """Initializes a request given a passenger, origin, and distance.
+
+        Args:
+            passenger: the passenger who made the request.
+            origin: location of the TODA hub the request was made at.
+            distance: road distance from the origin to the passenger's
+                destination (in meters).
+        """
+        self.passenger = passenger
+        self.origin = origin
+        self.distance = distance
+        self.route = None
+
+    def getPassenger(self) -> Passenger:
+        """Get the passenger who made the request.
+
+        Returns:
+            Passenger object of the request.
+        """
+        return self.passenger
+
+    def getOrigin(self) -> Location:
+        """Get the location the request was made at.
+
+        Returns:
+            Location object of the TODA hub.
+        """
+        return self.origin
+
+    def getDestination(self) -> Location:
+        """Get the destination of the request.
+
+        Returns:
+            Location object representing the passenger's destination.
+        """
+        return self.passenger.getDestination()
+
+    def getDistance(self) -> float:
+        """Get the hub-to-destination distance of the request.
+
+        Returns:
+            Distance in meters.
+        """
+        return self.distance
+
+    def getDistanceInKilometers(self) -> float:
+        """Get the hub-to-destination distance of the request.
+
+        Returns:
+            Distance in kilometers.
+        """
+        return self.distance / 1000.0
+
+    def getRoute(self) -> list[str] | None:
+        """Get the route of the request, if one has been computed.
+
+        Returns:
+            List of edge IDs, or None.
+        """
+        return self.route
+
+    def hasRoute(self) -> bool:
+        """Shows if a route has already been computed for the request.
+
+        Returns:
+            True, if a route is set. False, otherwise.
+        """
+        return self.route is not None
+
+    def setRoute(self, route: list[str]) -> None:
+        """Set the route of the request.
+
+        Args:
+            route: list of edge IDs from the origin to the destination and
+                back.
+        """
+        self.route = route
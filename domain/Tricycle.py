@@ -3,10 +3,9 @@ import math
 import random
 from domain.TricycleState import TricycleState
 from domain.Location import Location, getManhattanDistance
+from domain.DispatchRequest import DispatchRequest
 from collections import namedtuple
 
-from utils.TraciUtils import getTricycleLocation
-
 
 class Tricycle:
     def __init__(self, name: str, hub: str, start_time: int, end_time: int, max_gas: float, gas_consumption_rate: float, gas_threshold: float, usualGasPayment: float, getsAFullTank: bool, farthestDistance: float, dailyExpense: float, patience: float, aspiredPrice: float, minimumPrice: float) -> None:
@@ -40,6 +39,19 @@ class Tricycle:
         self.dailyIncome = 0.0
         self.dailyDistance = 0.0
 
+    def __getstate__(self) -> dict:
+        # the log namedtuple class is made per instance and cannot be pickled
+        state = dict(self.__dict__)
+        del state["log"]
+        state["currentLog"] = tuple(self.currentLog) if self.currentLog is not None else None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.log = namedtuple("log", ["run_id","trike_id","origin_edge", "dest_edge", "distance", "price","tick", "driver_asp", "passenger_asp"])
+        if self.currentLog is not None:
+            self.currentLog = self.log(*self.currentLog)
+
     def __str__(self) -> str:
         return f"Tricycle(name={self.name}, state={self.state})"
 
@@ -180,10 +192,11 @@ class Tricycle:
         return self.actualEndTick - self.actualStartTick
 
     def recordTrip(self, distance, price) -> None:
-        """Record a completed trip for daily statistics"""
+        """Record an agreed trip for daily statistics and collect its fare"""
         self.dailyTrips += 1
         self.dailyIncome += float(price)
         self.dailyDistance += float(distance)
+        self.money += float(price)
 
     def getDailyStats(self) -> dict:
         """Get the daily statistics for this tricycle"""
@@ -193,9 +206,15 @@ class Tricycle:
             'distance': self.dailyDistance,
             'actual_duration': self.getActualDuration()
         }
+
+    def resetDailyStats(self) -> None:
+        """Reset the daily statistics for the next day"""
+        self.dailyTrips = 0
+        self.dailyIncome = 0.0
+        self.dailyDistance = 0.0
+        self.actualStartTick = None
+        self.actualEndTick = None
     
-    def canAcceptDispatch(self, passenger_destination: Location) -> bool:
-        """Check if the tricycle can accept a dispatch to the given destination"""
-        current_location = getTricycleLocation(self.name)
-        estimated_distance = getManhattanDistance(current_location, passenger_destination)
-        return self.isFree() and estimated_distance <= self.farthestDistance
\ No newline at end of file
+    def canAcceptDispatch(self, dispatch_request: DispatchRequest) -> bool:
+        """Check if the tricycle can accept a dispatch for the given request"""
+        return self.isFree() and dispatch_request.getDistance() <= self.farthestDistance
\ No newline at end of file
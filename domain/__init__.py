@@ -1,7 +1,8 @@
 from .Location import Location
 from .TodaHubDescriptor import TodaHubDescriptor
 from .Passenger import Passenger
+from .DispatchRequest import DispatchRequest
 from .Tricycle import Tricycle
 from .TricycleState import TricycleState
 
-__all__ = ["Location", "TodaHubDescriptor", "Passenger", "Tricycle", "TricycleState"]
\ No newline at end of file
+__all__ = ["Location", "TodaHubDescriptor", "Passenger", "DispatchRequest", "Tricycle", "TricycleState"]
\ No newline at end of file
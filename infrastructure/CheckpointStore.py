@@ -0,0 +1,88 @@
+import os
+import pickle
+import shutil
+
+# Files of a checkpoint, in its day's directory
+SUMO_STATE_FILE = "sumo-state.xml.gz"
+STATE_FILE = "state.pkl"
+
+class CheckpointStore:
+    """Keeps the day-boundary checkpoints of one replication in a directory.
+
+    The checkpoint taken once day days are done lives in day-<day>/: the
+    SUMO state saved through TraCI, and a pickle of the state held in
+    Python (fleet, passenger factory, dispatcher, random generators and
+    the logger's position). A checkpoint is written to a temporary
+    directory and renamed into place once complete, so a crash while saving
+    leaves the previous checkpoints intact.
+
+    Attributes:
+        directory: directory of the checkpoints.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """Initializes the store.
+
+        Args:
+            directory: directory of the checkpoints; created on the first
+                save.
+        """
+        self.directory = directory
+
+    def _getDayDirectory(self, day: int) -> str:
+        return os.path.join(self.directory, f"day-{day:04d}")
+
+    def save(self, day: int, state: dict, save_sumo_state: callable) -> str:
+        """Save the checkpoint taken once day days are done, replacing any
+        earlier checkpoint of the same day.
+
+        Args:
+            day: number of days done.
+            state: the state held in Python; must be picklable.
+            save_sumo_state: callable saving the SUMO state to the path it
+                is given, e.g. traci.simulation.saveState.
+
+        Returns:
+            The directory of the checkpoint.
+        """
+        target = self._getDayDirectory(day)
+        temporary = target + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        # SUMO writes the file itself, so it needs an absolute path
+        save_sumo_state(os.path.abspath(os.path.join(temporary, SUMO_STATE_FILE)))
+        with open(os.path.join(temporary, STATE_FILE), "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temporary, target)
+        return target
+
+    def getDays(self) -> list[int]:
+        """Get the days of the complete checkpoints, in order."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name[4:]) for name in os.listdir(self.directory)
+                      if name.startswith("day-") and name[4:].isdigit())
+
+    def getLatestDay(self) -> int | None:
+        """Get the day of the latest complete checkpoint, or None if there
+        is none."""
+        days = self.getDays()
+        return days[-1] if days else None
+
+    def load(self, day: int) -> tuple[dict, str]:
+        """Load the checkpoint taken once day days were done.
+
+        Args:
+            day: number of days done at the checkpoint.
+
+        Returns:
+            The state held in Python and the path of the SUMO state, to
+            load with traci.simulation.loadState.
+        """
+        directory = self._getDayDirectory(day)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No checkpoint of day {day} in {self.directory}")
+        with open(os.path.join(directory, STATE_FILE), "rb") as file:
+            state = pickle.load(file)
+        return state, os.path.abspath(os.path.join(directory, SUMO_STATE_FILE))
@@ -0,0 +1,79 @@
+class IdAllocator:
+    """Hands out row IDs on the client from blocks reserved in the database.
+
+    Knowing IDs before rows are written lets parent and child rows of a whole
+    batch be inserted with one executemany per table, instead of reading
+    each parent's lastrowid.
+
+    Attributes:
+        reserve: callable that reserves a block of IDs for a table and
+            returns the first ID of the block.
+        blockSize: number of IDs reserved at a time.
+        blocks: dictionary of table name to [next ID, end of block).
+    """
+
+    def __init__(self, reserve: callable, block_size: int = 10000) -> None:
+        """Initializes the allocator.
+
+        Args:
+            reserve: callable taking (table, count) that reserves count IDs
+                for the table and returns the first one.
+            block_size: number of IDs reserved at a time.
+        """
+        self.reserve = reserve
+        self.blockSize = max(1, int(block_size))
+        self.blocks = dict()
+
+    def reserveBlock(self, table: str, count: int | None = None) -> None:
+        """Reserves a new block of IDs for a table, discarding what is left
+        of the current one.
+
+        Args:
+            table: name of the table.
+            count: size of the block. Defaults to the block size.
+        """
+        count = self.blockSize if count is None else max(1, int(count))
+        first_id = self.reserve(table, count)
+        self.blocks[table] = [first_id, first_id + count]
+
+    def nextId(self, table: str) -> int:
+        """Get the next unused ID of a table.
+
+        Args:
+            table: name of the table.
+
+        Returns:
+            An ID no other writer will use for the table.
+        """
+        block = self.blocks.get(table)
+        if block is None or block[0] >= block[1]:
+            self.reserveBlock(table)
+            block = self.blocks[table]
+        next_id = block[0]
+        block[0] += 1
+        return next_id
+
+    def getPosition(self) -> dict[str, int]:
+        """Get the next ID that would be handed out for each table.
+
+        Returns:
+            Dictionary of table name to next ID.
+        """
+        return {table: block[0] for table, block in self.blocks.items()}
+
+    def getBlocks(self) -> dict[str, list[int]]:
+        """Get a copy of the current blocks, e.g. for a checkpoint.
+
+        Returns:
+            Dictionary of table name to [next ID, end of block).
+        """
+        return {table: list(block) for table, block in self.blocks.items()}
+
+    def restoreBlocks(self, blocks: dict[str, list[int]]) -> None:
+        """Continue handing out IDs from blocks taken with getBlocks(). The
+        IDs left in them must still be reserved for this allocator.
+
+        Args:
+            blocks: dictionary of table name to [next ID, end of block).
+        """
+        self.blocks = {table: list(block) for table, block in blocks.items()}
@@ -0,0 +1,88 @@
+# Tables a sink receives rows for, in the order rows of a batch must be
+# written so that parent rows always precede the rows referencing them
+LOG_TABLES = ("drivers", "passengers", "passenger_transactions", "negotiation_steps",
+              "negotiation_rounds", "expenses", "driver_days")
+
+# Tables whose rows get IDs from the IdAllocator. negotiation_rounds rows
+# are keyed by their transaction ID.
+ID_TABLES = tuple(table for table in LOG_TABLES if table != "negotiation_rounds")
+
+# Compact negotiation storage: one negotiation_rounds row per transaction
+# with fixed-width columns for up to MAX_COMPACT_ROUNDS rounds, the turn
+# encoded as an integer
+MAX_COMPACT_ROUNDS = 3
+TURN_CODES = {"driver": 0, "passenger": 1}
+
+class LogSink:
+    """Storage behind SimulationLogger.
+
+    A sink receives complete rows (IDs included) grouped per table. Every
+    method is called from a single thread, which is the logger's writer
+    thread in background mode, so implementations need no locking.
+
+    Batches hold rows for the tables in LOG_TABLES.
+    """
+
+    def open(self) -> None:
+        """Opens the underlying storage."""
+        raise NotImplementedError
+
+    def createRun(self, timestamp: str) -> int:
+        """Creates a new run.
+
+        Args:
+            timestamp: creation time of the run, as YYYYmmdd-HHMMSS.
+
+        Returns:
+            The ID of the new run.
+        """
+        raise NotImplementedError
+
+    def reserveIds(self, table: str, count: int) -> int:
+        """Reserves a block of row IDs of a table that no other writer will
+        use.
+
+        Args:
+            table: name of the table.
+            count: number of IDs to reserve.
+
+        Returns:
+            The first reserved ID.
+        """
+        raise NotImplementedError
+
+    def writeBatch(self, batch: dict[str, list[tuple]]) -> None:
+        """Writes a batch of rows.
+
+        Args:
+            batch: dictionary of table name to list of row tuples, with the
+                columns in the order of the table's insert statement.
+        """
+        raise NotImplementedError
+
+    def resumeRun(self, run_id: int, day: int, id_blocks: dict[str, list[int]]) -> None:
+        """Continues an existing run from a checkpoint taken at the start of
+        a day, instead of creating a run. Rows of the run written after the
+        checkpoint are deleted.
+
+        Args:
+            run_id: ID of the run.
+            day: day of the run the checkpoint was taken at.
+            id_blocks: the logger's ID blocks at the checkpoint, as
+                dictionary of table name to [next ID, end of block). Rows
+                of the run with IDs from the next ID on were written after
+                the checkpoint.
+        """
+        raise NotImplementedError
+
+    def nextDay(self, day: int) -> None:
+        """Called after every row of the previous day has been written.
+
+        Args:
+            day: the new day of the run.
+        """
+        pass
+
+    def close(self) -> None:
+        """Writes anything still held and closes the storage."""
+        raise NotImplementedError
@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from collections import deque
+
+class LogWriterThread(threading.Thread):
+    """Dedicated thread that owns the log database connection and runs
+    write tasks handed over through a bounded queue.
+
+    Submitting blocks while the queue is full, which applies backpressure to
+    the simulation instead of letting memory grow. The first exception raised
+    by a task is kept and re-raised on the submitting thread.
+
+    Attributes:
+        tasks: bounded queue of pending tasks.
+        pendingSince: enqueue times of the tasks not yet completed.
+        error: first exception raised by a task, or None.
+        completedTasks: number of tasks completed so far.
+    """
+    _STOP = object()
+
+    def __init__(self, open_connection: callable, max_queue_size: int = 64) -> None:
+        """Initializes the thread.
+
+        Args:
+            open_connection: callable run first on the thread to open the
+                connection it owns.
+            max_queue_size: maximum number of pending tasks before submitting
+                blocks.
+        """
+        super().__init__(name="SimulationLogWriter", daemon=True)
+        self.openConnection = open_connection
+        self.maxQueueSize = max(1, int(max_queue_size))
+        self.tasks = queue.Queue(maxsize=self.maxQueueSize)
+        self.pendingSince = deque()
+        self.error = None
+        self.completedTasks = 0
+        self.lastTaskLag = 0.0
+        self.blockedTime = 0.0
+
+    def run(self) -> None:
+        try:
+            self.openConnection()
+        except BaseException as e:
+            self.error = e
+        while True:
+            item = self.tasks.get()
+            if item is self._STOP:
+                self.tasks.task_done()
+                return
+            task, args, reply = item
+            result = None
+            try:
+                # once a task has failed, later tasks are dropped
+                if self.error is None:
+                    result = task(*args)
+            except BaseException as e:
+                self.error = e
+            finally:
+                enqueued_at = self.pendingSince.popleft()
+                self.lastTaskLag = time.monotonic() - enqueued_at
+                self.completedTasks += 1
+                self.tasks.task_done()
+                if reply is not None:
+                    reply["result"] = result
+                    reply["done"].set()
+
+    def raiseIfFailed(self) -> None:
+        """Re-raises the first exception raised on the writer thread."""
+        if self.error is not None:
+            raise Exception("Simulation log writer failed") from self.error
+
+    def _put(self, item) -> None:
+        self.raiseIfFailed()
+        self.pendingSince.append(time.monotonic())
+        try:
+            self.tasks.put_nowait(item)
+        except queue.Full:
+            started = time.monotonic()
+            self.tasks.put(item)
+            self.blockedTime += time.monotonic() - started
+
+    def submit(self, task: callable, *args) -> None:
+        """Queues a task without waiting for it to run.
+
+        Args:
+            task: callable run on the writer thread.
+            args: arguments passed to the task.
+        """
+        self._put((task, args, None))
+
+    def call(self, task: callable, *args):
+        """Queues a task and waits for its result.
+
+        Args:
+            task: callable run on the writer thread.
+            args: arguments passed to the task.
+
+        Returns:
+            The value returned by the task.
+        """
+        reply = {"done": threading.Event(), "result": None}
+        self._put((task, args, reply))
+        reply["done"].wait()
+        self.raiseIfFailed()
+        return reply["result"]
+
+    def drain(self) -> None:
+        """Waits until every queued task has run."""
+        self.tasks.join()
+        self.raiseIfFailed()
+
+    def stop(self) -> None:
+        """Runs the remaining tasks and stops the thread."""
+        if self.is_alive():
+            self.tasks.put(self._STOP)
+            self.join()
+        self.raiseIfFailed()
+
+    def getMetrics(self) -> dict:
+        """Get the queue and lag metrics of the writer.
+
+        Returns:
+            A dictionary with the current queue depth, the maximum queue
+            size, the writer lag (age in seconds of the oldest task not yet
+            completed), the lag of the last completed task, the number of
+            completed tasks, and the total time submitters spent blocked on a
+            full queue.
+        """
+        try:
+            writer_lag = time.monotonic() - self.pendingSince[0]
+        except IndexError:
+            writer_lag = 0.0
+        return {
+            'queue_depth': self.tasks.qsize(),
+            'max_queue_size': self.maxQueueSize,
+            'writer_lag': writer_lag,
+            'last_task_lag': self.lastTaskLag,
+            'completed_tasks': self.completedTasks,
+            'blocked_time': self.blockedTime,
+        }
@@ -0,0 +1,216 @@
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .LogSink import LogSink, LOG_TABLES, MAX_COMPACT_ROUNDS
+
+# Arrow schema of each table, with the columns in the order of the rows the
+# logger produces
+PARQUET_SCHEMAS = {
+    "runs": pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.string()),
+    ]),
+    "drivers": pa.schema([
+        ("id", pa.int64()),
+        ("run_id", pa.int64()),
+        ("trike_code", pa.string()),
+        ("hub", pa.string()),
+        ("start_tick", pa.int64()),
+        ("end_tick", pa.int64()),
+        ("max_gas", pa.float64()),
+        ("gas_consumption_rate", pa.float64()),
+        ("usual_gas_payment", pa.float64()),
+        ("gets_full_tank", pa.bool_()),
+        ("farthest_distance", pa.float64()),
+        ("daily_expense", pa.float64()),
+        ("patience", pa.float64()),
+        ("aspired_price", pa.float64()),
+        ("minimum_price", pa.float64()),
+    ]),
+    "passengers": pa.schema([
+        ("id", pa.int64()),
+        ("run_id", pa.int64()),
+        ("passenger_code", pa.string()),
+        ("day", pa.int64()),
+        ("willingness_to_pay", pa.float64()),
+        ("patience", pa.float64()),
+        ("aspired_price", pa.float64()),
+        ("destination_edge", pa.string()),
+        ("destination_position", pa.float64()),
+        ("destination_lane", pa.int64()),
+    ]),
+    "passenger_transactions": pa.schema([
+        ("id", pa.int64()),
+        ("run_id", pa.int64()),
+        ("driver_id", pa.int64()),
+        ("passenger_id", pa.int64()),
+        ("day", pa.int64()),
+        ("distance", pa.float64()),
+        ("tick", pa.int64()),
+        ("result", pa.string()),
+        ("final_price", pa.float64()),
+    ]),
+    "negotiation_steps": pa.schema([
+        ("id", pa.int64()),
+        ("transaction_id", pa.int64()),
+        ("current_offer", pa.float64()),
+        ("driver_asp", pa.float64()),
+        ("passenger_asp", pa.float64()),
+        ("current_turn", pa.string()),
+        ("iteration", pa.int64()),
+    ]),
+    "negotiation_rounds": pa.schema([
+        ("transaction_id", pa.int64()),
+        ("round_count", pa.int8()),
+    ] + [
+        field
+        for index in range(MAX_COMPACT_ROUNDS)
+        for field in ((f"offer_{index}", pa.float64()),
+                      (f"driver_asp_{index}", pa.float64()),
+                      (f"passenger_asp_{index}", pa.float64()),
+                      (f"turn_{index}", pa.int8()))
+    ]),
+    "expenses": pa.schema([
+        ("id", pa.int64()),
+        ("run_id", pa.int64()),
+        ("driver_id", pa.int64()),
+        ("expense_type", pa.string()),
+        ("amount", pa.float64()),
+    ]),
+    "driver_days": pa.schema([
+        ("id", pa.int64()),
+        ("run_id", pa.int64()),
+        ("driver_id", pa.int64()),
+        ("day", pa.int64()),
+        ("requests", pa.int64()),
+        ("agreements", pa.int64()),
+        ("failures", pa.int64()),
+        ("rejections", pa.int64()),
+        ("income", pa.float64()),
+        ("expenses", pa.float64()),
+        ("fuel_expenses", pa.float64()),
+        ("trips", pa.int64()),
+        ("distance", pa.float64()),
+        ("actual_start_tick", pa.int64()),
+        ("actual_end_tick", pa.int64()),
+        ("money", pa.float64()),
+    ]),
+}
+
+# Bits of a row ID holding the per-run counter; the run ID fills the rest
+RUN_ID_SHIFT = 32
+
+class ParquetLogSink(LogSink):
+    """Writes simulation logs as a Parquet dataset partitioned by run and day.
+
+    Rows are accumulated as Arrow record batches per table and written once
+    per day, to <datasetPath>/<table>/run_id=<run>/day=<day>/part-0.parquet.
+    Drivers are partitioned by run only. The partition columns are not
+    stored in the files; readers get them back from the directory names
+    with hive partitioning.
+
+    Row IDs are run-scoped: the run ID in the high bits and a per-run
+    counter in the low bits, so runs written by separate processes never
+    collide.
+
+    Attributes:
+        datasetPath: root directory of the dataset.
+        runId: ID of the run being written, or None before createRun().
+        day: day of the rows being accumulated.
+        recordBatches: dictionary of (table, day) to accumulated batches.
+        counters: dictionary of table name to the next per-run counter.
+    """
+
+    def __init__(self, dataset_path: str | None = None) -> None:
+        """Initializes the sink.
+
+        Args:
+            dataset_path: root directory of the dataset. Defaults to
+                db/simulation_logs.parquet under the working directory.
+        """
+        if dataset_path is None:
+            dataset_path = os.path.join(os.getcwd(), "db/simulation_logs.parquet")
+        self.datasetPath = dataset_path
+        self.runId = None
+        self.day = 0
+        self.recordBatches = dict()
+        self.counters = dict()
+
+    def open(self) -> None:
+        os.makedirs(os.path.join(self.datasetPath, "runs"), exist_ok=True)
+
+    def createRun(self, timestamp: str) -> int:
+        # claim the next free run ID by creating its file exclusively
+        runs_directory = os.path.join(self.datasetPath, "runs")
+        existing = [int(name[4:-8]) for name in os.listdir(runs_directory)
+                    if name.startswith("run-") and name.endswith(".parquet")]
+        run_id = max(existing, default=0) + 1
+        while True:
+            path = os.path.join(runs_directory, f"run-{run_id}.parquet")
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                run_id += 1
+        table = pa.table({"id": [run_id], "timestamp": [timestamp]}, schema=PARQUET_SCHEMAS["runs"])
+        pq.write_table(table, path)
+        self.runId = run_id
+        return run_id
+
+    def reserveIds(self, table: str, count: int) -> int:
+        first_id = self.counters.get(table, (self.runId << RUN_ID_SHIFT) + 1)
+        self.counters[table] = first_id + count
+        return first_id
+
+    def resumeRun(self, run_id: int, day: int, id_blocks: dict[str, list[int]]) -> None:
+        """Deletes the run's partitions of the checkpoint's day and later,
+        and continues the per-run counters after the restored blocks."""
+        self.runId = run_id
+        self.day = day
+        self.recordBatches = dict()
+        for table in LOG_TABLES:
+            run_directory = os.path.join(self.datasetPath, table, f"run_id={run_id}")
+            if table == "drivers" or not os.path.isdir(run_directory):
+                continue
+            for name in os.listdir(run_directory):
+                if name.startswith("day=") and int(name[4:]) >= day:
+                    shutil.rmtree(os.path.join(run_directory, name))
+        self.counters = {table: end for table, (_, end) in id_blocks.items()}
+
+    def writeBatch(self, batch: dict[str, list[tuple]]) -> None:
+        for table in LOG_TABLES:
+            rows = batch.get(table)
+            if not rows:
+                continue
+            schema = PARQUET_SCHEMAS[table]
+            columns = list(zip(*rows))
+            record_batch = pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema)
+            self.recordBatches.setdefault((table, self.day), []).append(record_batch)
+
+    def _partitionPath(self, table: str, day: int) -> str:
+        if table == "drivers":
+            return os.path.join(self.datasetPath, table, f"run_id={self.runId}")
+        return os.path.join(self.datasetPath, table, f"run_id={self.runId}", f"day={day}")
+
+    def _writePartitions(self) -> None:
+        for (table, day), record_batches in self.recordBatches.items():
+            data = pa.Table.from_batches(record_batches)
+            data = data.drop_columns([name for name in ("run_id", "day") if name in data.column_names])
+            directory = self._partitionPath(table, day)
+            os.makedirs(directory, exist_ok=True)
+            # continue numbering after parts written by earlier calls for the same partition
+            part = len([name for name in os.listdir(directory) if name.endswith(".parquet")])
+            pq.write_table(data, os.path.join(directory, f"part-{part}.parquet"))
+        self.recordBatches = dict()
+
+    def nextDay(self, day: int) -> None:
+        self._writePartitions()
+        self.day = day
+
+    def close(self) -> None:
+        self._writePartitions()
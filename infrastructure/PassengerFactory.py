@@ -1,11 +1,12 @@
-import random
-
 from config.SimulationConfig import SimulationConfig
 
 from .SumoRepository import SumoRepository
 from .SimulationLogger import SimulationLogger
+from .ReachabilityIndex import ReachabilityIndex
+from utils.TraciUtils import getListOfHubIds, getTricycleHubEdge
 
 from domain.Passenger import Passenger
+from domain.DispatchRequest import DispatchRequest
 from domain.Location import Location, getManhattanDistance
 
 class PassengerFactory:
@@ -16,8 +17,16 @@ class PassengerFactory:
         networkPedestrianEdges: list of pedestrian edges in the network.
         wtpDistribution: distribution function for willingness to pay.
         todaPositions: dictionary of Toda hub positions.
+        destinationEdgeWeights: optional relative weights of destination edges.
+        destinationBatchSize: number of destinations sampled at a time.
+        destinationBatches: pre-sampled destinations per starting edge.
+        destinationSamplingMode: one of "uniform", "reachable" or "analytic".
+        reachabilityIndex: per-hub index of edges sorted by network distance,
+            or None in "uniform" mode.
         index: integer index for unique passenger naming.
     """
+    SAMPLING_MODES = ("uniform", "reachable", "analytic")
+
     def __init__(self, sumo_repository: SumoRepository, simulation_config: SimulationConfig, simulation_logger: SimulationLogger) -> None:
         """Initializes object with elements from SumoRepository and SimulationConfig.
 
@@ -32,13 +41,29 @@ class PassengerFactory:
         self.todaPositions = simulation_config.getTodaPositions()
         self.patienceDistribution = simulation_config.getPassengerPatienceDistribution()
         self.aspiredPriceDistribution = simulation_config.getPassengerAspiredPriceDistribution()
+        self.destinationEdgeWeights = simulation_config.getDestinationEdgeWeights()
+        self.destinationBatchSize = simulation_config.getDestinationBatchSize()
         self.sumoRepository = sumo_repository
         self.simulationLogger = simulation_logger
 
+        # Pre-sampled destinations and sampling probabilities per starting edge
+        self.destinationBatches = dict()
+        self.destinationProbabilities = dict()
+
+        # Build the per-hub reachability index for the index-based sampling modes
+        self.destinationSamplingMode = simulation_config.getDestinationSamplingMode()
+        if self.destinationSamplingMode not in self.SAMPLING_MODES:
+            raise Exception(f"Invalid destination sampling mode. Was: {self.destinationSamplingMode}")
+        self.reachabilityIndex = None
+        if self.destinationSamplingMode != "uniform":
+            self.reachabilityIndex = ReachabilityIndex(sumo_repository, self.todaPositions, self.destinationEdgeWeights)
+            for hub in getListOfHubIds():
+                self.reachabilityIndex.build(getTricycleHubEdge(hub))
+
         # Initialize passenger index for unique naming
         self.index = 0
 
-    def createRandomPassenger(self, starting_edge: str) -> tuple[str, Passenger]:
+    def createRandomPassenger(self, starting_edge: str) -> Passenger:
         """Creates a Passenger object with a random destination edge.
 
         Args:
@@ -47,40 +72,55 @@ class PassengerFactory:
         Returns:
             A Passenger object with a random destination edge.
         """
+        return self.createDispatchRequest(starting_edge).getPassenger()
 
-        # select a random destination edge different from starting edge
-        destination_edge = random.choice(self.networkPedestrianEdges)
-        while destination_edge == starting_edge:
-            destination_edge = random.choice(self.networkPedestrianEdges)
+    def createDispatchRequest(self, starting_edge: str, max_distance: float | None = None) -> DispatchRequest | None:
+        """Creates a request of a passenger with a random destination edge.
 
-        # create passenger name
-        name = f"ped{self.index}"
-        self.index += 1
+        The hub-to-destination distance is computed once here and carried by
+        the returned request. In "reachable" mode, only destinations within
+        max_distance are sampled. In "analytic" mode, destinations beyond
+        max_distance are rejected before a passenger is created.
 
-        # select lane index (first or last lane of the edge)
-        lane_index = self.sumoRepository.getNumberOfLanes(destination_edge) - 1 if \
-                     random.random() >= 0.5 else \
-                     0
-        
-        # construct full lane ID
-        lane_id = destination_edge + "_" + str(lane_index)
-
-        # select random distance along lane
-        lane_length = self.sumoRepository.getLaneLength(lane_id)
-        position = random.random() * lane_length
+        Args:
+            starting_edge: the edge ID where the passenger starts.
+            max_distance: optional farthest distance the tricycle at the head
+                of the queue would travel (in meters).
 
-        # calculate distance to destination
+        Returns:
+            A DispatchRequest object holding the new passenger, or None if
+            the destination was rejected from the reachability index.
+        """
         source_position = self.todaPositions.get(starting_edge, 0.0)
         source = Location(starting_edge, source_position, -1)
-        destination = Location(destination_edge, position, lane_index)
-        distance = getManhattanDistance(source, destination) / 1000.0  # convert to km
 
-        # generate willingness to pay (peso/km times distance in km)
-        willingness_to_pay = self.wtpDistribution(size=1) * distance
+        if self.destinationSamplingMode == "reachable" and max_distance is not None:
+            # sample a destination conditioned on it being reachable
+            sample = self.reachabilityIndex.sampleReachableDestination(starting_edge, max_distance)
+            if sample is None:
+                return None
+            destination_edge, lane_index, position, distance = sample
+        else:
+            # take the next pre-sampled destination different from starting edge
+            destination_edge, lane_index, position = self._nextDestination(starting_edge)
+
+            # calculate distance to destination (the only distance query of the request)
+            if self.reachabilityIndex is not None:
+                distance = self.reachabilityIndex.getDistance(starting_edge, destination_edge, position)
+                if max_distance is not None and distance > max_distance:
+                    return None
+            else:
+                distance = getManhattanDistance(source, Location(destination_edge, position, lane_index))
+
+        # create passenger name
+        name = f"ped{self.index}"
+        self.index += 1
 
-        # create Location object for destination
         destination = Location(destination_edge, position, lane_index)
 
+        # generate willingness to pay (peso/km times distance in km)
+        willingness_to_pay = self.wtpDistribution(size=1) * distance / 1000.0
+
         patience = self.patienceDistribution()
 
         aspiredPrice = self.aspiredPriceDistribution()
@@ -89,5 +129,75 @@ class PassengerFactory:
 
         self.simulationLogger.addPassenger(passenger)
         
-        # create and return Passenger object
-        return passenger
\ No newline at end of file
+        # create and return the request
+        return DispatchRequest(passenger, source, distance)
+
+    def getCheckpoint(self) -> dict:
+        """Get the state that carries over between days: the passenger index
+        and the pre-sampled destinations not used yet.
+
+        Returns:
+            A dictionary to pass to restoreCheckpoint().
+        """
+        return {
+            "index": self.index,
+            "destination_batches": {edge: list(batch) for edge, batch in self.destinationBatches.items()},
+        }
+
+    def restoreCheckpoint(self, checkpoint: dict) -> None:
+        """Continue from a state taken with getCheckpoint().
+
+        Args:
+            checkpoint: the output of getCheckpoint().
+        """
+        self.index = checkpoint["index"]
+        self.destinationBatches = {edge: list(batch) for edge, batch in checkpoint["destination_batches"].items()}
+
+    def getRejectionProbability(self, starting_edge: str, max_distance: float) -> float | None:
+        """Get the probability that a request from a starting edge is beyond
+        the given distance.
+
+        Args:
+            starting_edge: the edge ID where the passenger starts.
+            max_distance: the farthest distance a tricycle would travel.
+
+        Returns:
+            Probability in [0, 1], or None in "uniform" mode.
+        """
+        if self.reachabilityIndex is None:
+            return None
+        return self.reachabilityIndex.getRejectionProbability(starting_edge, max_distance)
+
+    def sampleDestinations(self, starting_edge: str, size: int) -> list[tuple[str, int, float]]:
+        """Samples a batch of destinations different from the starting edge.
+
+        Args:
+            starting_edge: the edge ID where the passengers start.
+            size: number of destinations to sample, e.g. a whole day's worth.
+
+        Returns:
+            A list of (edge ID, lane index, position) tuples.
+        """
+        if starting_edge not in self.destinationProbabilities:
+            self.destinationProbabilities[starting_edge] = self.sumoRepository.getPedestrianEdgeWeights(
+                self.destinationEdgeWeights, excluded_edge=starting_edge)
+        edges, lanes, positions = self.sumoRepository.sampleDestinations(
+            size, self.destinationProbabilities[starting_edge])
+        return list(zip(edges.tolist(), lanes.tolist(), positions.tolist()))
+
+    def _nextDestination(self, starting_edge: str) -> tuple[str, int, float]:
+        """Pops the next pre-sampled destination for a starting edge, sampling
+        a new batch when the current one runs out.
+
+        Args:
+            starting_edge: the edge ID where the passenger starts.
+
+        Returns:
+            An (edge ID, lane index, position) tuple.
+        """
+        batch = self.destinationBatches.get(starting_edge)
+        if not batch:
+            batch = self.sampleDestinations(starting_edge, self.destinationBatchSize)
+            batch.reverse()
+            self.destinationBatches[starting_edge] = batch
+        return batch.pop()
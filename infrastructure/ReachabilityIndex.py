@@ -0,0 +1,175 @@
+import heapq
+import numpy as np
+
+from .SumoRepository import SumoRepository
+
+class ReachabilityIndex:
+    """Per-hub index of the pedestrian edges sorted by network distance.
+
+    For every starting edge, the index holds the driving distance from the
+    starting position to the start of each pedestrian edge, sorted in
+    ascending order. The distance to a destination is then the distance to
+    the start of its edge plus its position along the edge, which lets
+    reachability be decided without any TraCI call.
+
+    Attributes:
+        sumoRepository: SumoRepository object holding the network and lane
+            tables.
+        vehicleClass: SUMO vehicle class used to decide which edges can be
+            driven on.
+        startingPositions: dictionary of starting edge ID to the position
+            along it that distances are measured from.
+        edgeWeights: optional relative weights of destination edges.
+        indices: dictionary of starting edge ID to its sorted index.
+    """
+
+    def __init__(self, sumo_repository: SumoRepository, starting_positions: dict[str, float],
+                 edge_weights: dict[str, float] | None = None,
+                 vehicle_class: str = "motorcycle") -> None:
+        """Initializes an empty index over the pedestrian edges.
+
+        Args:
+            sumo_repository: SumoRepository object holding the network and
+                lane tables.
+            starting_positions: dictionary of starting edge ID to the
+                position along it that distances are measured from. Missing
+                edges are measured from position 0.
+            edge_weights: optional relative weights of destination edges.
+            vehicle_class: SUMO vehicle class used to decide which edges can
+                be driven on.
+        """
+        self.sumoRepository = sumo_repository
+        self.startingPositions = starting_positions
+        self.edgeWeights = edge_weights
+        self.vehicleClass = vehicle_class
+        self.indices = dict()
+
+    def build(self, starting_edge: str) -> None:
+        """Builds the sorted index of a starting edge.
+
+        Runs a single-source shortest path search over the drivable edges of
+        the network, starting from the starting position on the edge.
+
+        Args:
+            starting_edge: the edge ID of the hub.
+        """
+        network = self.sumoRepository.getNetwork()
+        source = network.getEdge(starting_edge)
+        source_position = self.startingPositions.get(starting_edge, 0.0)
+
+        # distances to the start of each edge, measured from the source position
+        start_distances = dict()
+        queue = [(source.getLength() - source_position, source.getID(), source)]
+        visited = set()
+        while queue:
+            end_distance, edge_id, edge = heapq.heappop(queue)
+            if edge_id in visited:
+                continue
+            visited.add(edge_id)
+            for next_edge in edge.getOutgoing():
+                next_id = next_edge.getID()
+                if next_id in visited or not next_edge.allows(self.vehicleClass):
+                    continue
+                if end_distance < start_distances.get(next_id, np.inf):
+                    start_distances[next_id] = end_distance
+                    heapq.heappush(queue, (end_distance + next_edge.getLength(), next_id, next_edge))
+
+        edges = self.sumoRepository.pedestrianEdges
+        distances = np.array([start_distances.get(edge, np.inf) for edge in edges], dtype=float)
+        probabilities = self.sumoRepository.getPedestrianEdgeWeights(self.edgeWeights, excluded_edge=starting_edge)
+
+        order = np.argsort(distances, kind="stable")
+        self.indices[starting_edge] = {
+            "edgeIndices": order,
+            "startDistances": distances[order],
+            "probabilities": probabilities[order],
+            "lookup": {edges[i]: distances[i] for i in range(len(edges))},
+        }
+
+    def _getIndex(self, starting_edge: str) -> dict:
+        if starting_edge not in self.indices:
+            self.build(starting_edge)
+        return self.indices[starting_edge]
+
+    def getDistance(self, starting_edge: str, edge: str, position: float) -> float:
+        """Get the network distance from a starting edge to a destination.
+
+        Args:
+            starting_edge: the edge ID of the hub.
+            edge: the edge ID of the destination.
+            position: the position of the destination along its edge.
+
+        Returns:
+            Distance in meters. Infinite if the edge cannot be reached.
+        """
+        return float(self._getIndex(starting_edge)["lookup"].get(edge, np.inf) + position)
+
+    def _reachableShares(self, index: dict, count: int, max_distance: float) -> tuple[np.ndarray, np.ndarray]:
+        """Computes the reachable share of the first and last lane of the
+        `count` closest edges of an index."""
+        edge_indices = index["edgeIndices"][:count]
+        budget = max_distance - index["startDistances"][:count]
+        first_lengths = self.sumoRepository.firstLaneLengths[edge_indices]
+        last_lengths = self.sumoRepository.lastLaneLengths[edge_indices]
+        first_share = np.clip(budget / np.maximum(first_lengths, 1e-9), 0.0, 1.0)
+        last_share = np.clip(budget / np.maximum(last_lengths, 1e-9), 0.0, 1.0)
+        return first_share, last_share
+
+    def getRejectionProbability(self, starting_edge: str, max_distance: float) -> float:
+        """Get the probability that a destination sampled from a starting
+        edge is farther than the given distance.
+
+        Args:
+            starting_edge: the edge ID of the hub.
+            max_distance: the farthest distance a tricycle would travel.
+
+        Returns:
+            Probability in [0, 1].
+        """
+        index = self._getIndex(starting_edge)
+        count = int(np.searchsorted(index["startDistances"], max_distance, side="left"))
+        if count == 0:
+            return 1.0
+        first_share, last_share = self._reachableShares(index, count, max_distance)
+        reachable = np.sum(index["probabilities"][:count] * 0.5 * (first_share + last_share))
+        return float(min(1.0, max(0.0, 1.0 - reachable)))
+
+    def sampleReachableDestination(self, starting_edge: str, max_distance: float) -> tuple[str, int, float, float] | None:
+        """Samples a destination from a starting edge, conditioned on it
+        being within the given distance.
+
+        The result follows the same distribution as the unconditioned
+        sampler of SumoRepository, restricted to reachable destinations.
+
+        Args:
+            starting_edge: the edge ID of the hub.
+            max_distance: the farthest distance a tricycle would travel.
+
+        Returns:
+            An (edge ID, lane index, position, distance) tuple, or None if no
+            destination is reachable.
+        """
+        index = self._getIndex(starting_edge)
+        count = int(np.searchsorted(index["startDistances"], max_distance, side="left"))
+        if count == 0:
+            return None
+
+        first_share, last_share = self._reachableShares(index, count, max_distance)
+        weights = index["probabilities"][:count] * 0.5 * (first_share + last_share)
+        total = weights.sum()
+        if total <= 0:
+            return None
+
+        chosen = np.random.choice(count, p=weights / total)
+        edge_index = index["edgeIndices"][chosen]
+        use_last_lane = np.random.random() * (first_share[chosen] + last_share[chosen]) >= first_share[chosen]
+        if use_last_lane:
+            lane = int(self.sumoRepository.laneCounts[edge_index] - 1)
+            lane_length = self.sumoRepository.lastLaneLengths[edge_index]
+        else:
+            lane = 0
+            lane_length = self.sumoRepository.firstLaneLengths[edge_index]
+
+        start_distance = index["startDistances"][chosen]
+        position = float(np.random.random() * min(lane_length, max_distance - start_distance))
+        return self.sumoRepository.pedestrianEdges[edge_index], lane, position, float(start_distance + position)
@@ -0,0 +1,293 @@
+import sqlite3
+
+# Numbered migrations of the simulation log schema. Each entry is
+# (version, description, statements); a database at PRAGMA user_version N
+# gets every migration with a version above N applied in order. Never edit
+# an applied migration; append a new one instead.
+MIGRATIONS = [
+    (1, "base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS drivers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            trike_code TEXT,
+            hub TEXT,
+            start_tick INTEGER,
+            end_tick INTEGER,
+            max_gas REAL,
+            gas_consumption_rate REAL,
+            usual_gas_payment REAL,
+            gets_full_tank BOOLEAN,
+            farthest_distance REAL,
+            daily_expense REAL,
+            patience REAL,
+            aspired_price REAL,
+            minimum_price REAL,
+            FOREIGN KEY (run_id) REFERENCES runs(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS passengers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            passenger_code TEXT,
+            day INTEGER,
+            willingness_to_pay REAL,
+            patience REAL,
+            aspired_price REAL,
+            destination_edge TEXT,
+            destination_position REAL,
+            destination_lane INTEGER,
+            FOREIGN KEY (run_id) REFERENCES runs(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS passenger_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            driver_id INTEGER,
+            passenger_id INTEGER,
+            day INTEGER,
+            distance REAL,
+            tick INTEGER,
+            result TEXT,
+            final_price REAL,
+            FOREIGN KEY (run_id) REFERENCES runs(id),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id),
+            FOREIGN KEY (passenger_id) REFERENCES passengers(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS negotiation_steps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER,
+            current_offer REAL,
+            driver_asp REAL,
+            passenger_asp REAL,
+            current_turn TEXT,
+            iteration INTEGER,
+            FOREIGN KEY (transaction_id) REFERENCES passenger_transactions(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            driver_id INTEGER,
+            expense_type TEXT,
+            amount REAL,
+            FOREIGN KEY (run_id) REFERENCES runs(id),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        )
+        ''',
+    ]),
+    (2, "indexes on the foreign-key and filter columns used by the dashboard", [
+        "CREATE INDEX IF NOT EXISTS idx_drivers_run ON drivers (run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_passengers_run ON passengers (run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_run ON passenger_transactions (run_id, result)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_driver ON passenger_transactions (driver_id)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_passenger ON passenger_transactions (passenger_id)",
+        "CREATE INDEX IF NOT EXISTS idx_negotiation_steps_transaction ON negotiation_steps (transaction_id, iteration)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_run ON expenses (run_id, expense_type)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_driver ON expenses (driver_id)",
+    ]),
+    (3, "database identity and the ledger of merged shards", [
+        '''
+        CREATE TABLE IF NOT EXISTS log_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+        "INSERT OR IGNORE INTO log_meta (key, value) VALUES ('database_uuid', lower(hex(randomblob(16))))",
+        '''
+        CREATE TABLE IF NOT EXISTS merged_shards (
+            shard_uuid TEXT PRIMARY KEY,
+            shard_path TEXT,
+            merged_at TEXT,
+            run_offset INTEGER,
+            runs INTEGER,
+            rows INTEGER
+        )
+        ''',
+    ]),
+    (4, "compact negotiation storage behind a negotiation_steps view", [
+        # the table keeps its rows, indexes and AUTOINCREMENT counter under the new name
+        "ALTER TABLE negotiation_steps RENAME TO negotiation_steps_rows",
+        '''
+        CREATE TABLE IF NOT EXISTS negotiation_rounds (
+            transaction_id INTEGER PRIMARY KEY,
+            round_count INTEGER,
+            offer_0 REAL,
+            driver_asp_0 REAL,
+            passenger_asp_0 REAL,
+            turn_0 INTEGER,
+            offer_1 REAL,
+            driver_asp_1 REAL,
+            passenger_asp_1 REAL,
+            turn_1 INTEGER,
+            offer_2 REAL,
+            driver_asp_2 REAL,
+            passenger_asp_2 REAL,
+            turn_2 INTEGER,
+            FOREIGN KEY (transaction_id) REFERENCES passenger_transactions(id)
+        )
+        ''',
+        # rows stored either way, in the old row-per-step shape; compact rows
+        # get negative IDs so they never clash with negotiation_steps_rows
+        '''
+        CREATE VIEW IF NOT EXISTS negotiation_steps AS
+        SELECT id, transaction_id, current_offer, driver_asp, passenger_asp, current_turn, iteration
+        FROM negotiation_steps_rows
+        UNION ALL
+        SELECT -(transaction_id * 3 + 0), transaction_id, offer_0, driver_asp_0, passenger_asp_0,
+               CASE turn_0 WHEN 0 THEN 'driver' WHEN 1 THEN 'passenger' END, 0
+        FROM negotiation_rounds WHERE round_count > 0
+        UNION ALL
+        SELECT -(transaction_id * 3 + 1), transaction_id, offer_1, driver_asp_1, passenger_asp_1,
+               CASE turn_1 WHEN 0 THEN 'driver' WHEN 1 THEN 'passenger' END, 1
+        FROM negotiation_rounds WHERE round_count > 1
+        UNION ALL
+        SELECT -(transaction_id * 3 + 2), transaction_id, offer_2, driver_asp_2, passenger_asp_2,
+               CASE turn_2 WHEN 0 THEN 'driver' WHEN 1 THEN 'passenger' END, 2
+        FROM negotiation_rounds WHERE round_count > 2
+        ''',
+    ]),
+    (5, "per-driver daily counters", [
+        '''
+        CREATE TABLE IF NOT EXISTS driver_days (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER,
+            driver_id INTEGER,
+            day INTEGER,
+            requests INTEGER,
+            agreements INTEGER,
+            failures INTEGER,
+            rejections INTEGER,
+            income REAL,
+            expenses REAL,
+            FOREIGN KEY (run_id) REFERENCES runs(id),
+            FOREIGN KEY (driver_id) REFERENCES drivers(id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_driver_days_run ON driver_days (run_id, day)",
+        "CREATE INDEX IF NOT EXISTS idx_driver_days_driver ON driver_days (driver_id)",
+    ]),
+    (6, "fuel expenses and tricycle statistics in driver_days", [
+        "ALTER TABLE driver_days ADD COLUMN fuel_expenses REAL",
+        "ALTER TABLE driver_days ADD COLUMN trips INTEGER",
+        "ALTER TABLE driver_days ADD COLUMN distance REAL",
+        "ALTER TABLE driver_days ADD COLUMN actual_start_tick INTEGER",
+        "ALTER TABLE driver_days ADD COLUMN actual_end_tick INTEGER",
+        "ALTER TABLE driver_days ADD COLUMN money REAL",
+    ]),
+]
+
+class SchemaManager:
+    """Configures connections to the simulation log database and brings its
+    schema up to date.
+
+    Attributes:
+        migrations: list of (version, description, statements) tuples.
+        busyTimeout: milliseconds a connection waits on a locked database.
+        cacheSize: page cache size in KiB per connection.
+    """
+
+    def __init__(self, migrations: list = MIGRATIONS, busy_timeout: int = 30000,
+                 cache_size: int = 65536) -> None:
+        """Initializes the manager.
+
+        Args:
+            migrations: list of (version, description, statements) tuples,
+                sorted by version.
+            busy_timeout: milliseconds a connection waits on a locked
+                database before failing.
+            cache_size: page cache size in KiB per connection.
+        """
+        self.migrations = migrations
+        self.busyTimeout = busy_timeout
+        self.cacheSize = cache_size
+
+    def getLatestVersion(self) -> int:
+        """Get the schema version the migrations bring a database to.
+
+        Returns:
+            The highest migration version.
+        """
+        return max(version for version, _, _ in self.migrations)
+
+    def configure(self, conn: sqlite3.Connection) -> None:
+        """Applies the per-connection pragmas.
+
+        WAL lets the dashboard read while a simulation writes, and
+        synchronous=NORMAL only syncs at checkpoints, which is safe in WAL
+        mode.
+
+        Args:
+            conn: an open connection to the database.
+        """
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busyTimeout)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cacheSize)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    def getVersion(self, conn: sqlite3.Connection) -> int:
+        """Get the schema version of a database.
+
+        Args:
+            conn: an open connection to the database.
+
+        Returns:
+            The value of PRAGMA user_version.
+        """
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, conn: sqlite3.Connection) -> int:
+        """Applies every pending migration, each in its own transaction.
+
+        Safe to run from several processes at once: the version is re-read
+        after taking the write lock.
+
+        Args:
+            conn: an open connection to the database.
+
+        Returns:
+            The schema version of the database afterwards.
+        """
+        if conn.in_transaction:
+            conn.commit()
+        for version, description, statements in self.migrations:
+            if self.getVersion(conn) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.getVersion(conn) < version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return self.getVersion(conn)
+
+    def connect(self, path: str) -> sqlite3.Connection:
+        """Opens, configures and migrates a connection to a database file.
+
+        Args:
+            path: path to the database file.
+
+        Returns:
+            The open connection.
+        """
+        conn = sqlite3.connect(path, timeout=self.busyTimeout / 1000.0)
+        self.configure(conn)
+        self.migrate(conn)
+        return conn
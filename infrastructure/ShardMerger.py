@@ -0,0 +1,190 @@
+import glob
+import os
+import sqlite3
+
+from datetime import datetime
+from .SchemaManager import SchemaManager
+
+# Columns holding IDs that are remapped on merge, per table, mapped to the
+# table the ID belongs to. Tables are listed parents first.
+ID_COLUMNS = {
+    "runs": {"id": "runs"},
+    "drivers": {"id": "drivers", "run_id": "runs"},
+    "passengers": {"id": "passengers", "run_id": "runs"},
+    "passenger_transactions": {"id": "passenger_transactions", "run_id": "runs",
+                               "driver_id": "drivers", "passenger_id": "passengers"},
+    "negotiation_steps_rows": {"id": "negotiation_steps_rows", "transaction_id": "passenger_transactions"},
+    "negotiation_rounds": {"transaction_id": "passenger_transactions"},
+    "expenses": {"id": "expenses", "run_id": "runs", "driver_id": "drivers"},
+    "driver_days": {"id": "driver_days", "run_id": "runs", "driver_id": "drivers"},
+}
+
+class ShardMerger:
+    """Consolidates per-worker shard databases into one log database.
+
+    Each shard is copied with INSERT ... SELECT through ATTACH DATABASE.
+    Every ID is shifted by an offset per table that places the shard's rows
+    after the rows already in the target, and references are shifted by the
+    offset of the table they point to.
+
+    A shard is merged in a single transaction that also records its
+    database UUID in the merged_shards ledger, so an interrupted merge
+    leaves no partial shard behind and re-running skips the shards already
+    merged. Shards must not be written to while they are merged.
+
+    Attributes:
+        targetPath: path to the consolidated database.
+        schemaManager: SchemaManager used to open the target and the shards.
+        conn: connection to the target, or None before open().
+    """
+
+    def __init__(self, target_path: str, schema_manager: SchemaManager | None = None) -> None:
+        """Initializes the merger.
+
+        Args:
+            target_path: path to the consolidated database; created if it
+                does not exist.
+            schema_manager: SchemaManager used to open the databases.
+        """
+        self.targetPath = target_path
+        self.schemaManager = schema_manager if schema_manager is not None else SchemaManager()
+        self.conn = None
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.targetPath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = self.schemaManager.connect(self.targetPath)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def getDatabaseUuid(self, conn: sqlite3.Connection, schema: str = "main") -> str:
+        """Get the UUID identifying a log database.
+
+        Args:
+            conn: an open connection.
+            schema: name of the attached database to read.
+
+        Returns:
+            The database_uuid stored in its log_meta table.
+        """
+        return conn.execute(f"SELECT value FROM {schema}.log_meta WHERE key = 'database_uuid'").fetchone()[0]
+
+    def isMerged(self, shard_uuid: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM merged_shards WHERE shard_uuid = ?", (shard_uuid,)).fetchone()
+        return row is not None
+
+    def _getOffsets(self) -> dict[str, int]:
+        """Get the offset per table that moves the attached shard's IDs
+        past every ID used or reserved in the target."""
+        offsets = dict()
+        for table, id_columns in ID_COLUMNS.items():
+            if id_columns.get("id") != table:
+                continue
+            row = self.conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            target_max = max(row[0] if row else 0,
+                             self.conn.execute(f"SELECT MAX(id) FROM main.{table}").fetchone()[0] or 0)
+            shard_min = self.conn.execute(f"SELECT MIN(id) FROM shard.{table}").fetchone()[0]
+            offsets[table] = target_max - shard_min + 1 if shard_min is not None else 0
+        return offsets
+
+    def _copyTable(self, table: str, offsets: dict[str, int]) -> int:
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA main.table_info({table})")]
+        id_columns = ID_COLUMNS[table]
+        expressions = [f"{column} + {int(offsets[id_columns[column]])}" if column in id_columns else column
+                       for column in columns]
+        cursor = self.conn.execute(
+            f"INSERT INTO main.{table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(expressions)} FROM shard.{table} ORDER BY rowid"
+        )
+        return cursor.rowcount
+
+    def mergeShard(self, shard_path: str) -> bool:
+        """Merges one shard into the target unless it was merged before.
+
+        Args:
+            shard_path: path to the shard database.
+
+        Returns:
+            True if the shard was merged, False if it was skipped.
+        """
+        # bring the shard to the target's schema and make sure it has a UUID
+        self.schemaManager.connect(shard_path).close()
+
+        self.conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        try:
+            shard_uuid = self.getDatabaseUuid(self.conn, "shard")
+            if shard_uuid == self.getDatabaseUuid(self.conn) or self.isMerged(shard_uuid):
+                return False
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # re-check under the write lock in case another merger got here first
+                if self.isMerged(shard_uuid):
+                    self.conn.rollback()
+                    return False
+                offsets = self._getOffsets()
+                copied = {table: self._copyTable(table, offsets) for table in ID_COLUMNS}
+                self.conn.execute(
+                    "INSERT INTO merged_shards (shard_uuid, shard_path, merged_at, run_offset, runs, rows) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (shard_uuid, os.path.abspath(shard_path), datetime.now().strftime("%Y%m%d-%H%M%S"),
+                     offsets["runs"], copied["runs"], sum(copied.values()))
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            return True
+        finally:
+            self.conn.execute("DETACH DATABASE shard")
+
+    def getRunOffset(self, shard_path: str) -> int | None:
+        """Get the offset that moved a merged shard's run IDs into the
+        target: the target's run ID of the shard's run run_id is
+        run_id + offset.
+
+        Args:
+            shard_path: path to the shard database.
+
+        Returns:
+            The run offset, or None if the shard was not merged.
+        """
+        shard_conn = self.schemaManager.connect(shard_path)
+        try:
+            shard_uuid = self.getDatabaseUuid(shard_conn)
+        finally:
+            shard_conn.close()
+        row = self.conn.execute("SELECT run_offset FROM merged_shards WHERE shard_uuid = ?", (shard_uuid,)).fetchone()
+        return row[0] if row is not None else None
+
+    def mergeShards(self, shard_paths: list[str]) -> list[str]:
+        """Merges several shards, one transaction each.
+
+        Args:
+            shard_paths: paths to the shard databases.
+
+        Returns:
+            The paths of the shards that were merged by this call.
+        """
+        merged = []
+        target = os.path.abspath(self.targetPath)
+        for shard_path in shard_paths:
+            if os.path.abspath(shard_path) == target:
+                continue
+            if self.mergeShard(shard_path):
+                merged.append(shard_path)
+        return merged
+
+    def mergeDirectory(self, shards_directory: str) -> list[str]:
+        """Merges every *.db file of a directory, in name order.
+
+        Args:
+            shards_directory: directory holding the shard databases.
+
+        Returns:
+            The paths of the shards that were merged by this call.
+        """
+        return self.mergeShards(sorted(glob.glob(os.path.join(shards_directory, "*.db"))))
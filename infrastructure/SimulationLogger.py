@@ -1,132 +1,166 @@
-import sqlite3
-import os
+import time
+import zlib
+import atexit
 
 from datetime import datetime
+from .IdAllocator import IdAllocator
+from .LogSink import LogSink, LOG_TABLES, ID_TABLES, MAX_COMPACT_ROUNDS, TURN_CODES
+from .LogWriterThread import LogWriterThread
+from .SqliteLogSink import SqliteLogSink
+
+# Expense types counted as fuel in driver_days
+FUEL_EXPENSE_TYPES = ("end_gas", "midday_gas")
+
+# Per-driver counters of a day:
+# [requests, agreements, failures, rejections, income, expenses, fuel expenses]
+EMPTY_DRIVER_DAY = (0, 0, 0, 0, 0.0, 0.0, 0.0)
+
 class SimulationLogger:
-    def __init__(self):
-        try:
-             os.makedirs(os.path.join(os.getcwd(), "db"), exist_ok=True)
-        except Exception as e:
-            pass
-        if not os.path.isfile(os.path.join(os.getcwd(), "db/simulation_logs.db")):
-            with open(os.path.join(os.getcwd(), "db/simulation_logs.db"), "w") as f:
-                pass
-        self.conn = sqlite3.connect(os.path.join(os.getcwd(), "db/simulation_logs.db"))
-        self.cursor = self.conn.cursor()
-        self.cursor.execute("PRAGMA foreign_keys = ON;")
-        self._createTables()
-        self._createRun(datetime.now().strftime("%Y%m%d-%H%M%S"))
-        self.runId = self.cursor.lastrowid
+    """Logs simulation records to a LogSink, by default the SQLite database.
+
+    Row IDs are allocated on the client from blocks reserved in the sink,
+    so every buffered row is complete when it is added. Rows are buffered
+    per table in memory and handed to the sink as one batch, which the
+    SQLite sink writes with one executemany per table inside a single
+    transaction. A flush happens when the number of buffered rows reaches
+    flush_rows, when flush_interval seconds have passed since the last
+    flush, on nextDay() and on close().
+
+    With run_id set, the logger continues an existing run instead of
+    creating one, and restoreCheckpoint() must be called with the state
+    getCheckpoint() returned at a day boundary before anything is logged.
+
+    With background=True, flushed batches are handed to a LogWriterThread
+    that owns the sink, so writes do not stall the tick loop.
+
+    With compact_negotiations=True, the rounds of a transaction are stored
+    as one negotiation_rounds row instead of one negotiation_steps row per
+    round. Readers see both forms through the negotiation_steps view.
+
+    log_level sets how much detail is written:
+        full: every passenger, transaction, negotiation round and expense.
+        transactions: as full, without negotiation rounds.
+        sampled: as full, for a sample_fraction of the passengers only.
+        aggregate: drivers and their daily counters only.
+    Whatever the level, per-driver counters of requests, agreements,
+    failures, rejections, income and expenses are kept in memory and
+    written as driver_days rows once per day.
+    """
+    LOG_LEVELS = ("full", "transactions", "sampled", "aggregate")
+
+    def __init__(self, sink: LogSink | None = None, flush_rows: int = 5000,
+                 flush_interval: float = 10.0, background: bool = False,
+                 max_queue_size: int = 64, id_block_size: int = 10000,
+                 compact_negotiations: bool = False, log_level: str = "full",
+                 sample_fraction: float = 1.0, run_id: int | None = None):
+        if log_level not in self.LOG_LEVELS:
+            raise Exception(f"Invalid log level. Was: {log_level}")
+        if not 0.0 <= sample_fraction <= 1.0:
+            raise Exception(f"Sample fraction must be between 0 and 1. Was: {sample_fraction}")
+        self.sink = sink if sink is not None else SqliteLogSink()
+        self.compactNegotiations = compact_negotiations
+        self.logLevel = log_level
+        self.sampleFraction = float(sample_fraction)
+        self.logsNegotiations = log_level in ("full", "sampled")
+
+        # The sink is opened on the thread that writes through it
+        self.writer = None
+        if background:
+            self.writer = LogWriterThread(self.sink.open, max_queue_size)
+            self.writer.start()
+        else:
+            self.sink.open()
+        continued = run_id is not None
+        if not continued:
+            run_id = self._call(self.sink.createRun, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.runId = run_id
         self.day = 0
         self.driverCache = dict()
         self.passengerCache = dict()
 
-    def _createTables(self):
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS runs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS drivers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_id INTEGER,
-            trike_code TEXT,
-            hub TEXT,
-            start_tick INTEGER,
-            end_tick INTEGER,
-            max_gas REAL,
-            gas_consumption_rate REAL,
-            usual_gas_payment REAL,
-            gets_full_tank BOOLEAN,
-            farthest_distance REAL,
-            daily_expense REAL,
-            patience REAL,
-            aspired_price REAL,
-            minimum_price REAL,
-            FOREIGN KEY (run_id) REFERENCES runs(id)
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS passengers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_id INTEGER,
-            passenger_code TEXT,
-            day INTEGER,
-            willingness_to_pay REAL,
-            patience REAL,
-            aspired_price REAL,
-            destination_edge TEXT,
-            destination_position REAL,
-            destination_lane INTEGER,
-            FOREIGN KEY (run_id) REFERENCES runs(id)
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS passenger_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_id INTEGER,
-            driver_id INTEGER,
-            passenger_id INTEGER,
-            day INTEGER,
-            distance REAL,
-            tick INTEGER,
-            result TEXT, 
-            final_price REAL,
-            FOREIGN KEY (run_id) REFERENCES runs(id),
-            FOREIGN KEY (driver_id) REFERENCES drivers(id),
-            FOREIGN KEY (passenger_id) REFERENCES passengers(id)
-        );
-        ''')
-        
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS negotiation_steps (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_id INTEGER,
-            current_offer REAL,
-            driver_asp REAL,
-            passenger_asp REAL,
-            current_turn TEXT,
-            iteration INTEGER,
-            FOREIGN KEY (transaction_id) REFERENCES passenger_transactions(id)
-        );''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            run_id INTEGER,
-            driver_id INTEGER,
-            expense_type TEXT,
-            amount REAL,
-            FOREIGN KEY (run_id) REFERENCES runs(id),
-            FOREIGN KEY (driver_id) REFERENCES drivers(id)
-        )
-        ''')
-        self.conn.commit()
-
-    def _createRun(self, timestamp: str):
-        self.cursor.execute(
-            "INSERT INTO runs (timestamp) VALUES (?)",
-            (timestamp,)
-        )
-        self.conn.commit()
-        self.runId = self.cursor.lastrowid
+        # Per-driver counters of the current day, and the tricycles whose
+        # daily statistics are written alongside them
+        self.driverDays = dict()
+        self.tricycles = dict()
+        self.dayHasActivity = False
+
+        # Reserve a block of IDs up front for each table the level writes to;
+        # a continued run gets its blocks back from the checkpoint
+        self.idAllocator = IdAllocator(lambda table, count: self._call(self.sink.reserveIds, table, count), id_block_size)
+        for table in ID_TABLES if not continued else ():
+            if table == "negotiation_steps" and (compact_negotiations or not self.logsNegotiations):
+                continue
+            if log_level == "aggregate" and table not in ("drivers", "driver_days"):
+                continue
+            self.idAllocator.reserveBlock(table)
+
+        # Buffered rows per table
+        self.flushRows = max(1, int(flush_rows))
+        self.flushInterval = flush_interval
+        self.pending = {table: [] for table in LOG_TABLES}
+        self.pendingRows = 0
+        self.lastFlushTime = time.monotonic()
+        self.closed = False
+        atexit.register(self.close)
+
+    def _call(self, task, *args):
+        """Runs a sink task on the thread owning the sink and returns its
+        result."""
+        if self.writer is None:
+            return task(*args)
+        return self.writer.call(task, *args)
+
+    def _submit(self, task, *args):
+        """Runs a sink task on the thread owning the sink without waiting
+        for it in background mode."""
+        if self.writer is None:
+            task(*args)
+        else:
+            self.writer.submit(task, *args)
+
+    def _addRow(self, table, row, count=1):
+        self.pending[table].append(row)
+        self.pendingRows += count
+
+    def isPassengerLogged(self, passenger_code):
+        """Whether the rows of a passenger are written at the log level.
+
+        Sampling hashes the passenger code rather than drawing a random
+        number, so it leaves the simulation's random streams untouched.
+        """
+        if self.logLevel == "aggregate":
+            return False
+        if self.logLevel == "sampled":
+            return zlib.crc32(passenger_code.encode()) / 2**32 < self.sampleFraction
+        return True
+
+    def _getDriverDay(self, trike_code):
+        self.dayHasActivity = True
+        return self.driverDays.setdefault(trike_code, list(EMPTY_DRIVER_DAY))
+
+    def _countRequest(self, trike_code, result, final_price):
+        counters = self._getDriverDay(trike_code)
+        counters[0] += 1
+        if result == "agree":
+            counters[1] += 1
+            counters[4] += float(final_price)
+        elif result == "failed":
+            counters[2] += 1
+        elif result == "reject":
+            counters[3] += 1
+
+    def countRejection(self, trike_code):
+        """Counts a request rejected before any passenger was created, as
+        with destinations rejected from the reachability index."""
+        self._countRequest(trike_code, "reject", 0)
 
     def addDriver(self, trike):
-        self.cursor.execute('''
-            INSERT INTO drivers (
-                run_id, trike_code, hub, start_tick, end_tick,
-                max_gas, gas_consumption_rate, usual_gas_payment,
-                gets_full_tank, farthest_distance, daily_expense,
-                patience, aspired_price, minimum_price
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        driver_id = self.idAllocator.nextId("drivers")
+        self.driverCache[trike.name] = driver_id
+        self.driverDays.setdefault(trike.name, list(EMPTY_DRIVER_DAY))
+        self.tricycles[trike.name] = trike
+        self._addRow("drivers", (
+            driver_id,
             int(self.runId),
             trike.name,
             trike.hub,
@@ -142,20 +176,15 @@ class SimulationLogger:
             float(trike.aspiredPrice),
             float(trike.minimumPrice)
         ))
-        self.conn.commit()
-
-        driver_id = self.cursor.lastrowid
-        self.driverCache[trike.name] = driver_id
+        self._maybeFlush()
 
     def addPassenger(self, passenger):
-        self.cursor.execute('''
-            INSERT INTO passengers (
-                run_id, passenger_code, day,
-                willingness_to_pay, patience, aspired_price,
-                destination_edge, destination_position, destination_lane
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        if not self.isPassengerLogged(passenger.name):
+            return
+        passenger_id = self.idAllocator.nextId("passengers")
+        self.passengerCache[passenger.name] = passenger_id
+        self._addRow("passengers", (
+            passenger_id,
             self.runId,
             passenger.name,
             int(self.day),
@@ -166,53 +195,50 @@ class SimulationLogger:
             float(passenger.destination.position),
             int(passenger.destination.lane)
         ))
-        self.conn.commit()
-
-        passenger_id = self.cursor.lastrowid
-        self.passengerCache[passenger.name] = passenger_id
+        self._maybeFlush()
 
     def recordTransaction(self, transaction, rounds):
-        self._createTransaction(*transaction)
-        index = self.cursor.lastrowid
-        for _round in rounds:
-            self._addNegotiationStep(index, *_round)
+        """Counts a transaction and writes it with its negotiation rounds if
+        its passenger is logged.
+
+        Returns:
+            The ID of the transaction row, or None if it was not written.
+        """
+        trike_code, passenger_code, _, _, result, final_price = transaction
+        self._countRequest(trike_code, result, final_price)
+        if not self.isPassengerLogged(passenger_code):
+            return None
+        transaction_id = self._createTransaction(*transaction)
+        if not self.logsNegotiations:
+            rounds = []
+        if self.compactNegotiations and self._isCompactable(rounds):
+            self._addNegotiationRounds(transaction_id, rounds)
+        else:
+            for _round in rounds:
+                self._addNegotiationStep(transaction_id, *_round)
+        self._maybeFlush()
+        return transaction_id
 
     def _createTransaction(self, trike_code, passenger_code, distance, tick, result, final_price):
-        driver_id = self.driverCache[trike_code]
-        passenger_id = self.passengerCache[passenger_code]
-
-        self.cursor.execute('''
-            INSERT INTO passenger_transactions (
-                run_id, driver_id, passenger_id,
-                day, distance, tick, result, final_price
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        transaction_id = self.idAllocator.nextId("passenger_transactions")
+        self._addRow("passenger_transactions", (
+            transaction_id,
             self.runId,
-            int(driver_id),
-            int(passenger_id),
+            int(self.driverCache[trike_code]),
+            int(self.passengerCache[passenger_code]),
             int(self.day),
             float(distance),
             int(tick),
             result,
             float(final_price)
         ))
-        self.conn.commit()
+        return transaction_id
 
-        return self.cursor.lastrowid
-    
     def _addNegotiationStep(self, transaction_id, current_offer,
                          driver_asp, passenger_asp,
                          current_turn, iteration):
-
-        self.cursor.execute('''
-            INSERT INTO negotiation_steps (
-                transaction_id, current_offer,
-                driver_asp, passenger_asp,
-                current_turn, iteration
-            )
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        self._addRow("negotiation_steps", (
+            self.idAllocator.nextId("negotiation_steps"),
             int(transaction_id),
             float(current_offer),
             float(driver_asp),
@@ -220,29 +246,143 @@ class SimulationLogger:
             current_turn,
             int(iteration)
         ))
-        self.conn.commit()
+
+    def _isCompactable(self, rounds):
+        """Whether rounds fit the fixed-width columns of negotiation_rounds:
+        at most MAX_COMPACT_ROUNDS rounds, numbered from 0 in order."""
+        return 0 < len(rounds) <= MAX_COMPACT_ROUNDS and \
+            all(int(_round[4]) == index and _round[3] in TURN_CODES for index, _round in enumerate(rounds))
+
+    def _addNegotiationRounds(self, transaction_id, rounds):
+        columns = []
+        for index in range(MAX_COMPACT_ROUNDS):
+            if index < len(rounds):
+                current_offer, driver_asp, passenger_asp, current_turn, _ = rounds[index]
+                columns += [float(current_offer), float(driver_asp), float(passenger_asp), TURN_CODES[current_turn]]
+            else:
+                columns += [None, None, None, None]
+        self._addRow("negotiation_rounds", (int(transaction_id), len(rounds), *columns))
 
     def addExpense(self, trike_code, expense_type, amount):
-        driver_id = self.driverCache[trike_code]
-
-        self.cursor.execute('''
-            INSERT INTO expenses (
-                run_id, driver_id, expense_type, amount
-            )
-            VALUES (?, ?, ?, ?)
-        ''', (
+        counters = self._getDriverDay(trike_code)
+        counters[5] += float(amount)
+        if expense_type in FUEL_EXPENSE_TYPES:
+            counters[6] += float(amount)
+        if self.logLevel == "aggregate":
+            return
+        self._addRow("expenses", (
+            self.idAllocator.nextId("expenses"),
             self.runId,
-            int(driver_id),
+            int(self.driverCache[trike_code]),
             expense_type,
             float(amount)
         ))
-        self.conn.commit()
-    
+        self._maybeFlush()
+
+    def _maybeFlush(self):
+        if self.pendingRows >= self.flushRows or \
+                time.monotonic() - self.lastFlushTime >= self.flushInterval:
+            self.flush()
+
+    def flush(self):
+        self.lastFlushTime = time.monotonic()
+        if self.pendingRows == 0:
+            return
+        batch, self.pending = self.pending, {table: [] for table in LOG_TABLES}
+        self.pendingRows = 0
+        self._submit(self.sink.writeBatch, batch)
+
     def commit(self):
-        self.conn.commit()
+        self.flush()
+        if self.writer is not None:
+            self.writer.drain()
+
+    def _addDriverDays(self):
+        """Adds the day's driver_days rows, with each tricycle's daily
+        statistics, and resets the counters and statistics."""
+        for trike_code, counters in self.driverDays.items():
+            trike = self.tricycles.get(trike_code)
+            if trike is not None:
+                stats = trike.getDailyStats()
+                trike_stats = (int(stats['trips']), float(stats['distance']), trike.actualStartTick,
+                               trike.actualEndTick, float(trike.money))
+                trike.resetDailyStats()
+            else:
+                trike_stats = (None, None, None, None, None)
+            self._addRow("driver_days", (
+                self.idAllocator.nextId("driver_days"),
+                self.runId,
+                int(self.driverCache[trike_code]),
+                int(self.day),
+                *counters,
+                *trike_stats
+            ))
+            self.driverDays[trike_code] = list(EMPTY_DRIVER_DAY)
+        self.dayHasActivity = False
 
     def nextDay(self):
+        self._addDriverDays()
+        self.flush()
         self.day += 1
+        self._submit(self.sink.nextDay, self.day)
+        if self.writer is not None:
+            self.writer.drain()
+
+    def getCheckpoint(self) -> dict:
+        """Get the logger's position at a day boundary, right after
+        nextDay(): the run, the day, the ID blocks and the IDs of the
+        drivers and passengers logged so far. Every row up to it has been
+        handed to the sink."""
+        return {
+            "run_id": self.runId,
+            "day": self.day,
+            "id_blocks": self.idAllocator.getBlocks(),
+            "driver_cache": dict(self.driverCache),
+            "passenger_cache": dict(self.passengerCache),
+        }
+
+    def restoreCheckpoint(self, checkpoint: dict, tricycles: list) -> None:
+        """Continue the run from a position taken with getCheckpoint(). The
+        run's rows written after it are deleted from the sink, and IDs are
+        handed out again from where the checkpoint left them.
+
+        Args:
+            checkpoint: the output of getCheckpoint().
+            tricycles: the restored fleet, whose daily statistics are
+                written to driver_days.
+        """
+        if checkpoint["run_id"] != self.runId:
+            raise Exception(f"Checkpoint of run {checkpoint['run_id']} restored into run {self.runId}")
+        self._call(self.sink.resumeRun, self.runId, checkpoint["day"], checkpoint["id_blocks"])
+        self.day = checkpoint["day"]
+        self.idAllocator.restoreBlocks(checkpoint["id_blocks"])
+        self.driverCache = dict(checkpoint["driver_cache"])
+        self.passengerCache = dict(checkpoint["passenger_cache"])
+        self.driverDays = {trike_code: list(EMPTY_DRIVER_DAY) for trike_code in self.driverCache}
+        self.tricycles = {trike.name: trike for trike in tricycles if trike.name in self.driverCache}
+        self.dayHasActivity = False
+
+    def getWriterMetrics(self) -> dict:
+        """Get the queue depth and lag of the background writer, or an empty
+        dictionary when writing on the simulation thread."""
+        if self.writer is None:
+            return dict()
+        return self.writer.getMetrics()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        # a day cut short still gets its counters written
+        if self.dayHasActivity:
+            self._addDriverDays()
+        self.flush()
+        if self.writer is None:
+            self.sink.close()
+        else:
+            self.writer.submit(self.sink.close)
+            self.writer.stop()
 
 
 
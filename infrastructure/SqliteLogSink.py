@@ -0,0 +1,238 @@
+import os
+import time
+import sqlite3
+
+from .LogSink import LogSink
+from .SchemaManager import SchemaManager
+
+# Insert statements per table, in the order a batch is written so that
+# parent rows always precede the rows referencing them
+INSERT_STATEMENTS = {
+    "drivers": '''
+        INSERT INTO drivers (
+            id, run_id, trike_code, hub, start_tick, end_tick,
+            max_gas, gas_consumption_rate, usual_gas_payment,
+            gets_full_tank, farthest_distance, daily_expense,
+            patience, aspired_price, minimum_price
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "passengers": '''
+        INSERT INTO passengers (
+            id, run_id, passenger_code, day,
+            willingness_to_pay, patience, aspired_price,
+            destination_edge, destination_position, destination_lane
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "passenger_transactions": '''
+        INSERT INTO passenger_transactions (
+            id, run_id, driver_id, passenger_id,
+            day, distance, tick, result, final_price
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "negotiation_steps": '''
+        INSERT INTO negotiation_steps_rows (
+            id, transaction_id, current_offer,
+            driver_asp, passenger_asp,
+            current_turn, iteration
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "negotiation_rounds": '''
+        INSERT INTO negotiation_rounds (
+            transaction_id, round_count,
+            offer_0, driver_asp_0, passenger_asp_0, turn_0,
+            offer_1, driver_asp_1, passenger_asp_1, turn_1,
+            offer_2, driver_asp_2, passenger_asp_2, turn_2
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "expenses": '''
+        INSERT INTO expenses (
+            id, run_id, driver_id, expense_type, amount
+        )
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+    "driver_days": '''
+        INSERT INTO driver_days (
+            id, run_id, driver_id, day,
+            requests, agreements, failures, rejections,
+            income, expenses, fuel_expenses,
+            trips, distance, actual_start_tick, actual_end_tick, money
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+}
+
+# Tables stored under another name; negotiation_steps is a view over both
+# forms of negotiation storage
+STORAGE_TABLES = {"negotiation_steps": "negotiation_steps_rows"}
+
+# Directory, under the working directory, holding one database per worker
+SHARDS_DIRECTORY = "db/shards"
+
+def getShardPath(shard_name: str, shards_directory: str | None = None) -> str:
+    """Get the path of a worker's shard database.
+
+    Args:
+        shard_name: name of the shard, unique per concurrently running worker.
+        shards_directory: directory of the shards. Defaults to db/shards
+            under the working directory.
+
+    Returns:
+        The path of the shard's database file.
+    """
+    if shards_directory is None:
+        shards_directory = os.path.join(os.getcwd(), SHARDS_DIRECTORY)
+    return os.path.join(shards_directory, f"{shard_name}.db")
+
+class SqliteLogSink(LogSink):
+    """Writes simulation logs to a SQLite database file.
+
+    Workers running at the same time should each write their own shard
+    (see getShardPath()) and have the shards merged afterwards with
+    ShardMerger, instead of contending for one file.
+
+    With in_memory=True, the database file is loaded into an in-memory
+    database that takes every write, and copied back to the file with the
+    SQLite backup API on nextDay(), on the first batch written
+    snapshot_interval seconds after the last snapshot, and on close().
+    This removes the file's syncs from the write path; a crash loses at
+    most what was written since the last snapshot. Each snapshot replaces
+    the whole file, so the file must not be written by anyone else
+    meanwhile; give concurrent workers their own shards.
+
+    Attributes:
+        dbPath: path to the database file.
+        inMemory: whether writes go to an in-memory copy of the database.
+        snapshotInterval: seconds between snapshots in memory mode, or None
+            to snapshot only on nextDay() and close().
+        conn: the connection written to, or None before open().
+        fileConn: connection to the file in memory mode, or None.
+        lastSnapshotTime: time.monotonic() of the last snapshot.
+    """
+
+    def __init__(self, db_path: str | None = None, in_memory: bool = False,
+                 snapshot_interval: float | None = None) -> None:
+        """Initializes the sink.
+
+        Args:
+            db_path: path to the database file. Defaults to
+                db/simulation_logs.db under the working directory.
+            in_memory: write to an in-memory copy of the database and
+                snapshot it to the file.
+            snapshot_interval: seconds between snapshots in memory mode, or
+                None to snapshot only on nextDay() and close().
+        """
+        if db_path is None:
+            db_path = os.path.join(os.getcwd(), "db/simulation_logs.db")
+        self.dbPath = db_path
+        self.inMemory = in_memory
+        self.snapshotInterval = snapshot_interval
+        self.conn = None
+        self.fileConn = None
+        self.lastSnapshotTime = time.monotonic()
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.dbPath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        schema_manager = SchemaManager()
+        if self.inMemory:
+            # start from the file's contents so runs and IDs continue from it
+            self.fileConn = schema_manager.connect(self.dbPath)
+            self.conn = sqlite3.connect(":memory:")
+            self.fileConn.backup(self.conn)
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.lastSnapshotTime = time.monotonic()
+        else:
+            self.conn = schema_manager.connect(self.dbPath)
+        self.cursor = self.conn.cursor()
+
+    def snapshot(self) -> None:
+        """Copies the in-memory database to the file. Does nothing when
+        writing to the file directly."""
+        if self.fileConn is None:
+            return
+        self.conn.backup(self.fileConn)
+        # the copied header carries the in-memory journal mode
+        self.fileConn.execute("PRAGMA journal_mode = WAL")
+        self.lastSnapshotTime = time.monotonic()
+
+    def createRun(self, timestamp: str) -> int:
+        self.cursor.execute(
+            "INSERT INTO runs (timestamp) VALUES (?)",
+            (timestamp,)
+        )
+        self.conn.commit()
+        return self.cursor.lastrowid
+
+    def reserveIds(self, table: str, count: int) -> int:
+        """Reserves count IDs of a table by advancing its AUTOINCREMENT
+        counter, starting from MAX(id)."""
+        table = STORAGE_TABLES.get(table, table)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            max_id = self.conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+            current = max(row[0] if row else 0, max_id or 0)
+            if row:
+                self.conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (current + count, table))
+            else:
+                self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, current + count))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return current + 1
+
+    def resumeRun(self, run_id: int, day: int, id_blocks: dict[str, list[int]]) -> None:
+        """Deletes the rows of the run with IDs from the next ID of each
+        block on, children before their parents. The rest of the restored
+        blocks is written again with the same IDs. The reserved ID counters
+        are raised to the end of the blocks but never lowered, since other
+        loggers writing to the database may hold blocks reserved after the
+        checkpoint. Blocks the run reserves after the restored ones
+        therefore come from the current counters: their rows get other IDs
+        than in an uninterrupted run, with the same content."""
+        with self.conn:
+            if "passenger_transactions" in id_blocks:
+                for table in ("negotiation_steps_rows", "negotiation_rounds"):
+                    self.conn.execute(
+                        f"DELETE FROM {table} WHERE transaction_id IN "
+                        "(SELECT id FROM passenger_transactions WHERE run_id = ? AND id >= ?)",
+                        (run_id, id_blocks["passenger_transactions"][0])
+                    )
+            for table in ("driver_days", "expenses", "passenger_transactions", "passengers", "drivers"):
+                if table in id_blocks:
+                    self.conn.execute(f"DELETE FROM {table} WHERE run_id = ? AND id >= ?",
+                                      (run_id, id_blocks[table][0]))
+            for table, (_, end) in id_blocks.items():
+                self.conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?",
+                                  (end - 1, STORAGE_TABLES.get(table, table)))
+
+    def writeBatch(self, batch: dict[str, list[tuple]]) -> None:
+        with self.conn:
+            for table, statement in INSERT_STATEMENTS.items():
+                if batch.get(table):
+                    self.cursor.executemany(statement, batch[table])
+        if self.snapshotInterval is not None and \
+                time.monotonic() - self.lastSnapshotTime >= self.snapshotInterval:
+            self.snapshot()
+
+    def nextDay(self, day: int) -> None:
+        self.snapshot()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.snapshot()
+            # an unclosed cursor keeps the connection alive past close(),
+            # leaving the WAL file un-checkpointed
+            self.cursor.close()
+            self.conn.close()
+            self.conn = None
+        if self.fileConn is not None:
+            self.fileConn.close()
+            self.fileConn = None
@@ -1,3 +1,4 @@
+import numpy as np
 import sumolib
 class SumoRepository:
     """Repository for accessing SUMO network data.
@@ -5,6 +6,10 @@ class SumoRepository:
     Attributes:
         networkFilePath: path to the SUMO network file.
         network: cached SUMO network object.
+        pedestrianEdges: array of pedestrian edge IDs in the network.
+        laneCounts: number of lanes of each pedestrian edge.
+        firstLaneLengths: length of the first lane of each pedestrian edge.
+        lastLaneLengths: length of the last lane of each pedestrian edge.
     """
     network = None
 
@@ -16,6 +21,20 @@ class SumoRepository:
         """
         self.networkFilePath = network_file_path
         self.network = sumolib.net.readNet(self.networkFilePath)
+        self._buildLaneTables()
+
+    def _buildLaneTables(self) -> None:
+        """Builds flat lookup tables of the pedestrian edges and their lanes.
+
+        The tables are aligned by index, i.e., entry i of every table
+        describes the edge in pedestrianEdges[i].
+        """
+        edges = [e for e in self.network.getEdges() if e.allows("pedestrian")]
+        self.pedestrianEdges = np.array([e.getID() for e in edges], dtype=object)
+        self.laneCounts = np.array([e.getLaneNumber() for e in edges], dtype=np.int64)
+        self.firstLaneLengths = np.array([e.getLanes()[0].getLength() for e in edges], dtype=float)
+        self.lastLaneLengths = np.array([e.getLanes()[-1].getLength() for e in edges], dtype=float)
+        self.pedestrianEdgeIndex = {edge: i for i, edge in enumerate(self.pedestrianEdges)}
 
     def getNetwork(self) -> sumolib.net.Net:
         """Get the SUMO network object.
@@ -33,7 +52,55 @@ class SumoRepository:
         """
 
         # Return pedestrian edges
-        return [e.getID() for e in self.network.getEdges() if e.allows("pedestrian")]
+        return self.pedestrianEdges.tolist()
+
+    def getPedestrianEdgeWeights(self, edge_weights: dict[str, float] | None = None,
+                                 excluded_edge: str | None = None) -> np.ndarray:
+        """Get the sampling weights of the pedestrian edges as a flat table.
+
+        Args:
+            edge_weights: optional dictionary of edge ID to relative weight.
+                Edges that are not in the dictionary get a weight of 0. If
+                None, every edge gets a weight of 1.
+            excluded_edge: optional edge ID that gets a weight of 0.
+
+        Returns:
+            Array of probabilities aligned with the pedestrian edges.
+        """
+        if edge_weights is None:
+            weights = np.ones(len(self.pedestrianEdges), dtype=float)
+        else:
+            weights = np.array([float(edge_weights.get(edge, 0.0)) for edge in self.pedestrianEdges], dtype=float)
+
+        if excluded_edge in self.pedestrianEdgeIndex:
+            weights[self.pedestrianEdgeIndex[excluded_edge]] = 0.0
+
+        total = weights.sum()
+        if total <= 0:
+            raise Exception(f"No pedestrian edge can be sampled. Excluded edge was: {excluded_edge}")
+        return weights / total
+
+    def sampleDestinations(self, size: int, probabilities: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Samples a batch of destinations on the pedestrian edges.
+
+        Each destination is placed on either the first or the last lane of its
+        edge with equal chance, at a uniformly random position along the lane.
+
+        Args:
+            size: number of destinations to sample.
+            probabilities: optional array of edge probabilities, as returned
+                by getPedestrianEdgeWeights. Uniform if None.
+
+        Returns:
+            A tuple of arrays (edge IDs, lane indices, positions), each of
+            the given size.
+        """
+        edge_indices = np.random.choice(len(self.pedestrianEdges), size=size, p=probabilities)
+        use_last_lane = np.random.random(size) >= 0.5
+        lanes = np.where(use_last_lane, self.laneCounts[edge_indices] - 1, 0)
+        lane_lengths = np.where(use_last_lane, self.lastLaneLengths[edge_indices], self.firstLaneLengths[edge_indices])
+        positions = np.random.random(size) * lane_lengths
+        return self.pedestrianEdges[edge_indices], lanes, positions
 
     def getNumberOfLanes(self, edge:str)->int:
         """Get the number of lanes for a given edge.
@@ -0,0 +1,130 @@
+import json
+import os
+import socket
+import time
+
+class TelemetryPublisher:
+    """Publishes simulation KPIs as newline-delimited JSON while the
+    simulation runs, without touching the log database.
+
+    KPIs go to a file, appended to and flushed line by line so it can be
+    tailed, or to the consumers connected to a UNIX stream socket. The
+    socket is non-blocking: pending consumers are accepted when the engine
+    asks isListening(), so with no consumer connected the engine skips
+    collecting the KPIs altogether. A consumer too slow to take a whole
+    line is disconnected rather than allowed to stall the simulation.
+
+    Attributes:
+        path: path of the file written to, or None.
+        socketPath: path of the UNIX socket served, or None.
+        file: the open file, or None.
+        server: the listening socket, or None.
+        clients: the connected consumer sockets.
+        lastTick: tick of the last KPIs collected, or None.
+        lastTime: time.monotonic() of the last KPIs collected.
+    """
+
+    def __init__(self, path: str | None = None, socket_path: str | None = None) -> None:
+        """Initializes the publisher.
+
+        Args:
+            path: file to append the KPIs to.
+            socket_path: UNIX socket to serve the KPIs on.
+        """
+        if path is None and socket_path is None:
+            raise ValueError("Either path or socket_path is required")
+        self.path = path
+        self.socketPath = socket_path
+        self.file = None
+        self.server = None
+        self.clients = []
+        self.lastTick = None
+        self.lastTime = time.monotonic()
+
+    def open(self) -> None:
+        if self.path is not None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "a", buffering=1)
+        if self.socketPath is not None:
+            # a socket file left by an earlier run would make bind() fail
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.socketPath)
+            self.server.listen()
+            self.server.setblocking(False)
+
+    def _acceptClients(self) -> None:
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            self.clients.append(client)
+
+    def isListening(self) -> bool:
+        """Check whether anyone receives the KPIs: always with a file, and
+        with a socket once a consumer has connected."""
+        if self.server is not None:
+            self._acceptClients()
+        listening = self.file is not None or len(self.clients) > 0
+        if not listening:
+            # the speed is timed again from the next KPIs collected
+            self.lastTick = None
+        return listening
+
+    def getTicksPerSecond(self, tick: int) -> float | None:
+        """Get the simulation speed since the last KPIs collected and start
+        timing the next interval.
+
+        Args:
+            tick: current tick; a tick lower than the last one starts a new
+                day.
+
+        Returns:
+            Ticks per second, or None for the first KPIs collected.
+        """
+        now = time.monotonic()
+        last_tick, last_time = self.lastTick, self.lastTime
+        self.lastTick, self.lastTime = tick, now
+        if last_tick is None or now <= last_time:
+            return None
+        elapsed_ticks = tick if tick < last_tick else tick - last_tick
+        return elapsed_ticks / (now - last_time)
+
+    def publish(self, kpis: dict) -> None:
+        """Write one KPI record as a JSON line to the file and every
+        connected consumer."""
+        line = json.dumps(kpis, separators=(",", ":")) + "\n"
+        if self.file is not None:
+            self.file.write(line)
+        if self.clients:
+            data = line.encode()
+            connected = []
+            for client in self.clients:
+                try:
+                    sent = client.send(data)
+                except (BlockingIOError, BrokenPipeError, ConnectionResetError):
+                    sent = 0
+                if sent == len(data):
+                    connected.append(client)
+                else:
+                    # a partial line would corrupt the stream
+                    client.close()
+            self.clients = connected
+
+    def close(self) -> None:
+        for client in self.clients:
+            client.close()
+        self.clients = []
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
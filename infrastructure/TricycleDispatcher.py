@@ -1,11 +1,11 @@
-from domain.Location import Location, getManhattanDistance
+from domain.Location import Location
 
 from config.SimulationConfig import SimulationConfig
 from infrastructure.TricycleRepository import TricycleRepository
 from infrastructure.TodaRepository import TodaRepository
 from infrastructure.PassengerFactory import PassengerFactory
 from domain.TricycleState import TricycleState
-from utils.TraciUtils import getTricycleLocation, getTricycleHubEdge, getVehiclesInSimulation
+from utils.TraciUtils import getTricycleHubEdge, getVehiclesInSimulation
 
 import math
 import random
@@ -16,6 +16,12 @@ class TricycleDispatcher:
         self.tricycleRepository = tricycle_repository
         self.passengerFactory = passenger_factory
         self.peakHourProbabilities = simulation_config.getPeakHourProbabilities()
+        # Dispatch and rejection statistics
+        self.dispatchAttempts = 0
+        self.accepts = 0
+        self.failures = 0
+        self.rejections = 0
+        self.expectedRejections = 0.0
 
     def shouldAttemptDispatch(self, tick) -> bool:
         curr_prob = self.peakHourProbabilities[math.floor(tick / 60 / 60)] / 60.0
@@ -41,13 +47,73 @@ class TricycleDispatcher:
                 continue
                 
             hub_edge = getTricycleHubEdge(tricycle.getHub())
-            passenger = self.passengerFactory.createRandomPassenger(hub_edge)
-            passenger_destination = passenger.getDestination()
+            self.dispatchAttempts += 1
+            rejection_probability = self.passengerFactory.getRejectionProbability(hub_edge, tricycle.farthestDistance)
+            if rejection_probability is not None:
+                self.expectedRejections += rejection_probability
 
-            if tricycle.canAcceptDispatch(passenger_destination):
-                success = self.tricycleRepository.dispatchTricycle(tricycle_id, passenger, simulationLogger, tick)
+            dispatch_request = self.passengerFactory.createDispatchRequest(hub_edge, tricycle.farthestDistance)
+            if dispatch_request is None:
+                # rejected from the reachability index; no passenger was created
+                self.rejections += 1
+                simulationLogger.countRejection(tricycle_id)
+                continue
+
+            if tricycle.canAcceptDispatch(dispatch_request):
+                trips = tricycle.dailyTrips
+                success = self.tricycleRepository.dispatchTricycle(tricycle_id, dispatch_request, simulationLogger, tick)
+                # an agreed negotiation records a trip, even if the tricycle could not be routed;
+                # a destination on the hub's own edge is dropped before any negotiation
+                if tricycle.dailyTrips > trips:
+                    self.accepts += 1
+                elif dispatch_request.getPassenger().destination.edge != hub_edge:
+                    self.failures += 1
                 if success:
                     todaRepository.dequeToda(toda)
             else:
-                transaction = [tricycle_id, passenger.name, getManhattanDistance(getTricycleLocation(tricycle.name), passenger_destination), tick, "reject", 0]
+                self.rejections += 1
+                transaction = [tricycle_id, dispatch_request.getPassenger().name, dispatch_request.getDistance(), tick, "reject", 0]
                 simulationLogger.recordTransaction(transaction, [])
+
+    def getDispatchCounts(self) -> dict:
+        """Get the number of dispatch attempts so far and of their outcomes:
+        agreed and failed negotiations and rejected requests."""
+        return {
+            'attempts': self.dispatchAttempts,
+            'accepts': self.accepts,
+            'failures': self.failures,
+            'rejects': self.rejections,
+        }
+
+    def getCheckpoint(self) -> dict:
+        """Get the dispatch statistics so far, which carry over between
+        days."""
+        return {
+            'dispatch_attempts': self.dispatchAttempts,
+            'accepts': self.accepts,
+            'failures': self.failures,
+            'rejections': self.rejections,
+            'expected_rejections': self.expectedRejections,
+        }
+
+    def restoreCheckpoint(self, checkpoint: dict) -> None:
+        self.dispatchAttempts = checkpoint['dispatch_attempts']
+        self.accepts = checkpoint['accepts']
+        self.failures = checkpoint['failures']
+        self.rejections = checkpoint['rejections']
+        self.expectedRejections = checkpoint['expected_rejections']
+
+    def getRejectionStatistics(self) -> dict:
+        """Get the rejection statistics of the dispatch attempts so far.
+
+        The rejection probability is the mean analytic probability that a
+        request is beyond the head tricycle's farthest distance. It is only
+        available when destinations are sampled from the reachability index.
+        """
+        return {
+            'attempts': self.dispatchAttempts,
+            'rejections': self.rejections,
+            'expected_rejections': self.expectedRejections,
+            'rejection_probability': self.expectedRejections / self.dispatchAttempts
+                if self.dispatchAttempts and self.passengerFactory.reachabilityIndex is not None else None
+        }
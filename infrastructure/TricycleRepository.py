@@ -3,7 +3,7 @@ import traci
 
 from domain.Location import Location
 from domain.Tricycle import Tricycle
-from domain.Passenger import Passenger
+from domain.DispatchRequest import DispatchRequest
 from domain.TricycleState import TricycleState
 
 from .TricycleFactory import TricycleFactory
@@ -94,8 +94,9 @@ class TricycleRepository:
             self.getTricycle(tricycle_id).setDestination(destination)
     
     #TODO: Refactor this!!
-    def dispatchTricycle(self, tricycle_id: str, passenger: Passenger, simulationLogger, tick) -> bool:
+    def dispatchTricycle(self, tricycle_id: str, dispatch_request: DispatchRequest, simulationLogger, tick) -> bool:
         tricycle = self.tricycles[tricycle_id]
+        passenger = dispatch_request.getPassenger()
         destination = passenger.destination
         
 
@@ -107,7 +108,7 @@ class TricycleRepository:
             #print("Failed to assign.")
             return False
         
-        distance = traci.simulation.getDistanceRoad(current_edge, 0, dest_edge, 0, isDriving=True)
+        distance = dispatch_request.getDistance()
         driver_patience = tricycle.getPatience()
         passenger_patience = passenger.getPatience()
 
@@ -165,6 +166,7 @@ class TricycleRepository:
         
         if not agree:
             return False
+        tricycle.recordTrip(distance, curr_offer)
 
         net = self.sumoService.getNetwork()
         edge = net.getEdge(dest_edge)
@@ -175,12 +177,12 @@ class TricycleRepository:
         except:
             pass
 
-        to_route = traci.simulation.findRoute(current_edge, dest_edge)
-        return_route = traci.simulation.findRoute(dest_edge, hub_edge)
+        if not dispatch_request.hasRoute():
+            to_route = traci.simulation.findRoute(current_edge, dest_edge)
+            return_route = traci.simulation.findRoute(dest_edge, hub_edge)
+            dispatch_request.setRoute(list(to_route.edges) + list(return_route.edges)[1:])
 
-        full_route = list(to_route.edges) + list(return_route.edges)[1:]
-
-        traci.vehicle.setRoute(tricycle_id, full_route)
+        traci.vehicle.setRoute(tricycle_id, dispatch_request.getRoute())
 
         traci.vehicle.setStop(tricycle_id, dest_edge, laneIndex=passenger.destination.lane, pos=destination.position, duration=60)
 
@@ -290,6 +292,14 @@ class TricycleRepository:
             tricycle.money -= tricycle.dailyExpense
             self.simulationLogger.addExpense(tricycle_id, "daily_expense", tricycle.dailyExpense)
 
+    def getCheckpoint(self) -> dict:
+        """Get the fleet's state carried over between days: fuel, money,
+        state and everything else held by the tricycles."""
+        return {"tricycles": self.tricycles}
+
+    def restoreCheckpoint(self, checkpoint: dict) -> None:
+        self.tricycles = checkpoint["tricycles"]
+
     def changeLogger(self, simulationLogger) -> None:
         self.simulationLogger = simulationLogger
 
@@ -1,6 +1,16 @@
+from .CheckpointStore import CheckpointStore
+from .IdAllocator import IdAllocator
+from .LogSink import LogSink
+from .LogWriterThread import LogWriterThread
+from .ParquetLogSink import ParquetLogSink
 from .PassengerFactory import PassengerFactory
+from .ReachabilityIndex import ReachabilityIndex
+from .SchemaManager import SchemaManager
+from .ShardMerger import ShardMerger
 from .SimulationLogger import SimulationLogger
+from .SqliteLogSink import SqliteLogSink
 from .SumoRepository import SumoRepository
+from .TelemetryPublisher import TelemetryPublisher
 from .TricycleDispatcher import TricycleDispatcher
 from .TricycleFactory import TricycleFactory
 from .TricycleRepository import TricycleRepository
@@ -8,9 +18,19 @@ from .TricycleStateManager import TricycleStateManager
 
 __all__ = [
     # Classes
+    "CheckpointStore",
+    "IdAllocator",
+    "LogSink",
+    "LogWriterThread",
+    "ParquetLogSink",
     "PassengerFactory",
+    "ReachabilityIndex",
+    "SchemaManager",
+    "ShardMerger",
     "SimulationLogger",
+    "SqliteLogSink",
     "SumoRepository",
+    "TelemetryPublisher",
     "TricycleDispatcher",
     "TricycleFactory",
     "TricycleRepository",
@@ -1,5 +1,5 @@
-
 import os
+import secrets
 
 # os.dup2(os.open(os.devnull, os.O_WRONLY), 2)
 from utils import *
@@ -7,48 +7,59 @@ from domain import *
 from infrastructure import *
 from application import *
 from config.SimulationConfig import SimulationConfig
-from utils.ParkingAreaParser import parseParkingAreaFile
-from datetime import datetime
-import traci
-
-# PHASE 1: INITIALIZING THE MAP ENVIRONMENT
-
-simulation_config = SimulationConfig()
-
-# PHASE 2: INITIALIZING SERVICES
-network_file_path = simulation_config.getNetworkFilePath()
-parking_file_path = simulation_config.getParkingFilePath()
-sumo_repository = SumoRepository(network_file_path)
-toda_hub_descriptor = parseParkingAreaFile(parking_file_path)
 
 duration = 57600
 number_of_sims = 1
 number_of_days = 10
+# Replications run in parallel, one SUMO instance per worker process, when
+# there is more than one of each
+number_of_workers = os.cpu_count()
+# Seed of the first replication, replication i using base_seed + i; None
+# draws a random one, printed so the runs can be reproduced
+base_seed = None
 
-for sim in range(number_of_sims):
-
-    # PHASE 3: INITIALIZING TRICYCLE REPOSITORY
-    tricycle_factory = TricycleFactory(simulation_config)
-
-    # PHASE 4: INITIALIZING PASSENGER REPOSITORY
-    logger = SimulationLogger()
-    tricycle_repository = TricycleRepository(sumo_repository, tricycle_factory, simulation_config, logger)
-    passenger_network_edges = sumo_repository.getNetworkPedestrianEdges()
-    passenger_factory = PassengerFactory(sumo_repository, simulation_config, logger)
+if __name__ == "__main__":
+    # PHASE 1: INITIALIZING THE MAP ENVIRONMENT
+    simulation_config = SimulationConfig()
+    if base_seed is None:
+        base_seed = secrets.randbits(32)
+    print(f"base seed: {base_seed}")
 
-    # PHASE 5: INITIALIZING OTHER SERVICES
-    tricycle_dispatcher = TricycleDispatcher(tricycle_repository, passenger_factory, simulation_config)
-    tricycle_state_manager = TricycleStateManager(tricycle_repository, logger)
+    if number_of_sims > 1 and number_of_workers > 1:
+        # PHASE 2: RUNNING THE REPLICATIONS IN A PROCESS POOL, one shard each
+        runner = ReplicationRunner(simulation_config, number_of_days, duration, workers=number_of_workers,
+                                   base_seed=base_seed)
+        summary = runner.run(number_of_sims)
+        merged = runner.mergeShards(summary, os.path.join(os.getcwd(), "db/simulation_logs.db"))
+        print(f"\n{len(summary['results'])}/{number_of_sims} replications in {summary['wall_time']:.1f} s, "
+              f"{summary['replications_per_hour']:.1f} replications/hour, "
+              f"{summary['ticks_per_second']:,.0f} ticks/s; {len(merged)} shard(s) merged")
+        for replication, error in sorted(summary["errors"].items()):
+            print(f"replication {replication} failed: {error}")
+    else:
+        # Live KPIs for analysis/telemetry_tail.py, when configured
+        telemetry_publisher = None
+        if simulation_config.getTelemetryPath() or simulation_config.getTelemetrySocketPath():
+            telemetry_publisher = TelemetryPublisher(simulation_config.getTelemetryPath(),
+                                                     simulation_config.getTelemetrySocketPath())
+            telemetry_publisher.open()
 
-    for day in range(number_of_days):
-        print(f"\n\nrunning sim# {sim + 1}, day# {day + 1}...")
-        # tricycle_repository.changeLogger(logger)
-        simulation_loop = SimulationEngine(toda_hub_descriptor, simulation_config, tricycle_dispatcher, tricycle_repository, tricycle_state_manager, logger, duration, first_run=(day == 0))
-        simulation_loop.doMainLoop(duration)
-        simulation_loop.close()
-        tricycle_repository.startRefuelAllTricycles()
-        tricycle_repository.startExpenseAllTricycles()
-        logger.nextDay()
+        # PHASE 2: RUNNING THE REPLICATIONS ONE AFTER THE OTHER
+        for sim in range(number_of_sims):
+            # A sim with checkpoints resumes from its latest one, e.g. after a crash
+            checkpoint_store, resume_day = None, None
+            if simulation_config.getCheckpointDirectory():
+                checkpoint_store = CheckpointStore(os.path.join(simulation_config.getCheckpointDirectory(),
+                                                                f"sim-{sim + 1:04d}"))
+                resume_day = checkpoint_store.getLatestDay()
+                if resume_day is not None and resume_day >= number_of_days:
+                    print(f"\n\nsim# {sim + 1} already done")
+                    continue
+            print(f"\n\nrunning sim# {sim + 1}..." if resume_day is None else
+                  f"\n\nresuming sim# {sim + 1} after day# {resume_day}...")
+            runReplication(simulation_config, number_of_days, duration, base_seed + sim,
+                           telemetry_publisher=telemetry_publisher,
+                           checkpoint_store=checkpoint_store, resume_day=resume_day)
 
-    # Close TRACI after all runs are complete
-    traci.close()
+        if telemetry_publisher is not None:
+            telemetry_publisher.close()
@@ -0,0 +1,73 @@
+"""Run a parameter sweep over SimulationConfig attributes, resumably.
+
+The sweep is described by a JSON spec with either a full factorial grid,
+
+    {"grid": {"demandMultiplier": [1.5, 2.0, 2.5], "gasPricePerLiter": [54.8, 61.0]},
+     "replications": 5, "base_seed": 0, "days": 1, "duration": 57600}
+
+or a Latin hypercube over parameter ranges,
+
+    {"lhs": {"ranges": {"demandMultiplier": [1.0, 3.0]}, "samples": 200, "seed": 0},
+     "replications": 5}
+
+Every configuration runs once per replication seed, each job in its own
+worker process and shard. Job status is kept in a SQLite ledger, so running
+the same command again after a crash resumes the unfinished jobs only.
+
+Usage:
+    python sweep.py --spec sweep.json --name demand [--workers 8] [--ledger db/sweeps.db]
+                    [--merge db/simulation_logs.db] [--status]
+"""
+import argparse
+import json
+import os
+
+from application import SweepScheduler, gridDesign, latinHypercubeDesign
+from config.SimulationConfig import SimulationConfig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spec", help="JSON spec of the sweep; required unless --status")
+    parser.add_argument("--name", required=True, help="name of the sweep in the ledger")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--ledger", default=os.path.join(os.getcwd(), "db/sweeps.db"), help="job ledger database")
+    parser.add_argument("--max-retries", type=int, default=2, help="retries of a failed job")
+    parser.add_argument("--merge", help="log database to merge the completed jobs' shards into")
+    parser.add_argument("--status", action="store_true", help="print the job counts and exit")
+    args = parser.parse_args()
+    if not args.status and args.spec is None:
+        parser.error("--spec is required unless --status is given")
+
+    spec = dict()
+    if args.spec is not None:
+        with open(args.spec) as file:
+            spec = json.load(file)
+
+    scheduler = SweepScheduler(args.ledger, SimulationConfig(), spec.get("days", 1), spec.get("duration", 57600),
+                               workers=args.workers, max_retries=args.max_retries)
+    scheduler.open()
+    try:
+        if not args.status:
+            if "grid" in spec:
+                design = gridDesign(spec["grid"])
+            elif "lhs" in spec:
+                lhs = spec["lhs"]
+                design = latinHypercubeDesign(lhs["ranges"], lhs["samples"], lhs.get("seed", 0))
+            else:
+                parser.error("the spec needs a \"grid\" or an \"lhs\" design")
+            added = scheduler.addSweep(args.name, design, spec.get("replications", 1), spec.get("base_seed", 0))
+            print(f"{added} job(s) added to sweep {args.name}")
+            summary = scheduler.run(args.name)
+            print(f"{summary['completed']} job(s) done, {summary['failed']} failed in {summary['wall_time']:.1f} s"
+                  + (f", {summary['jobs_per_hour']:.1f} jobs/hour" if summary["jobs_per_hour"] else ""))
+        if args.merge:
+            merged = scheduler.mergeShards(args.name, args.merge)
+            print(f"{len(merged)} shard(s) merged into {args.merge}")
+        print(", ".join(f"{status}: {count}" for status, count in sorted(scheduler.getStatus(args.name).items())))
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()